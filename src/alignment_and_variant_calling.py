@@ -8,58 +8,625 @@
 # ------------------------------------------------------------------------------
 from Bio import Align
 from Bio.Seq import Seq # Necesario para Seq(rcrs_seq) en main
+import bisect
+import numpy as np
+import sys
 import traceback
+from functools import lru_cache
 from . import constants # Para POS_3107_BLACKLISTED y otras
+from .seed_index import obtener_indice_semillas
+from .variant_records import Variante
+from .artifact_filters import obtener_filtro_artefactos
 
-def realizar_alineamiento(rcrs_seq: Seq, query_seq: Seq, modo_alineamiento: str = 'local') -> Align.Alignment | None:
-    print(f"\\n--- Iniciando Paso 3: Alineamiento en modo '{modo_alineamiento}' ---")
-    aligner = Align.PairwiseAligner()
+@lru_cache(maxsize=None)
+def _construir_matriz_sustitucion(incluir_iupac: bool = True) -> Align.substitution_matrices.Array:
+    """
+    Construye (una sola vez por proceso) la matriz de sustitución de MitoID.
+    Puntuaciones: Match=3, Mismatch=-3, N vs Base=1, N vs N=1. Con `incluir_iupac`, los
+    códigos de ambigüedad (R, Y, S, ...) puntúan como N frente a las bases que representan
+    (+1) y como mismatch frente al resto (-3).
+    """
+    conjuntos = {base: {base} for base in "ACGT"}
+    conjuntos['N'] = set(constants.IUPAC_MIXED_BASES['N'])
+    if incluir_iupac:
+        for codigo, bases in constants.IUPAC_MIXED_BASES.items():
+            conjuntos[codigo] = set(bases)
+
+    matrix_data = {}
+    for letra_a, bases_a in conjuntos.items():
+        for letra_b, bases_b in conjuntos.items():
+            if len(bases_a) == 1 and len(bases_b) == 1:
+                puntuacion = constants.ALIGNMENT_MATCH_SCORE if letra_a == letra_b else constants.ALIGNMENT_MISMATCH_SCORE
+            elif bases_a & bases_b:
+                puntuacion = constants.ALIGNMENT_AMBIGUOUS_SCORE
+            else:
+                puntuacion = constants.ALIGNMENT_MISMATCH_SCORE
+            matrix_data[(letra_a, letra_b)] = puntuacion
+    return Align.substitution_matrices.Array(data=matrix_data)
+
+def _configurar_alineador(
+    aligner: Align.PairwiseAligner,
+    modo_alineamiento: str = 'global',
+    incluir_iupac: bool = True,
+    open_gap_score: float = constants.ALIGNMENT_OPEN_GAP_SCORE,
+    extend_gap_score: float = constants.ALIGNMENT_EXTEND_GAP_SCORE
+) -> Align.PairwiseAligner:
+    """Aplica a `aligner` el modo, la matriz de sustitución y las penalizaciones de gap de MitoID."""
     aligner.mode = modo_alineamiento
+    aligner.substitution_matrix = _construir_matriz_sustitucion(incluir_iupac)
+    aligner.open_gap_score = open_gap_score
+    aligner.extend_gap_score = extend_gap_score
+    return aligner
 
-    # Matriz de sustitución personalizada (más adecuada para secuencias cercanas o ADN)
-    # Puntuaciones: Match=3, Mismatch=-3, N vs Base=1, N vs N=1
-    matrix_data = {
-        ('A','A'):3, ('A','T'):-3, ('A','G'):-3, ('A','C'):-3, ('A','N'):1,
-        ('T','T'):3, ('T','A'):-3, ('T','G'):-3, ('T','C'):-3, ('T','N'):1,
-        ('G','G'):3, ('G','A'):-3, ('G','T'):-3, ('G','C'):-3, ('G','N'):1,
-        ('C','C'):3, ('C','A'):-3, ('C','T'):-3, ('C','G'):-3, ('C','N'):1,
-        ('N','N'):1
-    }
-    # Asegurar simetría en la matriz
-    for k_tuple in list(matrix_data.keys()):
-        if (k_tuple[1], k_tuple[0]) not in matrix_data:
-            matrix_data[(k_tuple[1], k_tuple[0])] = matrix_data[k_tuple]
-    
-    custom_matrix = Align.substitution_matrices.Array(data=matrix_data)
-    aligner.substitution_matrix = custom_matrix
-    
-    # Penalizaciones por gap (ajustar según necesidad, estos son valores comunes)
-    aligner.open_gap_score = -7.0
-    aligner.extend_gap_score = -2.0
+@lru_cache(maxsize=None)
+def obtener_alineador(
+    modo_alineamiento: str = 'global',
+    incluir_iupac: bool = True,
+    open_gap_score: float = constants.ALIGNMENT_OPEN_GAP_SCORE,
+    extend_gap_score: float = constants.ALIGNMENT_EXTEND_GAP_SCORE
+) -> Align.PairwiseAligner:
+    """
+    Fábrica de alineadores: construye un PairwiseAligner por combinación de parámetros
+    (modo, matriz, penalizaciones de gap) y lo reutiliza durante todo el proceso.
+    El alineador devuelto es compartido: no debe modificarse.
+    """
+    return _configurar_alineador(Align.PairwiseAligner(), modo_alineamiento, incluir_iupac, open_gap_score, extend_gap_score)
+
+def realizar_alineamiento(
+    rcrs_seq: Seq,
+    query_seq: Seq,
+    modo_alineamiento: str = 'local',
+    anclado: bool = False,
+    prepaso_puntuacion: bool = False,
+    memoria_lineal: bool = False
+) -> Align.Alignment | None:
+    """
+    Alinea la query contra rCRS y devuelve solo el mejor alineamiento.
+    `aligner.align` devuelve un iterador perezoso: se construye únicamente el primer
+    alineamiento óptimo, sin materializar todos los co-óptimos (que se disparan en
+    los C-stretches 303-315 y 16184-16193).
+    Con `prepaso_puntuacion=True` se calcula antes la puntuación óptima con
+    `aligner.score` (sin traceback) y se informa del número de alineamientos
+    co-óptimos sin enumerarlos. En modo local, una puntuación óptima <= 0 evita el traceback.
+    Con `memoria_lineal=True`, el modo global usa `realizar_alineamiento_lineal`.
+    """
+    print(f"\\n--- Iniciando Paso 3: Alineamiento en modo '{modo_alineamiento}' ---")
+    if anclado:
+        alineamiento_anclado = realizar_alineamiento_anclado(rcrs_seq, query_seq, modo_alineamiento)
+        if alineamiento_anclado is not None:
+            return alineamiento_anclado
+        print("Alineamiento anclado no aplicable a esta muestra. Se usa la DP completa.")
+    if memoria_lineal and modo_alineamiento == 'global':
+        return realizar_alineamiento_lineal(rcrs_seq, query_seq)
+
+    aligner = obtener_alineador(modo_alineamiento)
     
     print(f"Configuración del alineador: Modo={aligner.mode}, OpenGap={aligner.open_gap_score}, ExtendGap={aligner.extend_gap_score}")
 
     try:
-        alignments = list(aligner.align(rcrs_seq, query_seq)) # Convertir generador a lista
-        if alignments:
-            best_alignment = alignments[0] # Biopython devuelve el mejor (o uno de los mejores) primero
-            print(f"Alineamiento completado. Puntuación: {best_alignment.score}")
-            return best_alignment
-        else:
+        if prepaso_puntuacion:
+            puntuacion_optima = aligner.score(rcrs_seq, query_seq)
+            print(f"Pre-paso de puntuación: puntuación óptima = {puntuacion_optima}")
+            if modo_alineamiento == 'local' and puntuacion_optima <= 0:
+                print("No se encontraron alineamientos con puntuación positiva.")
+                return None
+
+        alignments = aligner.align(rcrs_seq, query_seq) # Iterador perezoso, no se convierte a lista
+        best_alignment = next(iter(alignments), None) # Biopython devuelve el mejor (o uno de los mejores) primero
+        if best_alignment is None:
             print("No se encontraron alineamientos.")
             return None
+
+        if prepaso_puntuacion:
+            try:
+                num_cooptimos = len(alignments) # Se cuenta sobre la matriz de traceback, sin enumerar
+                print(f"Alineamientos co-óptimos: {num_cooptimos}")
+            except OverflowError:
+                print(f"Alineamientos co-óptimos: más de {sys.maxsize}")
+        print(f"Alineamiento completado. Puntuación: {best_alignment.score}")
+        return best_alignment
     except Exception as e:
         print(f"Ocurrió un error durante el alineamiento: {e}")
         import traceback
         traceback.print_exc()
         return None
 
+# ------------------------------------------------------------------------------
+# Alineamiento anclado: semillas exactas (k-mers) contra rCRS + DP solo en los huecos
+# ------------------------------------------------------------------------------
+
+def _encadenar_anclas(rcrs_str: str, query_str: str, k: int) -> list:
+    """
+    Busca los k-mers de la query en el índice de rCRS, selecciona la cadena colineal
+    más larga (LIS sobre la posición en rCRS) y la fusiona en segmentos de coincidencia
+    exacta no solapados. Devuelve una lista de tuplas (inicio_ref, inicio_query, longitud).
+    """
+    pos_query, pos_ref = obtener_indice_semillas(rcrs_str, k).buscar_unicos(query_str, lineal=True)
+    hits = list(zip(pos_query.tolist(), pos_ref.tolist()))
+    if not hits: return []
+
+    # LIS estricta sobre la posición en referencia (los hits ya están ordenados por q)
+    colas_r, colas_idx = [], []
+    predecesor = [-1] * len(hits)
+    for idx, (q, r) in enumerate(hits):
+        j = bisect.bisect_left(colas_r, r)
+        if j > 0: predecesor[idx] = colas_idx[j - 1]
+        if j == len(colas_r):
+            colas_r.append(r); colas_idx.append(idx)
+        else:
+            colas_r[j] = r; colas_idx[j] = idx
+    cadena = []
+    idx = colas_idx[-1]
+    while idx != -1:
+        cadena.append(hits[idx]); idx = predecesor[idx]
+    cadena.reverse()
+
+    # Fusionar hits de la misma diagonal y recortar solapamientos entre segmentos
+    segmentos = []
+    for q, r in cadena:
+        if segmentos:
+            r0, q0, longitud = segmentos[-1]
+            if q - r == q0 - r0 and q <= q0 + longitud:
+                segmentos[-1] = (r0, q0, max(longitud, q + k - q0))
+                continue
+            solape = max(q0 + longitud - q, r0 + longitud - r, 0)
+            q, r = q + solape, r + solape
+            if solape >= k: continue
+            segmentos.append((r, q, k - solape))
+        else:
+            segmentos.append((r, q, k))
+
+    # Retirar unas bases de cada extremo (y salir de homopolímeros) para que la DP
+    # de los huecos pueda colocar libremente los indels cercanos a un ancla.
+    recorte = constants.ANCHOR_EDGE_TRIM
+    anclas = []
+    for r, q, longitud in segmentos:
+        inicio, fin = r + recorte, r + longitud - recorte
+        while inicio < fin and inicio > 0 and rcrs_str[inicio] == rcrs_str[inicio - 1]: inicio += 1
+        while fin > inicio and fin < len(rcrs_str) and rcrs_str[fin] == rcrs_str[fin - 1]: fin -= 1
+        if fin - inicio > 0:
+            anclas.append((inicio, q + (inicio - r), fin - inicio))
+    return anclas
+
+def _alinear_fragmento(aligner: Align.PairwiseAligner, ref_frag: str, query_frag: str) -> np.ndarray:
+    """
+    Alinea globalmente dos fragmentos (huecos entre anclas) y devuelve las coordenadas
+    relativas (2 x n). Resuelve sin DP los casos en que uno de los fragmentos está vacío.
+    """
+    if not ref_frag and not query_frag:
+        return np.zeros((2, 1), dtype=np.int64)
+    if not ref_frag or not query_frag:
+        return np.array([[0, len(ref_frag)], [0, len(query_frag)]], dtype=np.int64)
+    return np.asarray(aligner.align(ref_frag, query_frag)[0].coordinates, dtype=np.int64)
+
+def _simplificar_coordenadas(puntos: list) -> np.ndarray:
+    """
+    Une una lista de puntos (pos_ref, pos_query) en una matriz de coordenadas 2 x n
+    eliminando puntos repetidos y puntos intermedios de bloques del mismo tipo.
+    """
+    simplificados = []
+    for punto in puntos:
+        if simplificados and punto == simplificados[-1]: continue
+        if len(simplificados) >= 2:
+            (r0, q0), (r1, q1) = simplificados[-2], simplificados[-1]
+            if (r1 > r0, q1 > q0) == (punto[0] > r1, punto[1] > q1):
+                simplificados[-1] = punto
+                continue
+        simplificados.append(punto)
+    return np.array(simplificados, dtype=np.int64).T
+
+def _alinear_gaps_a_5prima(coordenadas: np.ndarray, ref_str: str, query_str: str) -> np.ndarray:
+    """
+    Desplaza cada gap hacia 5' mientras la base que lo precede en el bloque alineado
+    anterior sea igual a su última base (desplazamiento neutro en puntuación). Es la
+    colocación que elige el traceback de la DP completa entre gaps co-óptimos (p. ej.
+    514CA y no 517AC en 513-524); sin este paso, los bordes de las anclas fijan el gap
+    en otra posición equivalente.
+    """
+    bloques = [] # [es_diagonal, r0, q0, r1, q1]
+    for i in range(coordenadas.shape[1] - 1):
+        r0, q0 = (int(x) for x in coordenadas[:, i])
+        r1, q1 = (int(x) for x in coordenadas[:, i + 1])
+        if r1 > r0 and q1 > q0:
+            if bloques and bloques[-1][0] and bloques[-1][3:] == [r0, q0]:
+                bloques[-1][3:] = [r1, q1]
+            else:
+                bloques.append([True, r0, q0, r1, q1])
+            continue
+        if r0 == r1 and q0 == q1:
+            continue
+        desplazamiento = 0
+        if bloques and bloques[-1][0]:
+            secuencia, inicio, fin = (ref_str, r0, r1) if r1 > r0 else (query_str, q0, q1)
+            longitud_previa = bloques[-1][3] - bloques[-1][1]
+            while desplazamiento < longitud_previa and secuencia[inicio - 1 - desplazamiento] == secuencia[fin - 1 - desplazamiento]:
+                desplazamiento += 1
+        if desplazamiento:
+            bloques[-1][3] -= desplazamiento
+            bloques[-1][4] -= desplazamiento
+            bloques.append([False, r0 - desplazamiento, q0 - desplazamiento, r1 - desplazamiento, q1 - desplazamiento])
+            bloques.append([True, r1 - desplazamiento, q1 - desplazamiento, r1, q1])
+        else:
+            bloques.append([False, r0, q0, r1, q1])
+    if not bloques:
+        return coordenadas
+    puntos = [(bloques[0][1], bloques[0][2])] + [(r1, q1) for _, _, _, r1, q1 in bloques]
+    return _simplificar_coordenadas(puntos)
+
+def _puntuar_coordenadas(aligner: Align.PairwiseAligner, ref_str: str, query_str: str, coordenadas: np.ndarray) -> float:
+    """
+    Calcula la puntuación de un camino de alineamiento (matriz de coordenadas) con la
+    matriz de sustitución y las penalizaciones afines del alineador.
+    """
+    matriz = aligner.substitution_matrix
+    alfabeto = matriz.alphabet
+    codigos = np.full(256, alfabeto.index('N'), dtype=np.intp)
+    for i_letra, letra in enumerate(alfabeto):
+        codigos[ord(letra)] = i_letra
+    ref_cod = codigos[np.frombuffer(ref_str.encode('ascii'), dtype=np.uint8)]
+    query_cod = codigos[np.frombuffer(query_str.encode('ascii'), dtype=np.uint8)]
+    valores = np.asarray(matriz)
+
+    puntuacion = 0.0
+    for i in range(coordenadas.shape[1] - 1):
+        r0, q0 = coordenadas[:, i]
+        r1, q1 = coordenadas[:, i + 1]
+        if r1 > r0 and q1 > q0:
+            puntuacion += float(valores[ref_cod[r0:r1], query_cod[q0:q1]].sum())
+        else:
+            longitud_gap = max(r1 - r0, q1 - q0)
+            puntuacion += aligner.open_gap_score + (longitud_gap - 1) * aligner.extend_gap_score
+    return puntuacion
+
+def realizar_alineamiento_anclado(rcrs_seq: Seq, query_seq: Seq, modo_alineamiento: str = 'global') -> Align.Alignment | None:
+    """
+    Alineamiento anclado para queries cercanas a rCRS: encadena k-mers exactos únicos
+    (anclas) y solo ejecuta programación dinámica en los huecos entre anclas y en los
+    flancos. Usa la misma matriz y penalizaciones que `realizar_alineamiento` y
+    devuelve un `Align.Alignment` compatible con `extraer_variantes_crudas`.
+    Devuelve None si la query no tiene suficientes anclas (muestra demasiado divergente).
+    """
+    rcrs_str = str(rcrs_seq).upper()
+    query_str = str(query_seq).upper()
+    k = constants.SEED_KMER_SIZE
+    try:
+        anclas = _encadenar_anclas(rcrs_str, query_str, k)
+        bases_ancladas = sum(longitud for _, _, longitud in anclas)
+        if not anclas or bases_ancladas < constants.ANCHOR_MIN_QUERY_COVERAGE * len(query_str):
+            print(f"Alineamiento anclado: cobertura de anclas insuficiente ({bases_ancladas}/{len(query_str)} bases).")
+            return None
+        print(f"Alineamiento anclado: {len(anclas)} anclas (k={k}) cubren {bases_ancladas}/{len(query_str)} bases de la query.")
+
+        aligner_global = obtener_alineador('global')
+        puntos = []
+
+        # --- Flanco izquierdo ---
+        r_ancla, q_ancla, _ = anclas[0]
+        if modo_alineamiento == 'global':
+            coords = _alinear_fragmento(aligner_global, rcrs_str[:r_ancla], query_str[:q_ancla])
+            puntos.extend(zip(coords[0], coords[1]))
+        else:
+            # Extensión local hacia la izquierda: se incluye el ancla para forzar que el
+            # alineamiento local termine en ella, y luego se corta en su inicio.
+            r_ini = max(0, r_ancla - q_ancla - constants.ANCHOR_FLANK_PADDING)
+            puntos.extend(_extender_flanco_local(rcrs_str, query_str, anclas[0], r_ini, izquierda=True))
+
+        # --- Anclas y huecos intermedios ---
+        for i_ancla, (r0, q0, longitud) in enumerate(anclas):
+            puntos.append((r0, q0))
+            puntos.append((r0 + longitud, q0 + longitud))
+            if i_ancla + 1 < len(anclas):
+                r_sig, q_sig, _ = anclas[i_ancla + 1]
+                r_fin, q_fin = r0 + longitud, q0 + longitud
+                coords = _alinear_fragmento(aligner_global, rcrs_str[r_fin:r_sig], query_str[q_fin:q_sig])
+                puntos.extend(zip(coords[0] + r_fin, coords[1] + q_fin))
+
+        # --- Flanco derecho ---
+        r0, q0, longitud = anclas[-1]
+        r_fin, q_fin = r0 + longitud, q0 + longitud
+        if modo_alineamiento == 'global':
+            coords = _alinear_fragmento(aligner_global, rcrs_str[r_fin:], query_str[q_fin:])
+            puntos.extend(zip(coords[0] + r_fin, coords[1] + q_fin))
+        else:
+            r_tope = min(len(rcrs_str), r_fin + (len(query_str) - q_fin) + constants.ANCHOR_FLANK_PADDING)
+            puntos.extend(_extender_flanco_local(rcrs_str, query_str, anclas[-1], r_tope, izquierda=False))
+
+        coordenadas = _simplificar_coordenadas([(int(r), int(q)) for r, q in puntos])
+        coordenadas = _alinear_gaps_a_5prima(coordenadas, rcrs_str, query_str)
+        alineamiento = Align.Alignment([rcrs_seq, query_seq], coordenadas)
+        alineamiento.score = _puntuar_coordenadas(aligner_global, rcrs_str, query_str, coordenadas)
+        print(f"Alineamiento anclado completado. Puntuación: {alineamiento.score}")
+        return alineamiento
+    except Exception as e:
+        print(f"Ocurrió un error durante el alineamiento anclado: {e}")
+        traceback.print_exc()
+        return None
+
+def _extender_flanco_local(rcrs_str: str, query_str: str, ancla: tuple, r_limite: int, izquierda: bool) -> list:
+    """
+    Extiende en modo local desde un ancla hacia el extremo de la query. El ancla se
+    incluye en el fragmento alineado para que el óptimo local quede pegado a ella;
+    después se descarta la parte del camino que cubre el ancla.
+    Devuelve la lista de puntos (pos_ref, pos_query) del flanco.
+    """
+    r0, q0, longitud = ancla
+    aligner_local = obtener_alineador('local')
+    if izquierda:
+        ref_frag, query_frag = rcrs_str[r_limite:r0 + longitud], query_str[:q0 + longitud]
+        desplaz_r, desplaz_q = r_limite, 0
+        corte = (r0, q0)
+    else:
+        ref_frag, query_frag = rcrs_str[r0:r_limite], query_str[q0:]
+        desplaz_r, desplaz_q = r0, q0
+        corte = (r0 + longitud, q0 + longitud)
+    if len(ref_frag) <= longitud or len(query_frag) <= longitud:
+        return [corte]
+
+    coords = np.asarray(aligner_local.align(ref_frag, query_frag)[0].coordinates, dtype=np.int64)
+    camino = [(int(r) + desplaz_r, int(q) + desplaz_q) for r, q in zip(coords[0], coords[1])]
+    # El corte en el borde del ancla debe pertenecer al camino (bloque diagonal del ancla)
+    for i in range(len(camino) - 1):
+        (ra, qa), (rb, qb) = camino[i], camino[i + 1]
+        if ra <= corte[0] <= rb and qa <= corte[1] <= qb and corte[0] - ra == corte[1] - qa and rb - ra == qb - qa:
+            return camino[:i + 1] + [corte] if izquierda else [corte] + camino[i + 1:]
+    return [corte]
+
+# ------------------------------------------------------------------------------
+# Alineamiento circular: rotación por voto de desplazamientos de k-mers
+# ------------------------------------------------------------------------------
+
+def estimar_rotacion_circular(rcrs_str: str, query_str: str) -> tuple[int, int, int, int] | None:
+    """
+    Vota el desplazamiento (pos_ref - pos_query) mod len(rCRS) de los k-mers únicos
+    compartidos. Devuelve (desplazamiento_mayoritario, q_ancla, r_ancla,
+    desplazamiento_inicial): (q_ancla, r_ancla) es el primer k-mer exacto de la
+    diagonal mayoritaria y `desplazamiento_inicial` el del primer k-mer de la query
+    (0 si la query empieza en el origen de rCRS). None si no comparte k-mers con rCRS o
+    si la diagonal mayoritaria (± CIRCULAR_SHIFT_TOLERANCE) no reúne al menos
+    CIRCULAR_MIN_SUPPORT de los k-mers de la query: el voto no respalda ninguna rotación.
+    """
+    pos_query, pos_ref = obtener_indice_semillas(rcrs_str, constants.SEED_KMER_SIZE).buscar_unicos(query_str)
+    if not len(pos_query): return None
+    longitud_ref = len(rcrs_str)
+    desplazamientos = (pos_ref - pos_query) % longitud_ref
+    # Diagonal más votada; en caso de empate, la que aparece antes en la query
+    valores, primer_idx, votos = np.unique(desplazamientos, return_index=True, return_counts=True)
+    ganador = np.lexsort((primer_idx, -votos))[0]
+    desplazamiento = int(valores[ganador])
+    distancias = np.abs(desplazamientos - desplazamiento)
+    soporte = np.count_nonzero(np.minimum(distancias, longitud_ref - distancias) <= constants.CIRCULAR_SHIFT_TOLERANCE)
+    if soporte < constants.CIRCULAR_MIN_SUPPORT * max(len(query_str) - constants.SEED_KMER_SIZE + 1, 1):
+        return None
+    q_ancla, r_ancla = int(pos_query[primer_idx[ganador]]), int(pos_ref[primer_idx[ganador]])
+    desplazamiento_inicial = int(desplazamientos[0])
+    return desplazamiento, q_ancla, r_ancla, desplazamiento_inicial
+
+def realizar_alineamiento_circular(
+    rcrs_seq: Seq,
+    query_seq: Seq,
+    modo_alineamiento: str = 'global',
+    **opciones_alineamiento
+) -> tuple[Align.Alignment | None, int, int]:
+    """
+    Alineamiento consciente de la circularidad del ADNmt (origen 16569/1).
+    - Modo global (query completa linealizada en otro origen): se rotan query y rCRS
+      en un mismo k-mer exacto, de modo que ambas empiezan alineadas.
+    - Modo local (lectura parcial que cruza el origen): se rota solo rCRS para que la
+      lectura quede completa dentro de la referencia rotada.
+    Se alinea una única vez (sin duplicar la referencia) y se devuelve
+    (alineamiento, desplazamiento_ref, desplazamiento_query) para que
+    `extraer_variantes_crudas` devuelva las variantes en coordenadas estándar de rCRS.
+    Si no hace falta rotar, los desplazamientos son 0 y el resultado es el lineal.
+    """
+    rcrs_str = str(rcrs_seq).upper()
+    query_str = str(query_seq).upper()
+    longitud_ref = len(rcrs_str)
+    desplazamiento_ref, desplazamiento_query = 0, 0
+
+    rotacion = estimar_rotacion_circular(rcrs_str, query_str)
+    if rotacion is not None:
+        desplazamiento, q_ancla, r_ancla, desplazamiento_inicial = rotacion
+        # Un desplazamiento inicial de pocas pb es un indel cerca del origen, no una rotación
+        if modo_alineamiento == 'global' and constants.CIRCULAR_SHIFT_TOLERANCE < desplazamiento_inicial < longitud_ref - constants.CIRCULAR_SHIFT_TOLERANCE:
+            desplazamiento_ref, desplazamiento_query = r_ancla, q_ancla
+        elif modo_alineamiento == 'local' and desplazamiento + len(query_str) > longitud_ref:
+            desplazamiento_ref = (desplazamiento - constants.ANCHOR_FLANK_PADDING) % longitud_ref
+
+    if desplazamiento_ref or desplazamiento_query:
+        print(f"Alineamiento circular: rCRS rotada {desplazamiento_ref} pb, query rotada {desplazamiento_query} pb.")
+        rcrs_seq = Seq(rcrs_str[desplazamiento_ref:] + rcrs_str[:desplazamiento_ref])
+        query_seq = Seq(query_str[desplazamiento_query:] + query_str[:desplazamiento_query])
+    alineamiento = realizar_alineamiento(rcrs_seq, query_seq, modo_alineamiento, **opciones_alineamiento)
+    return alineamiento, desplazamiento_ref, desplazamiento_query
+
+# ------------------------------------------------------------------------------
+# Alineamiento global en memoria lineal (Hirschberg / Myers-Miller con gaps afines)
+# ------------------------------------------------------------------------------
+
+@lru_cache(maxsize=None)
+def _obtener_alineador_caso_base(inicio_abierto: bool, fin_abierto: bool) -> Align.PairwiseAligner:
+    """
+    Alineador global para los subproblemas pequeños de Hirschberg. Si el subproblema
+    continúa una deleción ya abierta por el nivel superior (al inicio o al final), la
+    deleción en ese extremo no vuelve a pagar la apertura del gap.
+    """
+    aligner = _configurar_alineador(Align.PairwiseAligner(), 'global')
+    if inicio_abierto:
+        aligner.open_left_deletion_score = constants.ALIGNMENT_EXTEND_GAP_SCORE
+    if fin_abierto:
+        aligner.open_right_deletion_score = constants.ALIGNMENT_EXTEND_GAP_SCORE
+    return aligner
+
+def _ultima_fila_afin(ref_cod: np.ndarray, perfil_query: np.ndarray, inicio_abierto: bool) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Pasada DP de Gotoh fila a fila en memoria O(m). Devuelve, para la última fila,
+    la mejor puntuación en cualquier estado (H) y la mejor terminando en deleción (D).
+    El gap horizontal (inserción) de cada fila se resuelve con un máximo acumulado.
+    """
+    g_open = constants.ALIGNMENT_OPEN_GAP_SCORE
+    g_ext = constants.ALIGNMENT_EXTEND_GAP_SCORE
+    m = perfil_query.shape[1]
+    j = np.arange(m + 1, dtype=np.float64)
+    H = np.empty(m + 1)
+    H[0] = 0.0
+    H[1:] = g_open + (j[1:] - 1) * g_ext
+    D = np.full(m + 1, -np.inf)
+    if inicio_abierto: D[0] = 0.0
+    desplaz_ins = (g_open - g_ext) - g_ext * j
+    diag = np.empty(m + 1)
+    diag[0] = -np.inf
+    ins = np.empty(m + 1)
+    ins[0] = -np.inf
+    for codigo in ref_cod:
+        D = np.maximum(H + g_open, D + g_ext)
+        np.add(H[:-1], perfil_query[codigo], out=diag[1:])
+        H0 = np.maximum(diag, D)
+        acumulado = np.maximum.accumulate(H0 + desplaz_ins)
+        np.add(g_ext * j[1:], acumulado[:-1], out=ins[1:])
+        H = np.maximum(H0, ins)
+    return H, D
+
+def _hirschberg(ref_cod, query_cod, valores, a0, a1, b0, b1, inicio_abierto, fin_abierto, ref_str, query_str, puntos):
+    """Resuelve recursivamente el subproblema [a0:a1] x [b0:b1] y añade su camino a `puntos`."""
+    if a0 == a1 or b0 == b1:
+        puntos.extend([(a0, b0), (a1, b1)])
+        return
+    if a1 - a0 < 2 or (a1 - a0) * (b1 - b0) <= constants.LINEAR_ALIGNMENT_BASE_CASE_CELLS:
+        aligner = _obtener_alineador_caso_base(inicio_abierto, fin_abierto)
+        coords = aligner.align(ref_str[a0:a1], query_str[b0:b1])[0].coordinates
+        puntos.extend((int(r) + a0, int(q) + b0) for r, q in zip(coords[0], coords[1]))
+        return
+
+    mid = (a0 + a1) // 2
+    perfil = valores[:, query_cod[b0:b1]]
+    H_f, D_f = _ultima_fila_afin(ref_cod[a0:mid], perfil, inicio_abierto)
+    H_r, D_r = _ultima_fila_afin(ref_cod[mid:a1][::-1], perfil[:, ::-1], fin_abierto)
+    union_normal = H_f + H_r[::-1]
+    union_gap = D_f + D_r[::-1] - constants.ALIGNMENT_OPEN_GAP_SCORE + constants.ALIGNMENT_EXTEND_GAP_SCORE
+    j_normal = int(np.argmax(union_normal))
+    j_gap = int(np.argmax(union_gap))
+
+    if union_normal[j_normal] >= union_gap[j_gap]:
+        _hirschberg(ref_cod, query_cod, valores, a0, mid, b0, b0 + j_normal, inicio_abierto, False, ref_str, query_str, puntos)
+        _hirschberg(ref_cod, query_cod, valores, mid, a1, b0 + j_normal, b1, False, fin_abierto, ref_str, query_str, puntos)
+    else:
+        # El camino cruza la fila central dentro de una deleción: A[mid-1] y A[mid] se
+        # deletean en la columna j y los subproblemas continúan ese gap ya abierto.
+        columna = b0 + j_gap
+        _hirschberg(ref_cod, query_cod, valores, a0, mid - 1, b0, columna, inicio_abierto, True, ref_str, query_str, puntos)
+        puntos.extend([(mid - 1, columna), (mid + 1, columna)])
+        _hirschberg(ref_cod, query_cod, valores, mid + 1, a1, columna, b1, True, fin_abierto, ref_str, query_str, puntos)
+
+def realizar_alineamiento_lineal(rcrs_seq: Seq, query_seq: Seq) -> Align.Alignment | None:
+    """
+    Alineamiento global en memoria lineal (divide y vencerás de Hirschberg con la
+    extensión de Myers-Miller para gaps afines). Obtiene la misma puntuación óptima
+    que el PairwiseAligner global con la matriz y penalizaciones de MitoID, sin
+    guardar la matriz de traceback completa de 16.5 kb x 16.5 kb: solo los
+    subproblemas de hasta LINEAR_ALIGNMENT_BASE_CASE_CELLS celdas usan traceback.
+    """
+    rcrs_str = str(rcrs_seq).upper()
+    query_str = str(query_seq).upper()
+    try:
+        matriz = _construir_matriz_sustitucion(True)
+        alfabeto = matriz.alphabet
+        codigos = np.full(256, alfabeto.index('N'), dtype=np.intp)
+        for i_letra, letra in enumerate(alfabeto):
+            codigos[ord(letra)] = i_letra
+        ref_cod = codigos[np.frombuffer(rcrs_str.encode('ascii'), dtype=np.uint8)]
+        query_cod = codigos[np.frombuffer(query_str.encode('ascii'), dtype=np.uint8)]
+        valores = np.asarray(matriz, dtype=np.float64)
+
+        puntos = []
+        _hirschberg(ref_cod, query_cod, valores, 0, len(rcrs_str), 0, len(query_str), False, False, rcrs_str, query_str, puntos)
+        coordenadas = _simplificar_coordenadas(puntos)
+        alineamiento = Align.Alignment([rcrs_seq, query_seq], coordenadas)
+        alineamiento.score = _puntuar_coordenadas(obtener_alineador('global'), rcrs_str, query_str, coordenadas)
+        print(f"Alineamiento en memoria lineal completado. Puntuación: {alineamiento.score}")
+        return alineamiento
+    except Exception as e:
+        print(f"Ocurrió un error durante el alineamiento en memoria lineal: {e}")
+        traceback.print_exc()
+        return None
+
+# ------------------------------------------------------------------------------
+# Índice columna de alineamiento <-> posición en las secuencias
+# ------------------------------------------------------------------------------
+
+class IndiceAlineamiento:
+    """
+    Índice de prefijos de un alineamiento, construido una sola vez: bases de
+    referencia y de query acumuladas por columna (arrays int32) y la columna de
+    cada base de referencia. Responde en O(1) columna -> posición ref/query y
+    posición ref -> columna, sin copiar ni recorrer las cadenas alineadas.
+    Si se indica `longitud_ref`/`longitud_query`, las posiciones se dan módulo
+    esa longitud (alineamientos circulares que cruzan el origen 16569/1).
+    """
+
+    def __init__(self, aligned_ref: str, aligned_query: str, offset_ref_0based: int = 0,
+                 offset_query_0based: int = 0, longitud_ref: int | None = None, longitud_query: int | None = None):
+        es_base_ref = np.frombuffer(aligned_ref.encode('ascii'), dtype=np.uint8) != ord('-')
+        es_base_query = np.frombuffer(aligned_query.encode('ascii'), dtype=np.uint8) != ord('-')
+        self.num_columnas = len(aligned_ref)
+        # bases_*_acumuladas[c] = bases no-gap en las columnas [0, c)
+        self.bases_ref_acumuladas = np.zeros(self.num_columnas + 1, dtype=np.int32)
+        np.cumsum(es_base_ref, out=self.bases_ref_acumuladas[1:])
+        self.bases_query_acumuladas = np.zeros(len(aligned_query) + 1, dtype=np.int32)
+        np.cumsum(es_base_query, out=self.bases_query_acumuladas[1:])
+        self.columnas_ref = np.flatnonzero(es_base_ref).astype(np.int32) # k-ésima base de ref -> columna
+        self.offset_ref = offset_ref_0based
+        self.offset_query = offset_query_0based
+        self.longitud_ref = longitud_ref
+        self.longitud_query = longitud_query
+
+    @property
+    def total_bases_ref(self) -> int:
+        return int(self.bases_ref_acumuladas[-1])
+
+    @property
+    def total_bases_query(self) -> int:
+        return int(self.bases_query_acumuladas[-1])
+
+    def bases_ref_entre(self, col_inicio: int, col_fin: int) -> int:
+        """Bases de referencia (no gaps) en las columnas [col_inicio, col_fin)."""
+        return int(self.bases_ref_acumuladas[col_fin] - self.bases_ref_acumuladas[col_inicio])
+
+    def bases_query_entre(self, col_inicio: int, col_fin: int) -> int:
+        """Bases de query (no gaps) en las columnas [col_inicio, col_fin)."""
+        return int(self.bases_query_acumuladas[col_fin] - self.bases_query_acumuladas[col_inicio])
+
+    @staticmethod
+    def _rango_1based(acumuladas: np.ndarray, offset: int, longitud: int | None, col_inicio: int, col_fin: int) -> tuple[int, int]:
+        antes = int(acumuladas[col_inicio])
+        n_bases = int(acumuladas[col_fin]) - antes
+        inicio = offset + antes
+        fin = inicio + max(n_bases, 1) - 1 # Sin bases (solo gaps): fin = inicio
+        if longitud: inicio, fin = inicio % longitud, fin % longitud
+        return inicio + 1, fin + 1
+
+    def rango_ref_1based(self, col_inicio: int, col_fin: int) -> tuple[int, int]:
+        """Primera y última posición 1-based de referencia cubiertas por las columnas [col_inicio, col_fin)."""
+        return self._rango_1based(self.bases_ref_acumuladas, self.offset_ref, self.longitud_ref, col_inicio, col_fin)
+
+    def rango_query_1based(self, col_inicio: int, col_fin: int) -> tuple[int, int]:
+        """Primera y última posición 1-based de query cubiertas por las columnas [col_inicio, col_fin)."""
+        return self._rango_1based(self.bases_query_acumuladas, self.offset_query, self.longitud_query, col_inicio, col_fin)
+
+    def columna_de_posicion_ref(self, pos_ref_1based: int) -> int | None:
+        """Columna del alineamiento que ocupa la base de referencia `pos_ref_1based` (None si queda fuera)."""
+        k = pos_ref_1based - 1 - self.offset_ref
+        if self.longitud_ref: k %= self.longitud_ref
+        return int(self.columnas_ref[k]) if 0 <= k < len(self.columnas_ref) else None
+
+@lru_cache(maxsize=None)
 def get_substitution_type(ref_base: str, alt_base: str) -> str:
 
     purines = {'A', 'G'}
     pyrimidines = {'C', 'T'}
     ref_b, alt_b = ref_base.upper(), alt_base.upper()
 
+    if ref_b in constants.IUPAC_MIXED_BASES.keys() - {'N'} or alt_b in constants.IUPAC_MIXED_BASES.keys() - {'N'}:
+        return "substitution" # Base ambigua IUPAC (p. ej. heteroplasmia Y)
     if not (ref_b in "ACGTN" and alt_b in "ACGTN"): return "desconocido"
     if ref_b == 'N' or alt_b == 'N': return "substitution (con N)"
     if ref_b == alt_b: return "identico"
@@ -72,7 +639,85 @@ def get_substitution_type(ref_base: str, alt_base: str) -> str:
         return "transversion"
     return "substitution"
 
-def extraer_variantes_crudas(alineamiento: Align.Alignment, rcrs_id: str, query_id: str, rcrs_len: int) -> tuple[list, str, str, int, int]:
+def _a_coordenada_rcrs(pos_rotada: int, desplazamiento_ref: int, rcrs_len: int) -> int:
+    """Posición 0-based en la rCRS rotada -> posición 0-based estándar de rCRS."""
+    if not desplazamiento_ref: return pos_rotada
+    return (pos_rotada + desplazamiento_ref) % rcrs_len if pos_rotada >= 0 else (desplazamiento_ref - 1) % rcrs_len
+
+def _clave_posicion_rcrs(variante) -> float:
+    """Orden de una variante cruda en rCRS: una inserción va tras su base de anclaje (0-based)."""
+    return variante['pos'] + 1.5 if variante['type'] == 'insertion' else variante['pos']
+
+def generar_variantes_crudas(alineamiento: Align.Alignment, rcrs_len: int, desplazamiento_ref: int = 0):
+    """
+    Etapa en flujo: produce las variantes crudas (sin filtrar artefactos) en orden de
+    columna del alineamiento. Recorre los bloques de `coordinates` sobre vistas uint8
+    de ambas secuencias: los mismatches de cada bloque diagonal salen de una
+    comparación de arrays y los indels de los puntos de corte entre bloques. Un indel
+    se emite cuando termina (bloques de gap consecutivos del mismo tipo se fusionan).
+    """
+    ref_bytes = np.frombuffer(str(alineamiento.sequences[0]).upper().encode('ascii'), dtype=np.uint8)
+    query_bytes = np.frombuffer(str(alineamiento.sequences[1]).upper().encode('ascii'), dtype=np.uint8)
+    coordenadas = np.asarray(alineamiento.coordinates, dtype=np.int64)
+
+    pendiente = None # Indel en curso, aún ampliable por el bloque siguiente
+    align_col_idx = 0
+    for i_bloque in range(coordenadas.shape[1] - 1):
+        r0, q0 = int(coordenadas[0, i_bloque]), int(coordenadas[1, i_bloque])
+        r1, q1 = int(coordenadas[0, i_bloque + 1]), int(coordenadas[1, i_bloque + 1])
+        if r1 > r0 and q1 > q0: # Bloque alineado: sustituciones
+            diferencias = np.flatnonzero(ref_bytes[r0:r1] != query_bytes[q0:q1]).tolist()
+            if pendiente and diferencias:
+                yield pendiente; pendiente = None
+            for d in diferencias:
+                r_base, q_base = chr(ref_bytes[r0 + d]), chr(query_bytes[q0 + d])
+                var_type = get_substitution_type(r_base, q_base)
+                yield Variante(_a_coordenada_rcrs(r0 + d, desplazamiento_ref, rcrs_len) + 1, r_base, q_base, var_type, align_col_idx + d)
+            align_col_idx += r1 - r0
+        elif q1 > q0: # Inserción (gap en referencia), anclada a la base 0-based anterior
+            ins_seq = query_bytes[q0:q1].tobytes().decode('ascii')
+            if pendiente and pendiente.type == 'insertion' and pendiente.align_idx + len(pendiente.alt) == align_col_idx:
+                pendiente.alt += ins_seq # Bloques de inserción consecutivos: un solo evento
+            else:
+                if pendiente: yield pendiente
+                pendiente = Variante(_a_coordenada_rcrs(r0 - 1, desplazamiento_ref, rcrs_len), '-', ins_seq, 'insertion', align_col_idx)
+            align_col_idx += q1 - q0
+        elif r1 > r0: # Deleción (gap en query), posición 1-based de la primera base deletada
+            del_seq = ref_bytes[r0:r1].tobytes().decode('ascii')
+            if pendiente and pendiente.type == 'deletion' and pendiente.align_idx + len(pendiente.ref) == align_col_idx:
+                pendiente.ref += del_seq
+            else:
+                if pendiente: yield pendiente
+                pendiente = Variante(_a_coordenada_rcrs(r0, desplazamiento_ref, rcrs_len) + 1, del_seq, '-', 'deletion', align_col_idx)
+            align_col_idx += r1 - r0
+    if pendiente:
+        yield pendiente
+
+def filtrar_variantes_artefacto(raw_variants: list) -> list:
+    """Filtrado de artefactos y blacklist (reglas declarativas indexadas por posición)."""
+    variants_final_filtradas, artefactos = obtener_filtro_artefactos().filtrar(raw_variants)
+    if artefactos:
+        print(f"Se filtraron {len(artefactos)} variantes problemáticas/artefactos (ej. 3107, C3106N, N3107X). Variantes restantes: {len(variants_final_filtradas)}")
+    return variants_final_filtradas
+
+def extraer_variantes_crudas(
+    alineamiento: Align.Alignment,
+    rcrs_id: str,
+    query_id: str,
+    rcrs_len: int,
+    desplazamiento_ref: int = 0,
+    desplazamiento_query: int = 0,
+    filtrar_artefactos: bool = True
+) -> tuple[list, str, str, int, int]:
+    """
+    Extrae las variantes crudas del alineamiento. Si el alineamiento procede de
+    `realizar_alineamiento_circular`, los desplazamientos de rotación devuelven las
+    posiciones a coordenadas estándar de rCRS (módulo `rcrs_len`); un evento que cruza
+    el origen 16569/1 se reporta como una sola variante anclada en su inicio, y las
+    variantes se reordenan por posición en rCRS (no por columna de la referencia rotada).
+    Con `filtrar_artefactos=False` se devuelven antes del filtro de artefactos (la caché
+    de alineamientos guarda estas y filtra en cada lectura con las reglas vigentes).
+    """
     print("\\n--- Iniciando Paso 4: Extracción de Variantes Crudas ---")
     
     raw_variants = []
@@ -117,102 +762,23 @@ def extraer_variantes_crudas(alineamiento: Align.Alignment, rcrs_id: str, query_
          alignment_offset_ref = 0 
          alignment_offset_query = 0
 
-    ref_pos_in_align_segment = 0 
     try:
         als_ref = str(alineamiento[0])
         als_query = str(alineamiento[1])
         if not als_ref or not als_query or len(als_ref) != len(als_query):
             print(f"Error en obtención de secuencias alineadas: Longitudes no coinciden. Ref:{len(als_ref)}, Query:{len(als_query)}")
             return [], "", "", 0, 0 
-        
-        i = 0
-        while i < len(als_ref):
-            r_base, q_base = als_ref[i], als_query[i]
-            align_col_idx = i 
-            consumes_ref_current_char = (r_base != '-')
-            current_abs_pos_1_based_ref = alignment_offset_ref + ref_pos_in_align_segment + 1
-            
-            if r_base != q_base:
-                if r_base != '-' and q_base != '-': 
-                    var_type = get_substitution_type(r_base, q_base)
-                    raw_variants.append({'pos': current_abs_pos_1_based_ref, 'ref': r_base.upper(), 'alt': q_base.upper(), 'type': var_type, 'align_idx': align_col_idx})
-                    i += 1
-                elif r_base == '-': 
-                    ins_seq = ""
-                    start_align_idx = align_col_idx
-                    insertion_point_ref_pos_0_based = alignment_offset_ref + ref_pos_in_align_segment -1
-                    if ref_pos_in_align_segment == 0 and alignment_offset_ref == 0: 
-                        insertion_point_ref_pos_0_based = -1 
-                    
-                    while i < len(als_ref) and als_ref[i] == '-':
-                        ins_seq += als_query[i]
-                        i += 1
-                    raw_variants.append({'pos': insertion_point_ref_pos_0_based, 'ref': '-', 'alt': ins_seq.upper(), 'type': 'insertion', 'align_idx': start_align_idx})
-                elif q_base == '-': 
-                    del_seq = ""
-                    start_align_idx = align_col_idx
-                    del_start_abs_pos_1_based = current_abs_pos_1_based_ref
-                    temp_ref_pos_tracker_del_segment = ref_pos_in_align_segment 
-                    while i < len(als_ref) and als_query[i] == '-':
-                        del_seq += als_ref[i]
-                        i += 1
-                        if als_ref[i-1] != '-':
-                             temp_ref_pos_tracker_del_segment +=1 
-                    raw_variants.append({'pos': del_start_abs_pos_1_based, 'ref': del_seq.upper(), 'alt': '-', 'type': 'deletion', 'align_idx': start_align_idx})
-                    ref_pos_in_align_segment = temp_ref_pos_tracker_del_segment 
-                    continue 
-            else: 
-                i += 1
-            
-            if consumes_ref_current_char: 
-                ref_pos_in_align_segment += 1
-        
+
+        raw_variants = list(generar_variantes_crudas(alineamiento, rcrs_len, desplazamiento_ref))
+        if desplazamiento_ref: # Orden de columna de la rCRS rotada -> orden de posición en rCRS estándar
+            raw_variants.sort(key=_clave_posicion_rcrs)
         print(f"Se encontraron {len(raw_variants)} diferencias crudas (antes de filtrar).")
 
-        # --- INICIO DE LA LÓGICA DE FILTRADO MODIFICADA PARA ARTEFACTOS Y 3107 ---
-    
-        variants_final_filtradas = [] 
-        num_artefactos_filtrados_total = 0
-        
-        for var_cruda in raw_variants:
-            filtrar_esta_variante = False
-            
-            tipo_var = var_cruda.get('type', '')
-            pos_var = var_cruda.get('pos')
-            ref_var = var_cruda.get('ref', '').upper()
-            alt_var = var_cruda.get('alt', '').upper()
-
-            # Condición 0: Filtrar la posición 3107 según SWGDAM/EMPOP
-            if pos_var == constants.POS_3107_BLACKLISTED:
-                filtrar_esta_variante = True
-                # print(f"DEBUG: Filtrando por Condición 0 (Posición {POS_3107_BLACKLISTED}): {var_cruda}")
-
-            # Condición 1: Artefacto m.3107delN (aunque ya cubierto por Condición 0, lo mantenemos por si acaso)
-            elif tipo_var == 'deletion' and pos_var == 3107 and ref_var == 'N':
-                filtrar_esta_variante = True
-                # print(f"DEBUG: Filtrando por Condición 1 (3107delN): {var_cruda}")
-
-            # Condición 2: Artefacto C3106N (Sustitución C>N en pos 3106)
-            # (La rCRS tiene C en 3106. Si la query tiene N allí)
-            elif tipo_var.startswith('substitution') and pos_var == 3106 and ref_var == 'C' and alt_var == 'N':
-                filtrar_esta_variante = True
-                # print(f"DEBUG: Filtrando por Condición 2 (C3106N): {var_cruda}")
-
-            # Condición 3: Artefacto N3107X (Sustitución N>[ACGT] en pos 3107)
-            # (La rCRS tiene N en 3107. Si la query tiene una base canónica allí)
-            elif tipo_var.startswith('substitution') and pos_var == 3107 and ref_var == 'N' and alt_var in ['A', 'C', 'G', 'T']:
-                filtrar_esta_variante = True
-                # print(f"DEBUG: Filtrando por Condición 3 (N3107X): {var_cruda}")
-
-            if filtrar_esta_variante:
-                num_artefactos_filtrados_total += 1
-            else:
-                variants_final_filtradas.append(var_cruda)
-        
-        if num_artefactos_filtrados_total > 0:
-            print(f"Se filtraron {num_artefactos_filtrados_total} variantes problemáticas/artefactos (ej. 3107, C3106N, N3107X). Variantes restantes: {len(variants_final_filtradas)}")
-        # --- FIN DE LA LÓGICA DE FILTRADO MODIFICADA ---
+        variants_final_filtradas = filtrar_variantes_artefacto(raw_variants) if filtrar_artefactos else raw_variants
         
+        if desplazamiento_ref or desplazamiento_query:
+            alignment_offset_ref = _a_coordenada_rcrs(alignment_offset_ref, desplazamiento_ref, rcrs_len)
+            alignment_offset_query = (alignment_offset_query + desplazamiento_query) % len(alineamiento.sequences[1])
         return variants_final_filtradas, als_ref, als_query, alignment_offset_ref, alignment_offset_query
     
     except Exception as e: 
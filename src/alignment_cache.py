@@ -0,0 +1,169 @@
+# ==============================================================================
+# BLOQUE 3b: CACHÉ PERSISTENTE DE ALINEAMIENTOS
+# ==============================================================================
+# Descripción: Envuelve `realizar_alineamiento(_circular)` y
+# `extraer_variantes_crudas` con una caché en disco direccionada por contenido.
+# La clave es el SHA-256 de la query normalizada, la rCRS y los parámetros del
+# alineador; cada entrada guarda solo lo compacto (array de coordenadas,
+# puntuación, desplazamientos circulares, offsets y el lote columnar de
+# variantes crudas) y el alineamiento se reconstruye sin DP. Las variantes se
+# guardan antes del filtro de artefactos, que se aplica en cada lectura: un
+# cambio de reglas (`ARTIFACT_RULES` o su JSON) no deja artefactos en caché. El tamaño total
+# se acota expulsando las entradas usadas hace más tiempo (LRU por mtime).
+# ------------------------------------------------------------------------------
+
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+from Bio import Align
+from Bio.Seq import Seq
+from . import constants
+from .alignment_and_variant_calling import realizar_alineamiento, realizar_alineamiento_circular, extraer_variantes_crudas, filtrar_variantes_artefacto
+from .variant_records import LoteVariantes
+
+
+def calcular_clave_alineamiento(rcrs_str: str, query_str: str, modo_alineamiento: str, circular: bool, **opciones_alineamiento) -> str:
+    """
+    Clave SHA-256 del alineamiento: secuencias normalizadas (mayúsculas, sin espacios)
+    más todo parámetro que cambia el resultado (puntuaciones, modo, motor, anclaje).
+    """
+    parametros = {
+        "version": constants.ALIGNMENT_CACHE_VERSION,
+        "modo": modo_alineamiento,
+        "circular": bool(circular),
+        "anclado": bool(opciones_alineamiento.get("anclado", False)),
+        "memoria_lineal": bool(opciones_alineamiento.get("memoria_lineal", False)),
+        "puntuaciones": [constants.ALIGNMENT_MATCH_SCORE, constants.ALIGNMENT_MISMATCH_SCORE, constants.ALIGNMENT_AMBIGUOUS_SCORE,
+                         constants.ALIGNMENT_OPEN_GAP_SCORE, constants.ALIGNMENT_EXTEND_GAP_SCORE],
+        "anclas": [constants.SEED_KMER_SIZE, constants.ANCHOR_EDGE_TRIM, constants.ANCHOR_MIN_QUERY_COVERAGE, constants.ANCHOR_FLANK_PADDING],
+    }
+    h = hashlib.sha256()
+    h.update(json.dumps(parametros, sort_keys=True).encode("utf-8"))
+    for secuencia in (rcrs_str, query_str):
+        secuencia_norm = "".join(secuencia.split()).upper().encode("ascii")
+        h.update(len(secuencia_norm).to_bytes(8, "little"))
+        h.update(secuencia_norm)
+    return h.hexdigest()
+
+def _ruta_entrada(clave: str, directorio: str) -> str:
+    return os.path.join(directorio, f"{clave}.npz")
+
+def leer_alineamiento_cache(clave: str, directorio: str = constants.ALIGNMENT_CACHE_DIR) -> dict | None:
+    """Devuelve la entrada de la caché (o None si no existe o está corrupta) y la marca como usada."""
+    ruta = _ruta_entrada(clave, directorio)
+    if not os.path.exists(ruta):
+        return None
+    try:
+        with np.load(ruta, allow_pickle=False) as datos:
+            entrada = {
+                "coordenadas": datos["coordenadas"],
+                "score": float(datos["score"]),
+                "desplazamientos": tuple(int(x) for x in datos["desplazamientos"]),
+                "offsets": tuple(int(x) for x in datos["offsets"]),
+                "variantes": LoteVariantes.desde_arrays({nombre[len("variantes_"):]: datos[nombre] for nombre in datos.files if nombre.startswith("variantes_")}).como_variantes(),
+            }
+        os.utime(ruta) # Uso reciente para la expulsión LRU
+        return entrada
+    except Exception as e:
+        print(f"Advertencia: Entrada de caché de alineamiento ilegible ('{ruta}'), se descarta: {e}")
+        try: os.remove(ruta)
+        except OSError: pass
+        return None
+
+def guardar_alineamiento_cache(
+    clave: str,
+    alineamiento: Align.Alignment,
+    desplazamientos: tuple[int, int],
+    offsets: tuple[int, int],
+    variantes: list,
+    directorio: str = constants.ALIGNMENT_CACHE_DIR,
+    max_bytes: int = constants.ALIGNMENT_CACHE_MAX_BYTES
+) -> None:
+    """Escribe la entrada de forma atómica (archivo temporal + rename) y aplica el límite de tamaño."""
+    try:
+        os.makedirs(directorio, exist_ok=True)
+        fd, ruta_tmp = tempfile.mkstemp(dir=directorio, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(
+                f,
+                coordenadas=np.asarray(alineamiento.coordinates, dtype=np.int64),
+                score=np.float64(alineamiento.score),
+                desplazamientos=np.asarray(desplazamientos, dtype=np.int64),
+                offsets=np.asarray(offsets, dtype=np.int64),
+                **{f"variantes_{nombre}": array for nombre, array in LoteVariantes.desde_variantes(variantes).como_arrays().items()},
+            )
+        os.replace(ruta_tmp, _ruta_entrada(clave, directorio))
+        _expulsar_entradas_antiguas(directorio, max_bytes)
+    except Exception as e:
+        print(f"Advertencia: No se pudo guardar el alineamiento en la caché: {e}")
+
+def _expulsar_entradas_antiguas(directorio: str, max_bytes: int) -> None:
+    entradas = []
+    for nombre in os.listdir(directorio):
+        if not nombre.endswith(".npz"): continue
+        try:
+            st = os.stat(os.path.join(directorio, nombre))
+            entradas.append((st.st_mtime, st.st_size, nombre))
+        except OSError:
+            continue
+    total = sum(tam for _, tam, _ in entradas)
+    for _, tam, nombre in sorted(entradas):
+        if total <= max_bytes: break
+        try:
+            os.remove(os.path.join(directorio, nombre))
+            total -= tam
+        except OSError:
+            pass
+
+def alinear_y_extraer_variantes(
+    rcrs_str: str,
+    query_str: str,
+    rcrs_id: str,
+    query_id: str,
+    modo_alineamiento: str,
+    circular: bool = constants.CIRCULAR_ALIGNMENT_ENABLED,
+    usar_cache: bool = constants.ALIGNMENT_CACHE_ENABLED,
+    **opciones_alineamiento
+) -> tuple:
+    """
+    Alineamiento + extracción de variantes crudas con caché persistente.
+    Devuelve (alineamiento, variantes, als_ref, als_query, offset_ref_0b, offset_query_0b,
+    desplazamiento_ref, desplazamiento_query); `alineamiento` es None si falló.
+    En un acierto no se ejecuta ni la DP ni la extracción.
+    """
+    rcrs_str = rcrs_str.upper()
+    query_str = query_str.upper()
+    clave = calcular_clave_alineamiento(rcrs_str, query_str, modo_alineamiento, circular, **opciones_alineamiento) if usar_cache else None
+
+    entrada = leer_alineamiento_cache(clave) if clave else None
+    if entrada is not None:
+        desplazamiento_ref, desplazamiento_query = entrada["desplazamientos"]
+        alineamiento = Align.Alignment(
+            [Seq(rcrs_str[desplazamiento_ref:] + rcrs_str[:desplazamiento_ref]),
+             Seq(query_str[desplazamiento_query:] + query_str[:desplazamiento_query])],
+            entrada["coordenadas"]
+        )
+        alineamiento.score = entrada["score"]
+        print(f"Alineamiento recuperado de la caché ({clave[:12]}...). Puntuación: {alineamiento.score}")
+        return (alineamiento, filtrar_variantes_artefacto(entrada["variantes"]), str(alineamiento[0]), str(alineamiento[1]),
+                *entrada["offsets"], desplazamiento_ref, desplazamiento_query)
+
+    desplazamiento_ref, desplazamiento_query = 0, 0
+    if circular:
+        alineamiento, desplazamiento_ref, desplazamiento_query = realizar_alineamiento_circular(
+            Seq(rcrs_str), Seq(query_str), modo_alineamiento, **opciones_alineamiento
+        )
+    else:
+        alineamiento = realizar_alineamiento(Seq(rcrs_str), Seq(query_str), modo_alineamiento, **opciones_alineamiento)
+    if not alineamiento:
+        return None, [], "", "", 0, 0, 0, 0
+
+    variantes, als_ref, als_query, offset_ref, offset_query = extraer_variantes_crudas(
+        alineamiento, rcrs_id, query_id, len(rcrs_str),
+        desplazamiento_ref=desplazamiento_ref, desplazamiento_query=desplazamiento_query, filtrar_artefactos=False
+    )
+    if clave and als_ref:
+        guardar_alineamiento_cache(clave, alineamiento, (desplazamiento_ref, desplazamiento_query), (offset_ref, offset_query), variantes)
+    return alineamiento, filtrar_variantes_artefacto(variantes), als_ref, als_query, offset_ref, offset_query, desplazamiento_ref, desplazamiento_query
@@ -0,0 +1,244 @@
+# ==============================================================================
+# BLOQUE 3f: VALIDACIÓN DE EQUIVALENCIA DE LOS MOTORES DE ALINEAMIENTO
+# ==============================================================================
+# Descripción: Comprueba sobre queries derivadas de rCRS que los motores
+# rápidos dan el mismo resultado que la DP completa de PairwiseAligner:
+# - motor anclado (`anclado=True`) frente a la DP completa: misma puntuación y
+#   mismas variantes crudas, en modo global y local, lineal y circular.
+# - backend Hirschberg en memoria lineal (`realizar_alineamiento_lineal`)
+#   frente a PairwiseAligner global: misma puntuación óptima.
+# - extracción por bloques (`generar_variantes_crudas`) frente al recorrido
+#   columna a columna de las cadenas alineadas que usaba MitoID: mismos
+#   registros (pos, ref, alt, type, align_idx), también en alineamientos
+#   cortos aleatorios con N y bases IUPAC.
+# Las queries incluyen SNV, indels en los homopolímeros y repeticiones de los
+# hotspots (C-stretches 303-315 y 16184-16193, AC 513-524, 8281-8289), indels
+# aleatorios en repeticiones de toda la molécula, eventos que cruzan el origen
+# 16569/1, una query linealizada en otro origen y una lectura parcial que
+# cruza el origen. Se ejecuta con
+#   python -m src.alignment_validation [n_queries_aleatorias [semilla]]
+# y termina con código 1 si alguna comprobación falla.
+# ------------------------------------------------------------------------------
+
+import sys
+import random
+from Bio.Seq import Seq
+from . import constants
+from .feature_extraction import cargar_secuencia_fasta
+from .repeat_index import obtener_indice_repeticiones
+from .alignment_and_variant_calling import (
+    obtener_alineador, realizar_alineamiento, realizar_alineamiento_circular, realizar_alineamiento_lineal,
+    generar_variantes_crudas, get_substitution_type
+)
+
+VALIDATION_RANDOM_QUERIES = 2 # Queries con mutaciones aleatorias además de las fijas
+VALIDATION_RANDOM_EDITS = 40 # Ediciones (SNV o indel en repetición) por query aleatoria
+VALIDATION_ROTATION = 8000 # Origen (0-based) de la query linealizada en otro punto
+VALIDATION_PARTIAL_FLANK = 600 # Bases a cada lado del origen en la lectura parcial
+VALIDATION_SHORT_ALIGNMENTS = 300 # Alineamientos cortos aleatorios para la comprobación de la extracción
+
+
+def _aplicar_ediciones(secuencia: str, ediciones: list) -> str:
+    """Aplica (inicio_0b, fin_0b, nuevas_bases) sobre intervalos disjuntos, de 3' a 5'."""
+    bases = list(secuencia)
+    for inicio, fin, nuevas in sorted(ediciones, reverse=True):
+        bases[inicio:fin] = list(nuevas)
+    return "".join(bases)
+
+def _ediciones_aleatorias(rcrs_str: str, generador: random.Random) -> list:
+    """SNV e indels de una unidad (o 1-3 bases) dentro de repeticiones de toda la molécula."""
+    indice = obtener_indice_repeticiones(rcrs_str)
+    ediciones, ocupadas = [], set()
+    while len(ediciones) < VALIDATION_RANDOM_EDITS:
+        pos_0b = generador.randrange(100, len(rcrs_str) - 100)
+        repeticion = indice.repeticion(pos_0b + 1)
+        if generador.random() < 0.35 or repeticion is None:
+            inicio, fin, nuevas = pos_0b, pos_0b + 1, generador.choice([b for b in "ACGT" if b != rcrs_str[pos_0b]])
+        else:
+            k = len(repeticion[0]) if generador.random() < 0.7 else generador.randint(1, 3)
+            if generador.random() < 0.5:
+                inicio, fin, nuevas = pos_0b, pos_0b + k, ""
+            else:
+                inicio, fin, nuevas = pos_0b, pos_0b, rcrs_str[pos_0b:pos_0b + k]
+        if any(p in ocupadas for p in range(inicio - 2, fin + 3)):
+            continue
+        ocupadas.update(range(inicio, fin + 1))
+        ediciones.append((inicio, fin, nuevas))
+    return ediciones
+
+def construir_queries_validacion(rcrs_str: str, n_aleatorias: int = VALIDATION_RANDOM_QUERIES, semilla: int = 0) -> list:
+    """
+    (nombre, query, modo, circular) de las comprobaciones. Las posiciones de las
+    ediciones fijas son 0-based sobre rCRS.
+    """
+    longitud = len(rcrs_str)
+    hotspots = _aplicar_ediciones(rcrs_str, [
+        (72, 73, "G"), (262, 263, "G"),           # 73A>G, 263A>G
+        (309, 309, "C"), (315, 315, "C"),         # C en los dos tramos del C-stretch de HVII
+        (521, 523, ""),                           # AC del motivo 513-524
+        (8280, 8289, ""),                         # Deleción de 9 pb 8281-8289
+        (16188, 16189, "C"), (16193, 16193, "C"), # 16189T>C e inserción de C en el C-stretch de HVI
+        (16518, 16519, "C"),
+    ])
+    origen = _aplicar_ediciones(rcrs_str, [
+        (0, 1, "T"), (2, 3, ""), (longitud - 3, longitud - 3, "G"), (longitud - 1, longitud, "A"),
+    ])
+    queries = [
+        ("hotspots", hotspots, "global", False),
+        ("hotspots", hotspots, "local", False),
+        ("origen", origen, "global", False),
+        ("origen", origen, "local", False),
+        ("origen_rotada", origen[VALIDATION_ROTATION:] + origen[:VALIDATION_ROTATION], "global", True),
+        ("lectura_origen", hotspots[-VALIDATION_PARTIAL_FLANK:] + hotspots[:VALIDATION_PARTIAL_FLANK], "local", True),
+    ]
+    generador = random.Random(semilla)
+    for i in range(n_aleatorias):
+        query = _aplicar_ediciones(rcrs_str, _ediciones_aleatorias(rcrs_str, generador))
+        queries.extend([(f"aleatoria_{i}", query, "global", False), (f"aleatoria_{i}", query, "local", False)])
+    return queries
+
+def _variantes(alineamiento, longitud_ref: int, desplazamiento_ref: int = 0) -> list:
+    return [(v.pos, v.ref, v.alt, v.type, v.align_idx) for v in generar_variantes_crudas(alineamiento, longitud_ref, desplazamiento_ref)]
+
+def _alinear(rcrs_str: str, query: str, modo: str, circular: bool, **opciones) -> tuple:
+    """(alineamiento, desplazamiento_ref) con el mismo camino que `alinear_y_extraer_variantes`."""
+    if circular:
+        alineamiento, desplazamiento_ref, _ = realizar_alineamiento_circular(Seq(rcrs_str), Seq(query), modo, **opciones)
+        return alineamiento, desplazamiento_ref
+    return realizar_alineamiento(Seq(rcrs_str), Seq(query), modo, **opciones), 0
+
+def comprobar_motor_anclado(rcrs_str: str, queries: list) -> list:
+    """Discrepancias (query, modo, detalle) entre el motor anclado y la DP completa."""
+    discrepancias = []
+    for nombre, query, modo, circular in queries:
+        anclado, desplazamiento_anclado = _alinear(rcrs_str, query, modo, circular, anclado=True)
+        completo, desplazamiento_completo = _alinear(rcrs_str, query, modo, circular, anclado=False)
+        if anclado is None or completo is None:
+            discrepancias.append((nombre, modo, "sin alineamiento"))
+            continue
+        if anclado.score != completo.score:
+            discrepancias.append((nombre, modo, f"puntuación anclada {anclado.score} != DP completa {completo.score}"))
+        variantes_ancladas = _variantes(anclado, len(rcrs_str), desplazamiento_anclado)
+        variantes_completas = _variantes(completo, len(rcrs_str), desplazamiento_completo)
+        if variantes_ancladas != variantes_completas:
+            solo_ancladas = [v for v in variantes_ancladas if v not in variantes_completas]
+            solo_completas = [v for v in variantes_completas if v not in variantes_ancladas]
+            discrepancias.append((nombre, modo, f"variantes solo ancladas {solo_ancladas[:5]}, solo DP completa {solo_completas[:5]}"))
+    return discrepancias
+
+def comprobar_memoria_lineal(rcrs_str: str, queries: list) -> list:
+    """
+    Discrepancias (query, modo, detalle) entre el backend Hirschberg y PairwiseAligner en
+    las queries globales no circulares. La puntuación del alineamiento lineal se recalcula
+    sobre sus coordenadas, así que coincidir también valida el camino devuelto.
+    """
+    discrepancias = []
+    for nombre, query, modo, circular in queries:
+        if modo != 'global' or circular:
+            continue
+        lineal = realizar_alineamiento_lineal(Seq(rcrs_str), Seq(query))
+        completo = realizar_alineamiento(Seq(rcrs_str), Seq(query), 'global')
+        if lineal is None or completo is None:
+            discrepancias.append((nombre, modo, "sin alineamiento"))
+        elif lineal.score != completo.score:
+            discrepancias.append((nombre, modo, f"puntuación Hirschberg {lineal.score} != PairwiseAligner {completo.score}"))
+    return discrepancias
+
+def _variantes_por_columna(alineamiento) -> list:
+    """
+    Referencia de la comprobación: el recorrido carácter a carácter de
+    `str(alineamiento[0])` / `str(alineamiento[1])` con el que MitoID extraía las
+    variantes crudas antes de la extracción por bloques.
+    """
+    als_ref, als_query = str(alineamiento[0]), str(alineamiento[1])
+    offset_ref = int(alineamiento.coordinates[0, 0])
+    variantes = []
+    pos_en_segmento = 0
+    i = 0
+    while i < len(als_ref):
+        r_base, q_base = als_ref[i], als_query[i]
+        pos_1based = offset_ref + pos_en_segmento + 1
+        if r_base == q_base:
+            i += 1
+            pos_en_segmento += 1
+        elif r_base != '-' and q_base != '-':
+            variantes.append((pos_1based, r_base.upper(), q_base.upper(), get_substitution_type(r_base, q_base), i))
+            i += 1
+            pos_en_segmento += 1
+        elif r_base == '-':
+            inicio = i
+            while i < len(als_ref) and als_ref[i] == '-':
+                i += 1
+            variantes.append((offset_ref + pos_en_segmento - 1, '-', als_query[inicio:i].upper(), 'insertion', inicio))
+        else:
+            inicio = i
+            while i < len(als_ref) and als_query[i] == '-':
+                i += 1
+            variantes.append((pos_1based, als_ref[inicio:i].upper(), '-', 'deletion', inicio))
+            pos_en_segmento += i - inicio
+    return variantes
+
+def _alineamientos_cortos(n: int, semilla: int):
+    """Alineamientos globales y locales de fragmentos aleatorios con SNV (incluidas N e IUPAC) e indels."""
+    generador = random.Random(semilla)
+    for _ in range(n):
+        ref = "".join(generador.choice("ACGT") for _ in range(generador.randint(20, 120)))
+        query = list(ref)
+        for _ in range(generador.randint(0, 8)):
+            p, accion = generador.randrange(len(query)), generador.random()
+            if accion < 0.4:
+                query[p] = generador.choice("ACGTNRY")
+            elif accion < 0.7:
+                query.insert(p, "".join(generador.choice("ACGT") for _ in range(generador.randint(1, 4))))
+            else:
+                del query[p:p + generador.randint(1, 4)]
+        modo = generador.choice(['global', 'local'])
+        alineamiento = next(iter(obtener_alineador(modo).align(ref, "".join(query) or "A")), None)
+        if alineamiento is not None:
+            yield modo, alineamiento
+
+def comprobar_extraccion_bloques(rcrs_str: str, queries: list, n_cortos: int = VALIDATION_SHORT_ALIGNMENTS) -> list:
+    """
+    Discrepancias (query, modo, detalle) entre `generar_variantes_crudas` y el recorrido
+    por columnas, sobre el alineamiento anclado de cada query y sobre alineamientos cortos.
+    """
+    alineamientos = [(nombre, modo, _alinear(rcrs_str, query, modo, circular, anclado=True)[0]) for nombre, query, modo, circular in queries]
+    alineamientos.extend((f"corto_{i}", modo, alineamiento) for i, (modo, alineamiento) in enumerate(_alineamientos_cortos(n_cortos, len(queries))))
+    discrepancias = []
+    for nombre, modo, alineamiento in alineamientos:
+        if alineamiento is None:
+            discrepancias.append((nombre, modo, "sin alineamiento"))
+            continue
+        por_bloques = _variantes(alineamiento, len(alineamiento.sequences[0]))
+        por_columna = _variantes_por_columna(alineamiento)
+        if por_bloques != por_columna:
+            solo_bloques = [v for v in por_bloques if v not in por_columna]
+            solo_columna = [v for v in por_columna if v not in por_bloques]
+            discrepancias.append((nombre, modo, f"solo por bloques {solo_bloques[:5]}, solo por columna {solo_columna[:5]}"))
+    return discrepancias
+
+
+if __name__ == "__main__":
+    argumentos = sys.argv[1:]
+    registro_rcrs = cargar_secuencia_fasta(constants.RCRS_FASTA_PATH)
+    if not registro_rcrs:
+        sys.exit(2)
+    rcrs = str(registro_rcrs.seq).upper()
+    queries = construir_queries_validacion(
+        rcrs,
+        int(argumentos[0]) if argumentos else VALIDATION_RANDOM_QUERIES,
+        int(argumentos[1]) if len(argumentos) > 1 else 0
+    )
+    comprobaciones = [
+        ("anclado vs DP completa", comprobar_motor_anclado),
+        ("Hirschberg vs PairwiseAligner", comprobar_memoria_lineal),
+        ("extracción por bloques vs por columna", comprobar_extraccion_bloques),
+    ]
+    fallos = 0
+    for titulo, comprobar in comprobaciones:
+        discrepancias = comprobar(rcrs, queries)
+        for nombre, modo, detalle in discrepancias:
+            print(f"DIFERENCIA [{titulo}] {nombre} ({modo}): {detalle}")
+        print(f"Validación {titulo}: {len(discrepancias)} diferencias.")
+        fallos += len(discrepancias)
+    sys.exit(1 if fallos else 0)
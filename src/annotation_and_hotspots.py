@@ -5,7 +5,49 @@
 # por una variante y para identificar si una variante cae en una región hotspot.
 # ------------------------------------------------------------------------------
 
+import numpy as np
 from . import constants
+from .variant_records import CODIGO_TIPO_VARIANTE, TIPOS_VARIANTE, LoteVariantes
+
+def _nombrar_locus_intergenico(tipo_variante: str, start_affected_pos: int, end_affected_pos: int, feature_anterior: dict | None, feature_siguiente: dict | None) -> str:
+    """Nombre de locus para un rango sin solapamiento, dadas las features vecinas."""
+    if feature_anterior and feature_siguiente:
+        # Caso especial: inserción exactamente entre dos genes contiguos
+        if tipo_variante == 'insertion' and \
+           start_affected_pos == feature_anterior['fin'] and \
+           end_affected_pos == feature_siguiente['inicio']:
+            return f"Entre ({feature_anterior['nombre']}, {feature_siguiente['nombre']})"
+
+        # Si está cerca de ambas, es intergénica. Distancia umbral (e.g. 10bp)
+        distancia_intergenica = feature_siguiente['inicio'] - feature_anterior['fin'] -1 
+        if 0 <= distancia_intergenica <= 10 : # Espacio intergénico pequeño
+             return f"Intergénica ({feature_anterior['nombre']}-{feature_siguiente['nombre']})"
+        else: # Espacio intergénico grande o no definido claramente
+            return "Región no anotada (intergénica amplia)"
+    elif feature_anterior and start_affected_pos > feature_anterior['fin']:
+        return f"Posterior a {feature_anterior['nombre']}"
+    elif feature_siguiente and end_affected_pos < feature_siguiente['inicio']:
+        return f"Anterior a {feature_siguiente['nombre']}"
+    return "Región desconocida (extremos del genoma o error)"
+
+
+def _nombrar_locus_solapante(regiones_solapantes: list) -> str:
+    """Nombre de locus a partir de las features que solapan con la variante."""
+    # Priorizar tipos funcionales (CDS, rRNA, tRNA) si hay múltiples solapamientos
+    tipos_prioritarios = constants.PRIORITY_FEATURE_TYPES
+    regiones_prioritarias = [f['nombre'] for f in regiones_solapantes if f['tipo'] in tipos_prioritarios]
+    
+    nombres_finales = []
+    if regiones_prioritarias:
+        nombres_finales = list(set(regiones_prioritarias)) # Nombres únicos
+    else: # Si no hay funcionales, usar cualquier tipo de región solapante (e.g. D-loop)
+        nombres_finales = list(set(f['nombre'] for f in regiones_solapantes))
+
+    nombres_finales.sort() # Ordenar alfabéticamente para consistencia
+
+    if not nombres_finales: return "Región no anotada (solapamiento sin nombre)"
+    return ", ".join(nombres_finales)
+
 
 def anotar_locus_variante(pos_variante_1based: int, tipo_variante: str, longitud_evento: int, features_rcrs: list) -> str:
     """
@@ -53,39 +95,117 @@ def anotar_locus_variante(pos_variante_1based: int, tipo_variante: str, longitud
                     feature_siguiente = f_val
                 break # Las features están ordenadas, no es necesario seguir.
         
-        if feature_anterior and feature_siguiente:
-            # Caso especial: inserción exactamente entre dos genes contiguos
-            if tipo_variante == 'insertion' and \
-               start_affected_pos == feature_anterior['fin'] and \
-               end_affected_pos == feature_siguiente['inicio']:
-                return f"Entre ({feature_anterior['nombre']}, {feature_siguiente['nombre']})"
-            
-            # Si está cerca de ambas, es intergénica. Distancia umbral (e.g. 10bp)
-            distancia_intergenica = feature_siguiente['inicio'] - feature_anterior['fin'] -1 
-            if 0 <= distancia_intergenica <= 10 : # Espacio intergénico pequeño
-                 return f"Intergénica ({feature_anterior['nombre']}-{feature_siguiente['nombre']})"
-            else: # Espacio intergénico grande o no definido claramente
-                return "Región no anotada (intergénica amplia)"
-        elif feature_anterior and start_affected_pos > feature_anterior['fin']:
-            return f"Posterior a {feature_anterior['nombre']}"
-        elif feature_siguiente and end_affected_pos < feature_siguiente['inicio']:
-            return f"Anterior a {feature_siguiente['nombre']}"
-        return "Región desconocida (extremos del genoma o error)"
+        return _nombrar_locus_intergenico(tipo_variante, start_affected_pos, end_affected_pos, feature_anterior, feature_siguiente)
 
-    # Priorizar tipos funcionales (CDS, rRNA, tRNA) si hay múltiples solapamientos
-    tipos_prioritarios = constants.PRIORITY_FEATURE_TYPES
-    regiones_prioritarias = [f['nombre'] for f in regiones_solapantes if f['tipo'] in tipos_prioritarios]
-    
-    nombres_finales = []
-    if regiones_prioritarias:
-        nombres_finales = list(set(regiones_prioritarias)) # Nombres únicos
-    else: # Si no hay funcionales, usar cualquier tipo de región solapante (e.g. D-loop)
-        nombres_finales = list(set(f['nombre'] for f in regiones_solapantes))
+    return _nombrar_locus_solapante(regiones_solapantes)
 
-    nombres_finales.sort() # Ordenar alfabéticamente para consistencia
 
-    if not nombres_finales: return "Región no anotada (solapamiento sin nombre)"
-    return ", ".join(nombres_finales)
+class IndiceAnotacionLocus:
+    """
+    Índice por base de las features de rCRS, construido una vez, que da el mismo
+    resultado que `anotar_locus_variante` sin recorrer la lista de features:
+    - `id_conjunto[p]`: id del conjunto de features que cubren la posición 1-based p
+      (0 = ninguna), con el nombre de locus de cada conjunto precalculado.
+    - `siguiente[p]`: índice (en el orden de la lista) de la primera feature que empieza
+      después de p, y `anterior_prefijo[k]`: feature de mayor 'fin' entre las k primeras.
+      Juntos reproducen la búsqueda de vecinas intergénicas, incluido el corte del
+      recorrido en la primera feature posterior.
+    Una sustitución se resuelve en O(1) y un indel en O(longitud).
+    """
+
+    def __init__(self, features_rcrs: list):
+        self.features = list(features_rcrs)
+        n = len(self.features)
+        inicios = np.array([f['inicio'] for f in self.features], dtype=np.int64)
+        fines = np.array([f['fin'] for f in self.features], dtype=np.int64)
+        longitud = int(max(inicios.max(initial=0), fines.max(initial=0))) + 2 # Posiciones >= longitud: sin features
+
+        posiciones = np.arange(longitud)
+        cobertura = (inicios[None, :] <= posiciones[:, None]) & (posiciones[:, None] <= fines[None, :])
+        filas, inversa = np.unique(cobertura, axis=0, return_inverse=True)
+        self.conjuntos = [()]
+        id_por_fila = np.zeros(len(filas), dtype=np.int32)
+        for j, fila in enumerate(filas):
+            if fila.any():
+                id_por_fila[j] = len(self.conjuntos)
+                self.conjuntos.append(tuple(np.flatnonzero(fila).tolist()))
+        self.id_conjunto = id_por_fila[inversa.reshape(-1)]
+        self.cubiertas_acumuladas = np.zeros(longitud + 1, dtype=np.int32)
+        np.cumsum(self.id_conjunto > 0, out=self.cubiertas_acumuladas[1:])
+        # Cambios de conjunto acumulados: un rango [a, b] tiene un único conjunto si no hay cambios en (a, b]
+        self.cambios_acumulados = np.zeros(longitud, dtype=np.int32)
+        np.cumsum(self.id_conjunto[1:] != self.id_conjunto[:-1], out=self.cambios_acumulados[1:])
+        posterior = inicios[None, :] > posiciones[:, None]
+        self.siguiente = np.where(posterior.any(axis=1), posterior.argmax(axis=1), n) if n else np.zeros(longitud, dtype=np.int64)
+        self._preparar_derivados()
+
+    def _preparar_derivados(self) -> None:
+        """Datos pequeños derivados de las features y los conjuntos (no se persisten)."""
+        inicios = [f['inicio'] for f in self.features]
+        fines = [f['fin'] for f in self.features]
+        # Con features de rango invertido el solapamiento no es por posiciones: se usa el recorrido lineal
+        self.exacto = all(i <= f for i, f in zip(inicios, fines))
+        self.longitud = len(self.id_conjunto)
+        self.nombres_conjunto = [None] + [_nombrar_locus_solapante([self.features[i] for i in c]) for c in self.conjuntos[1:]]
+        self._nombres_union = {}
+        self.anterior_prefijo = [-1]
+        for i in range(len(self.features)):
+            previa = self.anterior_prefijo[-1]
+            self.anterior_prefijo.append(i if previa < 0 or fines[i] > fines[previa] else previa)
+
+    def como_arrays(self) -> dict:
+        """Arrays por base del índice (los conjuntos y las features se guardan aparte)."""
+        return {
+            "id_conjunto": self.id_conjunto, "cubiertas_acumuladas": self.cubiertas_acumuladas,
+            "cambios_acumulados": self.cambios_acumulados, "siguiente": np.asarray(self.siguiente, dtype=np.int64),
+        }
+
+    @classmethod
+    def desde_arrays(cls, features_rcrs: list, conjuntos: list, arrays: dict) -> "IndiceAnotacionLocus":
+        """Reconstruye el índice sin recalcularlo (p. ej. con arrays memory-mapped del paquete de referencia)."""
+        indice = cls.__new__(cls)
+        indice.features = list(features_rcrs)
+        indice.conjuntos = [tuple(c) for c in conjuntos]
+        for nombre in ("id_conjunto", "cubiertas_acumuladas", "cambios_acumulados", "siguiente"):
+            setattr(indice, nombre, arrays[nombre])
+        indice._preparar_derivados()
+        return indice
+
+    def anotar(self, pos_variante_1based: int, tipo_variante: str, longitud_evento: int) -> str:
+        """Equivalente a `anotar_locus_variante(pos, tipo, longitud, features)`."""
+        if not self.features: return "N/A (Features no disponibles)"
+        if not isinstance(pos_variante_1based, int) or pos_variante_1based <= 0: return "N/A (Posición inválida)"
+        inicio = fin = pos_variante_1based
+        if tipo_variante == 'insertion':
+            fin = pos_variante_1based + 1
+        elif tipo_variante == 'deletion':
+            fin = pos_variante_1based + longitud_evento - 1
+        if not self.exacto or fin < inicio:
+            return anotar_locus_variante(pos_variante_1based, tipo_variante, longitud_evento, self.features)
+        return self.anotar_rango(inicio, fin, tipo_variante)
+
+    def anotar_rango(self, inicio: int, fin: int, tipo_variante: str) -> str:
+        """Nombre de locus del rango 1-based [inicio, fin] (inicio <= fin)."""
+        ultimo = min(fin, self.longitud - 1)
+        if inicio <= ultimo and self.cubiertas_acumuladas[ultimo + 1] > self.cubiertas_acumuladas[inicio]:
+            if inicio == ultimo:
+                return self.nombres_conjunto[self.id_conjunto[inicio]]
+            ids = np.unique(self.id_conjunto[inicio:ultimo + 1])
+            ids = tuple(ids[ids > 0].tolist())
+            if len(ids) == 1:
+                return self.nombres_conjunto[ids[0]]
+            if ids not in self._nombres_union:
+                indices = sorted(set().union(*(self.conjuntos[i] for i in ids)))
+                self._nombres_union[ids] = _nombrar_locus_solapante([self.features[i] for i in indices])
+            return self._nombres_union[ids]
+
+        k = int(self.siguiente[ultimo])
+        j = self.anterior_prefijo[k]
+        return _nombrar_locus_intergenico(
+            tipo_variante, inicio, fin,
+            self.features[j] if j >= 0 else None,
+            self.features[k] if k < len(self.features) else None
+        )
 
 
 def es_variante_en_hotspot(posicion_variante: int, tipo_variante_cruda: str, longitud_evento: int = 1) -> bool:
@@ -145,4 +265,202 @@ def obtener_hvs_region(pos_variante_1based: int) -> str | None:
     for hvs in constants.HVS_REGIONS: 
         if hvs["inicio"] <= pos_variante_1based <= hvs["fin"]:
             return hvs["nombre"]
-    return None
\ No newline at end of file
+    return None
+
+
+# Códigos de tipo usados por la anotación por lotes
+_CODIGO_INSERCION = CODIGO_TIPO_VARIANTE['insertion']
+_CODIGO_DELECION = CODIGO_TIPO_VARIANTE['deletion']
+_CODIGO_DESCONOCIDO = CODIGO_TIPO_VARIANTE['desconocido']
+
+def _limites_primera_region(regiones: list) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Parte la recta en intervalos elementales a partir de los límites de `regiones`
+    (dicts con inicio/fin/nombre) y asigna a cada uno el nombre de la primera región
+    de la lista que lo cubre, como el recorrido de `obtener_hvs_region`.
+    """
+    limites = np.unique(np.array([r["inicio"] for r in regiones] + [r["fin"] + 1 for r in regiones], dtype=np.int64))
+    nombres = np.empty(len(limites), dtype=object)
+    for i, limite in enumerate(limites.tolist()):
+        nombres[i] = next((r["nombre"] for r in regiones if r["inicio"] <= limite <= r["fin"]), None)
+    return limites, nombres
+
+def _fusionar_intervalos(intervalos: list) -> tuple[np.ndarray, np.ndarray]:
+    """Inicios y fines ordenados de la unión de los intervalos cerrados (inicio, fin, ...)."""
+    inicios, fines = [], []
+    for inicio, fin, *_ in sorted(intervalos):
+        if inicios and inicio <= fines[-1] + 1:
+            fines[-1] = max(fines[-1], fin)
+        else:
+            inicios.append(inicio); fines.append(fin)
+    return np.array(inicios, dtype=np.int64), np.array(fines, dtype=np.int64)
+
+_LIMITES_HVS, _NOMBRES_HVS = _limites_primera_region(constants.HVS_REGIONS)
+_INICIOS_HOTSPOT, _FINES_HOTSPOT = _fusionar_intervalos(constants.HOTSPOT_REGIONS)
+
+def obtener_hvs_region_lote(posiciones_1based: np.ndarray) -> np.ndarray:
+    """`obtener_hvs_region` para un array de posiciones (np.searchsorted sobre los límites)."""
+    posiciones_1based = np.asarray(posiciones_1based, dtype=np.int64)
+    i = np.searchsorted(_LIMITES_HVS, posiciones_1based, side='right') - 1
+    regiones = np.full(len(posiciones_1based), None, dtype=object)
+    dentro = i >= 0
+    regiones[dentro] = _NOMBRES_HVS[i[dentro]]
+    return regiones
+
+def solapa_hotspot_lote(inicios: np.ndarray, fines: np.ndarray) -> np.ndarray:
+    """True donde el rango 1-based [inicio, fin] solapa con alguna región de HOTSPOT_REGIONS."""
+    inicios = np.asarray(inicios, dtype=np.int64)
+    fines = np.asarray(fines, dtype=np.int64)
+    if not len(_INICIOS_HOTSPOT):
+        return np.zeros(len(inicios), dtype=bool)
+    i = np.searchsorted(_FINES_HOTSPOT, inicios, side='left') # Primer hotspot que termina en o después del inicio
+    candidato = np.minimum(i, len(_INICIOS_HOTSPOT) - 1)
+    return (i < len(_INICIOS_HOTSPOT)) & (_INICIOS_HOTSPOT[candidato] <= fines)
+
+def es_variante_en_hotspot_lote(posiciones: np.ndarray, codigos_tipo: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """
+    `es_variante_en_hotspot` para arrays de variantes crudas (posición 0-based del ancla
+    en inserciones, 1-based de inicio en deleciones; las sustituciones nunca son hotspot).
+    """
+    posiciones = np.asarray(posiciones, dtype=np.int64)
+    codigos_tipo = np.asarray(codigos_tipo)
+    longitudes = np.asarray(longitudes, dtype=np.int64)
+    insercion = codigos_tipo == _CODIGO_INSERCION
+    delecion = codigos_tipo == _CODIGO_DELECION
+    inicios = np.where(insercion, posiciones + 1, posiciones)
+    fines = np.where(delecion, posiciones + longitudes - 1, inicios)
+    return (insercion | delecion) & solapa_hotspot_lote(inicios, fines)
+
+def anotar_locus_lote(indice_locus: IndiceAnotacionLocus, posiciones_1based: np.ndarray, codigos_tipo: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """
+    `IndiceAnotacionLocus.anotar` para arrays de variantes. Los rangos dentro de un único
+    conjunto de features y los intergénicos se resuelven con operaciones de array; solo
+    los rangos que cruzan un límite entre conjuntos se resuelven uno a uno.
+    """
+    posiciones_1based = np.asarray(posiciones_1based, dtype=np.int64)
+    codigos_tipo = np.asarray(codigos_tipo)
+    longitudes = np.asarray(longitudes, dtype=np.int64)
+    n = len(posiciones_1based)
+    loci = np.empty(n, dtype=object)
+    if not indice_locus.features:
+        loci[:] = "N/A (Features no disponibles)"
+        return loci
+    invalida = posiciones_1based <= 0
+    loci[invalida] = "N/A (Posición inválida)"
+
+    inicios = posiciones_1based
+    fines = np.where(codigos_tipo == _CODIGO_INSERCION, inicios + 1,
+                     np.where(codigos_tipo == _CODIGO_DELECION, inicios + longitudes - 1, inicios))
+    pendientes = ~invalida
+    uno_a_uno = pendientes & ((fines < inicios) | (not indice_locus.exacto))
+    for i in np.flatnonzero(uno_a_uno).tolist():
+        loci[i] = indice_locus.anotar(int(posiciones_1based[i]), _tipo_de_codigo(codigos_tipo[i]), int(longitudes[i]))
+    pendientes &= ~uno_a_uno
+
+    ultimos = np.minimum(fines, indice_locus.longitud - 1)
+    inicios_acotados = np.minimum(inicios, indice_locus.longitud - 1)
+    cubierto = pendientes & (inicios <= ultimos) & \
+        (indice_locus.cubiertas_acumuladas[ultimos + 1] > indice_locus.cubiertas_acumuladas[np.minimum(inicios, indice_locus.longitud)])
+    un_conjunto = cubierto & (indice_locus.cambios_acumulados[ultimos] == indice_locus.cambios_acumulados[inicios_acotados])
+    nombres_conjunto = np.array(indice_locus.nombres_conjunto, dtype=object)
+    loci[un_conjunto] = nombres_conjunto[indice_locus.id_conjunto[inicios_acotados[un_conjunto]]]
+    for i in np.flatnonzero(cubierto & ~un_conjunto).tolist():
+        loci[i] = indice_locus.anotar_rango(int(inicios[i]), int(fines[i]), _tipo_de_codigo(codigos_tipo[i]))
+
+    # Sin solapamiento el nombre solo depende del par (anterior, siguiente) de features vecinas
+    intergenica = np.flatnonzero(pendientes & ~cubierto)
+    if len(intergenica):
+        siguientes = indice_locus.siguiente[ultimos[intergenica]]
+        siguientes_unicos, representante, inversa = np.unique(siguientes, return_index=True, return_inverse=True)
+        nombres_par = np.empty(len(siguientes_unicos), dtype=object)
+        for j, r in enumerate(representante.tolist()):
+            i = intergenica[r]
+            nombres_par[j] = indice_locus.anotar_rango(int(inicios[i]), int(fines[i]), _tipo_de_codigo(codigos_tipo[i]))
+        loci[intergenica] = nombres_par[inversa.reshape(-1)]
+    return loci
+
+def _tipo_de_codigo(codigo: int) -> str:
+    return TIPOS_VARIANTE[int(codigo)]
+
+def _columnas_variantes(variantes) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (posiciones crudas, códigos de tipo, len(ref), len(alt), ref es '-') de un LoteVariantes
+    o de una lista de variantes; una posición no entera se representa como -1.
+    """
+    if isinstance(variantes, LoteVariantes):
+        longitudes_alelos = np.diff(variantes.offsets)
+        alelos = np.frombuffer(variantes.alelos, dtype=np.uint8)
+        inicios_ref = np.minimum(variantes.offsets[0:-1:2], max(len(alelos) - 1, 0))
+        ref_guion = (longitudes_alelos[0::2] == 1) & (alelos[inicios_ref] == ord('-')) if len(alelos) else np.zeros(len(variantes), dtype=bool)
+        return variantes.posiciones, variantes.codigos_tipo, longitudes_alelos[0::2], longitudes_alelos[1::2], ref_guion
+    n = len(variantes)
+    posiciones = np.fromiter((v.get('pos') if isinstance(v.get('pos'), int) else -1 for v in variantes), dtype=np.int64, count=n)
+    codigos_tipo = np.fromiter((CODIGO_TIPO_VARIANTE.get(v.get('type', ''), _CODIGO_DESCONOCIDO) for v in variantes), dtype=np.uint8, count=n)
+    longitudes_ref = np.fromiter((len(v.get('ref', '')) for v in variantes), dtype=np.int64, count=n)
+    longitudes_alt = np.fromiter((len(v.get('alt', '')) for v in variantes), dtype=np.int64, count=n)
+    ref_guion = np.fromiter((v.get('ref') == '-' for v in variantes), dtype=bool, count=n)
+    return posiciones, codigos_tipo, longitudes_ref, longitudes_alt, ref_guion
+
+def marcar_hotspots_variantes(variantes) -> np.ndarray:
+    """Marca de hotspot del informe para cada variante cruda (lista o LoteVariantes)."""
+    posiciones, codigos_tipo, longitudes_ref, _, ref_guion = _columnas_variantes(variantes)
+    return _marcar_hotspots(posiciones, codigos_tipo, longitudes_ref, ref_guion)
+
+def _marcar_hotspots(posiciones, codigos_tipo, longitudes_ref, ref_guion) -> np.ndarray:
+    # Como en el informe: una deleción con ref '-' cuenta con longitud 0
+    return (posiciones != -1) & es_variante_en_hotspot_lote(posiciones, codigos_tipo, np.where(ref_guion, 0, longitudes_ref))
+
+def anotar_lote_variantes(variantes, indice_locus: IndiceAnotacionLocus | None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Anotación por lotes de variantes crudas (lista o LoteVariantes de una muestra o de
+    una cohorte). Devuelve arrays paralelos (locus, región HVS, en_hotspot) con los mismos
+    valores que la anotación variante a variante: las inserciones se anotan en la base
+    1-based siguiente a su ancla, y sin features (indice_locus None) el locus es "N/A".
+    """
+    posiciones, codigos_tipo, longitudes_ref, longitudes_alt, ref_guion = _columnas_variantes(variantes)
+    insercion = codigos_tipo == _CODIGO_INSERCION
+    delecion = codigos_tipo == _CODIGO_DELECION
+    posiciones_1based = np.where(insercion, posiciones + 1, posiciones)
+    longitudes = np.where(insercion, longitudes_alt, np.where(delecion, longitudes_ref, 1))
+
+    loci = np.full(len(posiciones), "N/A", dtype=object)
+    regiones_hvs = np.full(len(posiciones), None, dtype=object)
+    anotables = posiciones_1based > 0
+    if indice_locus is not None and anotables.any():
+        loci[anotables] = anotar_locus_lote(indice_locus, posiciones_1based[anotables], codigos_tipo[anotables], longitudes[anotables])
+        regiones_hvs[anotables] = obtener_hvs_region_lote(posiciones_1based[anotables])
+    en_hotspot = _marcar_hotspots(posiciones, codigos_tipo, longitudes_ref, ref_guion)
+    return loci, regiones_hvs, en_hotspot
+
+def generar_variantes_anotadas(variantes_crudas, features_rcrs: list, indice_locus: IndiceAnotacionLocus | None = None):
+    """
+    Etapa en flujo: asigna in situ 'locus' y 'hvs_region' a cada variante cruda y la
+    devuelve en cuanto está anotada (sin acumular bloques, para que HGVS y Mitomaster
+    reciban la primera variante sin esperar al resto). Cada variante es una consulta
+    O(1) al índice por base; `anotar_lote_variantes` queda para cohortes ya
+    materializadas. Las inserciones se anotan en la base 1-based siguiente a su ancla
+    0-based. El índice de locus se construye aquí si no se proporciona.
+    """
+    if features_rcrs and indice_locus is None:
+        indice_locus = IndiceAnotacionLocus(features_rcrs)
+    for var_cruda in variantes_crudas:
+        pos_var_cruda = var_cruda.get('pos')
+        tipo_var_cruda = var_cruda.get('type', '')
+        pos_1based_para_locus = pos_var_cruda if isinstance(pos_var_cruda, int) else -1
+        if tipo_var_cruda == 'insertion':
+            if isinstance(pos_var_cruda, int): pos_1based_para_locus = pos_var_cruda + 1
+            longitud_evento = len(var_cruda.get('alt', ''))
+        elif tipo_var_cruda == 'deletion':
+            longitud_evento = len(var_cruda.get('ref', ''))
+        else: # Sustitución
+            longitud_evento = 1
+
+        locus_anotado = "N/A"
+        hvs_region_anotada = None
+        if features_rcrs and pos_1based_para_locus > 0:
+            locus_anotado = indice_locus.anotar(pos_1based_para_locus, tipo_var_cruda, longitud_evento)
+            hvs_region_anotada = obtener_hvs_region(pos_1based_para_locus)
+
+        var_cruda['locus'] = locus_anotado
+        var_cruda['hvs_region'] = hvs_region_anotada
+        yield var_cruda
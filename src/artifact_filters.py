@@ -0,0 +1,94 @@
+# ==============================================================================
+# BLOQUE 3e: FILTRO DE ARTEFACTOS Y BLACKLIST INDEXADO POR POSICIÓN
+# ==============================================================================
+# Descripción: Las reglas de artefactos (3107, C3106N, N3107X, sitios de primers,
+# artefactos de secuenciación del laboratorio...) se declaran como tabla en
+# `constants.ARTIFACT_RULES` y, opcionalmente, en un JSON de configuración.
+# Se compilan a un diccionario posición -> reglas: cada variante se evalúa solo
+# contra las reglas de su posición (O(1)) y un lote se pre-selecciona en una
+# única pasada vectorizada (np.isin sobre las posiciones con reglas).
+# ------------------------------------------------------------------------------
+
+import json
+import numpy as np
+from functools import lru_cache
+from . import constants
+from .variant_records import LoteVariantes
+
+
+class FiltroArtefactos:
+    """Reglas de artefactos compiladas e indexadas por posición."""
+
+    def __init__(self, reglas: list):
+        self.reglas_por_posicion = {}
+        for regla in reglas:
+            compilada = (
+                tuple(regla["tipos"]) if regla.get("tipos") else None,
+                frozenset(a.upper() for a in regla["ref"]) if regla.get("ref") else None,
+                frozenset(a.upper() for a in regla["alt"]) if regla.get("alt") else None,
+                regla.get("motivo", "Artefacto"),
+            )
+            inicio = regla.get("inicio", regla.get("pos"))
+            fin = regla.get("fin", inicio)
+            for pos in range(int(inicio), int(fin) + 1):
+                self.reglas_por_posicion.setdefault(pos, []).append(compilada)
+        self.posiciones = np.fromiter(self.reglas_por_posicion, dtype=np.int64, count=len(self.reglas_por_posicion))
+
+    def motivo_artefacto(self, variante) -> str | None:
+        """Motivo de la primera regla que cumple la variante en su posición, o None."""
+        reglas = self.reglas_por_posicion.get(variante.get('pos'))
+        if not reglas:
+            return None
+        tipo = variante.get('type', '')
+        ref = variante.get('ref', '').upper()
+        alt = variante.get('alt', '').upper()
+        for tipos, refs, alts, motivo in reglas:
+            if tipos is not None and not tipo.startswith(tipos): continue
+            if refs is not None and ref not in refs: continue
+            if alts is not None and alt not in alts: continue
+            return motivo
+        return None
+
+    def filtrar(self, variantes) -> tuple[list, list]:
+        """
+        Separa un lote (lista de variantes o LoteVariantes) en (conservadas, artefactos).
+        Solo las variantes en posiciones con reglas, seleccionadas en una pasada
+        vectorizada, se evalúan individualmente.
+        """
+        if isinstance(variantes, LoteVariantes):
+            posiciones = variantes.posiciones
+        else:
+            posiciones = np.fromiter((-1 if v.get('pos') is None else v.get('pos') for v in variantes), dtype=np.int64, count=len(variantes))
+        candidatas = set(np.flatnonzero(np.isin(posiciones, self.posiciones)).tolist())
+        if not candidatas:
+            return list(variantes), []
+        conservadas, artefactos = [], []
+        for i, variante in enumerate(variantes):
+            if i in candidatas and self.motivo_artefacto(variante) is not None:
+                artefactos.append(variante)
+            else:
+                conservadas.append(variante)
+        return conservadas, artefactos
+
+    def filtrar_flujo(self, variantes):
+        """Etapa en flujo: deja pasar solo las variantes que no cumplen ninguna regla."""
+        for variante in variantes:
+            if self.motivo_artefacto(variante) is None:
+                yield variante
+
+
+def cargar_reglas_artefactos(ruta_config: str | None = constants.ARTIFACT_RULES_CONFIG_PATH) -> list:
+    """Reglas de `constants.ARTIFACT_RULES` más las del JSON de configuración, si se indica."""
+    reglas = list(constants.ARTIFACT_RULES)
+    if ruta_config:
+        try:
+            with open(ruta_config, encoding="utf-8") as f:
+                reglas.extend(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Advertencia: No se pudieron cargar las reglas de artefactos de '{ruta_config}': {e}")
+    return reglas
+
+@lru_cache(maxsize=None)
+def obtener_filtro_artefactos(ruta_config: str | None = constants.ARTIFACT_RULES_CONFIG_PATH) -> FiltroArtefactos:
+    """Filtro compilado una vez por proceso (y por archivo de configuración)."""
+    return FiltroArtefactos(cargar_reglas_artefactos(ruta_config))
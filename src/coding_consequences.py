@@ -0,0 +1,144 @@
+# ==============================================================================
+# BLOQUE 4b: TABLA PRECALCULADA DE CONSECUENCIAS DE SNV EN GENES PROTEICOS
+# ==============================================================================
+# Descripción: Para cada posición de los 13 genes codificantes de proteínas de
+# rCRS y cada base alternativa (A, C, G, T) se precalcula una vez la
+# consecuencia a nivel de codón (sinónima, cambio de sentido, ganancia de
+# stop, pérdida de inicio, pérdida de stop) con el código genético
+# mitocondrial de vertebrados y la hebra de `MASTER_RCRS_FEATURES_DEFINITION`
+# (ND6 se lee en la hebra L, reverso-complementaria). Las posiciones con dos
+# genes solapantes (ATP8/ATP6, ATP6/CO3, ND4L/ND4) guardan ambas lecturas.
+# Anotar una sustitución es una lectura de array; la tabla se guarda en el
+# paquete de referencia.
+# ------------------------------------------------------------------------------
+
+import numpy as np
+from Bio.Data import CodonTable
+from Bio.Seq import Seq
+from . import constants
+
+# Código de consecuencia -> etiqueta (0: sin consecuencia proteica)
+CONSECUENCIAS_SNV = ("", "Sinónima", "Cambio de sentido", "Ganancia de stop", "Pérdida de inicio", "Pérdida de stop")
+CODIGO_CONSECUENCIA = {etiqueta: codigo for codigo, etiqueta in enumerate(CONSECUENCIAS_SNV) if etiqueta}
+
+_BASES = "ACGT"
+_COMPLEMENTO = {"A": "T", "C": "G", "G": "C", "T": "A"}
+_INDICE_BASE = np.full(256, 4, dtype=np.uint8)
+for _i, _b in enumerate(_BASES):
+    _INDICE_BASE[ord(_b)] = _i
+    _INDICE_BASE[ord(_b.lower())] = _i
+
+MAX_GENES_POR_POSICION = 2
+
+
+class TablaConsecuencias:
+    """
+    Arrays indexados por posición 1-based de rCRS y por lectura (hasta dos genes solapantes):
+      gen_idx      int8  (L+1, 2)     índice en `genes` (-1: sin gen)
+      codon        int16 (L+1, 2)     número de codón 1-based en la proteína
+      aa_ref       uint8 (L+1, 2)     aminoácido de referencia (ASCII, '*' = stop)
+      consecuencia uint8 (L+1, 2, 4)  código en CONSECUENCIAS_SNV por base alternativa (A, C, G, T)
+      aa_alt       uint8 (L+1, 2, 4)  aminoácido resultante
+    """
+
+    def __init__(self, genes: list, gen_idx: np.ndarray, codon: np.ndarray, aa_ref: np.ndarray, consecuencia: np.ndarray, aa_alt: np.ndarray):
+        self.genes = list(genes)
+        self.gen_idx = gen_idx
+        self.codon = codon
+        self.aa_ref = aa_ref
+        self.consecuencia = consecuencia
+        self.aa_alt = aa_alt
+
+    @classmethod
+    def construir(
+        cls,
+        rcrs_str: str,
+        definicion_features: list = constants.MASTER_RCRS_FEATURES_DEFINITION,
+        id_tabla_codones: int = constants.MITO_CODON_TABLE_ID
+    ) -> "TablaConsecuencias":
+        """
+        Traduce todas las SNV posibles de los genes de tipo 'gene'. Los codones de stop
+        incompletos del extremo 3' se completan con A, como hace la poliadenilación del ARNm.
+        """
+        rcrs_str = rcrs_str.upper()
+        tabla = CodonTable.unambiguous_dna_by_id[id_tabla_codones]
+        traducir = lambda codon_str: "*" if codon_str in tabla.stop_codons else tabla.forward_table.get(codon_str, "X")
+
+        n = len(rcrs_str) + 1
+        gen_idx = np.full((n, MAX_GENES_POR_POSICION), -1, dtype=np.int8)
+        codon = np.zeros((n, MAX_GENES_POR_POSICION), dtype=np.int16)
+        aa_ref = np.zeros((n, MAX_GENES_POR_POSICION), dtype=np.uint8)
+        consecuencia = np.zeros((n, MAX_GENES_POR_POSICION, 4), dtype=np.uint8)
+        aa_alt = np.zeros((n, MAX_GENES_POR_POSICION, 4), dtype=np.uint8)
+
+        genes = [f for f in definicion_features if f["tipo"] == "gene"]
+        for i_gen, gen in enumerate(genes):
+            inicio, fin, hebra = gen["inicio"], gen["fin"], gen["hebra"]
+            secuencia_gen = rcrs_str[inicio - 1:fin]
+            if hebra == -1:
+                secuencia_gen = str(Seq(secuencia_gen).reverse_complement())
+            secuencia_gen += "A" * (-len(secuencia_gen) % 3)
+
+            for i_nt in range(fin - inicio + 1):
+                pos = inicio + i_nt if hebra != -1 else fin - i_nt
+                lectura = 0 if gen_idx[pos, 0] < 0 else 1
+                num_codon, fase = divmod(i_nt, 3)
+                codon_ref = secuencia_gen[3 * num_codon:3 * num_codon + 3]
+                es_inicio = num_codon == 0 and codon_ref in tabla.start_codons
+                aa_ref_str = "M" if es_inicio else traducir(codon_ref)
+
+                gen_idx[pos, lectura] = i_gen
+                codon[pos, lectura] = num_codon + 1
+                aa_ref[pos, lectura] = ord(aa_ref_str)
+                for i_base, base in enumerate(_BASES):
+                    base_gen = _COMPLEMENTO[base] if hebra == -1 else base
+                    if base_gen == codon_ref[fase]:
+                        continue
+                    codon_alt = codon_ref[:fase] + base_gen + codon_ref[fase + 1:]
+                    if es_inicio:
+                        aa_alt_str = "M" if codon_alt in tabla.start_codons else traducir(codon_alt)
+                        etiqueta = "Sinónima" if aa_alt_str == "M" else "Pérdida de inicio"
+                    else:
+                        aa_alt_str = traducir(codon_alt)
+                        if aa_alt_str == aa_ref_str: etiqueta = "Sinónima"
+                        elif aa_alt_str == "*": etiqueta = "Ganancia de stop"
+                        elif aa_ref_str == "*": etiqueta = "Pérdida de stop"
+                        else: etiqueta = "Cambio de sentido"
+                    consecuencia[pos, lectura, i_base] = CODIGO_CONSECUENCIA[etiqueta]
+                    aa_alt[pos, lectura, i_base] = ord(aa_alt_str)
+        return cls([g["nombre_display"] for g in genes], gen_idx, codon, aa_ref, consecuencia, aa_alt)
+
+    def como_arrays(self) -> dict:
+        return {"gen_idx": self.gen_idx, "codon": self.codon, "aa_ref": self.aa_ref, "consecuencia": self.consecuencia, "aa_alt": self.aa_alt}
+
+    @classmethod
+    def desde_arrays(cls, genes: list, arrays: dict) -> "TablaConsecuencias":
+        return cls(genes, arrays["gen_idx"], arrays["codon"], arrays["aa_ref"], arrays["consecuencia"], arrays["aa_alt"])
+
+    def consecuencias(self, pos_1based: int, alt: str) -> list:
+        """Lista de (gen, codón, aa_ref, aa_alt, etiqueta) de la SNV; vacía fuera de genes proteicos."""
+        if not isinstance(pos_1based, int) or not 0 < pos_1based < len(self.gen_idx) or len(alt) != 1:
+            return []
+        i_base = _INDICE_BASE[ord(alt)] if alt.isascii() else 4
+        if i_base == 4:
+            return []
+        resultado = []
+        for lectura in range(MAX_GENES_POR_POSICION):
+            codigo = self.consecuencia[pos_1based, lectura, i_base]
+            if codigo:
+                resultado.append((
+                    self.genes[self.gen_idx[pos_1based, lectura]], int(self.codon[pos_1based, lectura]),
+                    chr(self.aa_ref[pos_1based, lectura]), chr(self.aa_alt[pos_1based, lectura, i_base]), CONSECUENCIAS_SNV[codigo]
+                ))
+        return resultado
+
+    def describir(self, pos_1based: int, alt: str) -> str:
+        """Texto para el informe, p. ej. 'CYTB:p.T194A (Cambio de sentido)'; '-' sin consecuencia proteica."""
+        partes = [f"{gen}:p.{aa_r}{num}{aa_a} ({etiqueta})" for gen, num, aa_r, aa_a, etiqueta in self.consecuencias(pos_1based, alt)]
+        return "; ".join(partes) if partes else "-"
+
+    def describir_variante(self, variante) -> str:
+        """`describir` para una variante cruda; solo las sustituciones tienen consecuencia."""
+        if not str(variante.get('type', '')).startswith(('transition', 'transversion', 'substitution')):
+            return "-"
+        return self.describir(variante.get('pos'), variante.get('alt', ''))
@@ -11,6 +11,11 @@
 RCRS_FASTA_PATH = "data/NC_012920.1_rCRS.fasta"
 RCRS_GENBANK_PATH = "data/NC_012920.1_rCRS.gb"
 
+# --- Paquete de referencia precompilado (secuencia + features + índice de locus + consecuencias de SNV) ---
+REFERENCE_BUNDLE_ENABLED = True # Carga la referencia del paquete (memory-mapping) en lugar de analizar FASTA y GenBank
+REFERENCE_BUNDLE_PATH = "cache/referencia_rcrs.mitoref" # Se genera con `python -m src.reference_bundle` o en la primera ejecución
+REFERENCE_BUNDLE_VERSION = 2 # Versión del formato; un paquete de otra versión se ignora y se regenera
+
 # --- Archivo de secuencia de consulta de ejemplo (si no se proporciona uno) ---
 DEFAULT_QUERY_FASTA_PATH = "data/LC733703.1_full.fasta"
 
@@ -56,6 +61,81 @@ MITOMASTER_HVI_INS_ANCHOR_16193 = 16193
 MITOMASTER_INS_198_ANCHOR = 198
 MITOMASTER_INS_291_ANCHOR = 290
 
+# --- Reglas declarativas de artefactos / blacklist (filtro indexado por posición) ---
+# Cada regla: "pos" (o rango "inicio"/"fin"), con la convención de posición de las
+# variantes crudas (1-based; inserciones: base 0-based previa), y opcionalmente
+# "tipos" (prefijos de tipo de variante), "ref" y "alt" (alelos admitidos).
+# Un campo ausente acepta cualquier valor.
+ARTIFACT_RULES = [
+    {"pos": POS_3107_BLACKLISTED, "motivo": "Posición 3107 (SWGDAM/EMPOP)"},
+    {"pos": 3107, "tipos": ["deletion"], "ref": ["N"], "motivo": "Artefacto m.3107delN"},
+    {"pos": 3106, "tipos": ["substitution"], "ref": ["C"], "alt": ["N"], "motivo": "Artefacto C3106N"},
+    {"pos": 3107, "tipos": ["substitution"], "ref": ["N"], "alt": ["A", "C", "G", "T"], "motivo": "Artefacto N3107X"},
+]
+ARTIFACT_RULES_CONFIG_PATH = None # JSON opcional con reglas adicionales del laboratorio (mismo formato), p. ej. "data/artefactos.json"
+
+# --- Reglas de formato Mitomaster (convenciones de hotspots, indexadas por posición de anclaje) ---
+# Cada regla: "etapa" ("cruda": sobre la variante cruda, con su convención de posición;
+# "hgvs": sobre la edición normalizada, "pos" = inicio HGVS y "ref" = bases de rCRS del
+# intervalo), "pos" (o rango "inicio"/"fin") y opcionalmente "tipos" (tipos exactos de
+# la variante cruda o de la edición HGVS), "ref"/"alt" (alelos admitidos), "fin_edicion"
+# (fin HGVS exigido), "base_referencia" ([pos 1-based, base] exigida en rCRS) y "ancla".
+# "formato" es una plantilla con los campos {pos}, {ref}, {alt}, {ancla}, {base_ancla} y
+# {c_insertadas}; "informe" ({"pos", "alt"}) redefine la fila del informe para esa cadena.
+# Dentro de una posición se aplica la primera regla que se cumple (en el orden de la tabla).
+MITOMASTER_RULES = [
+    {"etapa": "cruda", "pos": 301, "tipos": ["insertion"], "alt": ["CC"], "base_referencia": [309, "C"], "formato": "C309CCC", "informe": {"pos": 309, "alt": "CCC"}},
+    {"etapa": "cruda", "pos": 16182, "tipos": ["insertion"], "alt": ["C"], "base_referencia": [16193, "C"], "formato": "C16193CC", "informe": {"pos": 16193, "alt": "CC"}},
+    {"etapa": "cruda", "pos": 310, "tipos": ["deletion"], "ref": ["T"], "formato": "CT309-"}, # Deleción de T310 vista como deleción de bloque
+    {"etapa": "cruda", "pos": 316, "tipos": ["deletion"], "ref": ["G"], "formato": "G316C"}, # Deleción de G316 vista como sustitución
+    {"etapa": "cruda", "pos": 8270, "tipos": ["deletion"], "ref": ["CACCCCCT"], "formato": "CCCCCTCTA8281-"}, # Deleción en bloque 8270-8292
+    {"etapa": "cruda", "inicio": HVI_C_STRETCH_START - 1, "fin": HVI_C_STRETCH_END - 1, "tipos": ["insertion"],
+     "ancla": MITOMASTER_HVI_INS_ANCHOR_16193, "formato": "C{ancla}{c_insertadas}"}, # Inserciones HVI (1618x -> 16193)
+    {"etapa": "cruda", "pos": MITOMASTER_INS_198_ANCHOR - 1, "tipos": ["insertion"], "ancla": MITOMASTER_INS_198_ANCHOR, "formato": "{base_ancla}{ancla}{alt}"},
+    {"etapa": "cruda", "pos": MITOMASTER_INS_291_ANCHOR - 1, "tipos": ["insertion"], "ancla": MITOMASTER_INS_291_ANCHOR, "formato": "{base_ancla}{ancla}{alt}"},
+    {"etapa": "hgvs", "pos": 523, "fin_edicion": 524, "tipos": ["del"], "ref": ["CA"], "formato": "CA522d"},
+    {"etapa": "hgvs", "pos": 523, "fin_edicion": 524, "tipos": ["del"], "formato": "{ref}522d"},
+    {"etapa": "hgvs", "pos": 303, "fin_edicion": 309, "tipos": ["del"], "formato": "{ref}{pos}-"}, # Poli-C completo de HVII
+    {"etapa": "hgvs", "pos": 316, "tipos": ["del"], "ref": ["G"], "formato": "G316C"},
+    {"etapa": "hgvs", "pos": 310, "tipos": ["del"], "ref": ["T"], "formato": "CT309-"},
+    {"etapa": "hgvs", "pos": 8270, "tipos": ["del"], "ref": ["CACCCCCT"], "formato": "CCCCCTCTA8281-"},
+]
+MITOMASTER_RULES_CONFIG_PATH = None # JSON opcional con reglas Mitomaster adicionales (mismo formato)
+
+# --- Puntuaciones del alineador (matriz de sustitución y penalizaciones de gap) ---
+ALIGNMENT_MATCH_SCORE = 3
+ALIGNMENT_MISMATCH_SCORE = -3
+ALIGNMENT_AMBIGUOUS_SCORE = 1 # N (o código IUPAC compatible) frente a una base
+ALIGNMENT_OPEN_GAP_SCORE = -7.0
+ALIGNMENT_EXTEND_GAP_SCORE = -2.0
+
+# --- Índice de semillas de rCRS (compartido por anclaje, rotación circular y pre-filtro) ---
+SEED_KMER_SIZE = 15 # Longitud de k-mer del índice de semillas (hash 2-bit, k <= 32)
+SEED_INDEX_DIR = "cache/indice_semillas" # Arrays .npy (hashes ordenados, posiciones, unicidad) cargados con memory-mapping
+
+# --- Parámetros del alineamiento anclado (k-mers exactos contra rCRS + DP en huecos) ---
+ANCHORED_ALIGNMENT_ENABLED = True # main() usa el motor anclado y recurre a la DP completa si no es aplicable
+ANCHOR_EDGE_TRIM = 6 # Bases retiradas en cada extremo de un ancla para que la DP coloque los indels vecinos
+ANCHOR_MIN_QUERY_COVERAGE = 0.5 # Fracción mínima de la query cubierta por anclas para usar el motor anclado
+ANCHOR_FLANK_PADDING = 100 # Bases extra de rCRS para extender los flancos en modo local
+CIRCULAR_ALIGNMENT_ENABLED = True # Detecta queries linealizadas en otro origen o que cruzan 16569/1 y las rota antes de alinear
+CIRCULAR_SHIFT_TOLERANCE = 20 # Desplazamientos de k-mer (pb) atribuibles a indels y no a una rotación real de la query
+CIRCULAR_MIN_SUPPORT = 0.3 # Fracción mínima de k-mers de la query en la diagonal mayoritaria (± tolerancia) para rotar
+LINEAR_MEMORY_GLOBAL_ALIGNMENT = False # Modo global con el motor Hirschberg (memoria lineal) en lugar de la DP completa
+LINEAR_ALIGNMENT_BASE_CASE_CELLS = 2_000_000 # Subproblemas con menos celdas se resuelven con traceback completo
+ALIGNMENT_SCORE_PREPASS = False # Pre-paso aligner.score (solo puntuación) e informe de co-óptimos en la DP completa
+
+# --- Caché persistente de alineamientos (direccionada por contenido) ---
+ALIGNMENT_CACHE_ENABLED = True # Reutiliza coordenadas y variantes crudas de ejecuciones previas con la misma query/rCRS/parámetros
+ALIGNMENT_CACHE_DIR = "cache/alineamientos" # Un archivo .npz por alineamiento, nombrado por su hash SHA-256
+ALIGNMENT_CACHE_MAX_BYTES = 512 * 1024 * 1024 # Tamaño máximo; se expulsan primero las entradas usadas hace más tiempo (LRU por mtime)
+ALIGNMENT_CACHE_VERSION = 4 # Forma parte de la clave: incrementarlo invalida la caché al cambiar el formato o la extracción
+
+# --- Pre-filtro de k-mers antes del alineamiento (ADNmt humano, hebra) ---
+PRESCREEN_ENABLED = True # Estima identidad con rCRS en ambas hebras antes de cualquier etapa costosa
+PRESCREEN_MIN_IDENTITY = 0.90 # Identidad estimada mínima (contención de k-mers ^ 1/k)
+PRESCREEN_ACTION = "rechazar" # "rechazar": aborta el análisis; "marcar": continúa con una advertencia
+
 # Hotspots de indels que EMPOP ignora por defecto en búsquedas
 EMPOP_IGNORED_INDEL_HOTSPOTS_POS = {16193, 309, 455, 463, 573, 960, 5899, 8276, 8285}
 
@@ -171,3 +251,22 @@ MASTER_RCRS_FEATURES_DEFINITION = [
 
 # Constantes para anotación de locus
 PRIORITY_FEATURE_TYPES = ["CDS", "rRNA", "tRNA"]
+MITO_CODON_TABLE_ID = 2 # Código genético mitocondrial de vertebrados (tabla NCBI 2) para las consecuencias de SNV
+HGVS_NORMALIZER_BACKEND = "nativo" # "nativo" (hgvs_native, sobre la rCRS) o "hgvs" (parser + Normalizer de la librería hgvs); validado con `python -m src.hgvs_native_validation`
+LOCAL_SEQ_WINDOW_CACHE_SIZE = 64 # Ventanas (ac, inicio, fin) recientes que LocalSeqProvider devuelve sin volver a cortar el búfer
+HGVS_SHARED_REFERENCES_MAX = 4 # Referencias distintas con proveedor y normalizador hgvs vivos en el proceso
+
+# --- Caché de normalización HGVS entre muestras ---
+HGVS_CACHE_ENABLED = True # Memoiza la cadena HGVS normalizada por (accesión, pos, ref, alt, tipo)
+HGVS_CACHE_MAX_ENTRIES = 100_000 # Tamaño del LRU en memoria del proceso
+HGVS_CACHE_DB_PATH = "cache/hgvs_normalizacion.sqlite" # Nivel persistente compartido entre workers (None lo desactiva)
+HGVS_CACHE_WRITE_BATCH = 256 # Entradas nuevas acumuladas antes de escribirlas en SQLite
+HGVS_CACHE_VERSION = 2 # Forma parte de la clave: incrementarlo invalida la caché al cambiar la construcción de las cadenas
+
+# --- Normalización HGVS por lotes de muestras (pool de procesos) ---
+HGVS_POOL_PROCESSES = None # Workers del pool (None: os.cpu_count())
+HGVS_POOL_MIN_VARIANTS = 2000 # Por debajo de estas variantes únicas sin resolver no compensa arrancar el pool
+HGVS_POOL_SHARD_SIZE = 512 # Variantes únicas por tarea enviada a un worker
+
+# --- Índice de repeticiones y homopolímeros de rCRS (desplazamiento de indels en O(1)) ---
+REPEAT_INDEX_MAX_PERIOD = 10 # Periodo máximo indexado (incluye la repetición de 9 pb de 8281-8289); indels más largos se desplazan recorriendo la secuencia
@@ -11,25 +11,54 @@ import hgvs.normalizer
 import hgvs.exceptions
 import re
 import traceback
-from . import constants 
+from collections import OrderedDict
+from functools import lru_cache
+from . import constants
+from .artifact_filters import obtener_filtro_artefactos
+from .hgvs_native import EdicionHGVS, EstadoHGVS, ResultadoHGVS, normalizar_variante_nativa
+from .mitomaster_rules import obtener_reglas_mitomaster
+from .repeat_index import obtener_indice_repeticiones
+from .hgvs_cache import obtener_cache_hgvs, calcular_version_normalizacion
+
+# Búferes de referencia compartidos por accesión: todos los proveedores (rCRS, RSRS,
+# consenso de una muestra...) leen de los mismos bytes inmutables.
+_BUFERES_SECUENCIA = {}
+
+def registrar_secuencia_referencia(ac: str, secuencia) -> memoryview:
+    """
+    Búfer de solo lectura de `ac` en el registro del proceso. Acepta str o cualquier objeto
+    con protocolo de búfer (bytes, array uint8, el memmap del paquete de referencia), que
+    se usa sin copiar. Si la accesión ya tiene el mismo contenido, se devuelve ese búfer.
+    """
+    vista = memoryview(secuencia.encode("ascii") if isinstance(secuencia, str) else secuencia).cast("B").toreadonly()
+    existente = _BUFERES_SECUENCIA.get(ac)
+    if existente is not None and existente == vista:
+        return existente
+    _BUFERES_SECUENCIA[ac] = vista
+    return vista
+
 
 class LocalSeqProvider(hgvs.dataproviders.interface.Interface):
-    def __init__(self, seq_dict: dict):
-        self._seq_dict = seq_dict
+    def __init__(self, seq_dict: dict, tamano_cache_ventanas: int = constants.LOCAL_SEQ_WINDOW_CACHE_SIZE):
+        self._vistas = {ac: registrar_secuencia_referencia(ac, seq) for ac, seq in seq_dict.items()}
+        self._ventanas = OrderedDict() # (ac, start_i, end_i) -> str: el normalizador repite y solapa peticiones
+        self._tamano_cache_ventanas = tamano_cache_ventanas
         self.source = "local_dict_provider"
     @property
     def data_version(self) -> str: return "1.0"
     @property
     def schema_version(self) -> str: return "1.0"
     def get_seq(self, ac: str, start_i: int = None, end_i: int = None) -> str:
-        seq = self._seq_dict.get(ac)
-        if seq is None: raise hgvs.exceptions.HGVSDataNotAvailableError(f"Secuencia '{ac}' no encontrada")
-        len_seq = len(seq); start = start_i if start_i is not None else 0; end = end_i if end_i is not None else len_seq
-        if start < 0: start = len_seq + start
-        if end < 0: end = len_seq + end
-        start = max(0, start); end = min(len_seq, end)
-        if start >= end: return ""
-        return seq[start:end]
+        clave = (ac, start_i, end_i)
+        sub = self._ventanas.get(clave)
+        if sub is not None: return sub
+        vista = self._vistas.get(ac)
+        if vista is None: raise hgvs.exceptions.HGVSDataNotAvailableError(f"Secuencia '{ac}' no encontrada")
+        start, end, _ = slice(start_i, end_i).indices(len(vista)) # Índices negativos y recorte a los límites
+        sub = str(vista[start:end], "ascii") if start < end else ""
+        self._ventanas[clave] = sub
+        if len(self._ventanas) > self._tamano_cache_ventanas: self._ventanas.popitem(last=False)
+        return sub
     def get_assembly_map(self, assembly_name): raise NotImplementedError("get_assembly_map no implementado")
     def get_gene_info(self, gene): raise NotImplementedError("get_gene_info no implementado")
     def get_tx_exons(self, tx_ac, alt_ac, alt_aln_method): raise NotImplementedError("get_tx_exons no implementado")
@@ -43,286 +72,247 @@ class LocalSeqProvider(hgvs.dataproviders.interface.Interface):
     def get_tx_for_region(self, alt_ac, alt_aln_method, start_i, end_i): raise NotImplementedError("get_tx_for_region no implementado")
     def get_pro_ac_for_tx_ac(self, tx_ac): raise NotImplementedError("get_pro_ac_for_tx_ac no implementado")
     def get_seq_part(self, ac, start_i=None, end_i=None): return self.get_seq(ac, start_i, end_i)
-    def __contains__(self, ac: str) -> bool: return ac in self._seq_dict
+    def __contains__(self, ac: str) -> bool: return ac in self._vistas
     def list_assemblies(self): raise NotImplementedError("list_assemblies no implementado")
     def list_genes(self): raise NotImplementedError("list_genes no implementado")
 
 
+def _normalizar_variante_hgvs(var_dict, ref_accession: str, hp: hgvs.parser.Parser, hn: hgvs.normalizer.Normalizer) -> ResultadoHGVS:
+    """Normalización de una variante cruda con la librería hgvs (ResultadoHGVS con estado ERROR si falla)."""
+    error = lambda mensaje: ResultadoHGVS(var_dict, EstadoHGVS.ERROR, mensaje)
+    hgvs_string_base = f"{ref_accession}:m."
+    hgvs_string_var_part = ""
+    try:
+        pos_input_cruda = var_dict['pos']; ref_allele = var_dict['ref'].upper()
+        alt_allele = var_dict['alt'].upper(); var_type = var_dict['type']
+    except KeyError as ke: return error(f"ERROR_DATO_FALTANTE_EN_VAR_CRUDA ({ke}): {var_dict}")
+    except Exception as e: return error(f"ERROR_INESPERADO_EN_VAR_CRUDA ({type(e).__name__}): {var_dict}")
+    if var_type in ["transition","transversion","substitution","substitution (con N)"]:
+        pos_1based_sub = int(pos_input_cruda)
+        if pos_1based_sub <= 0: return error(f"ERROR_POS_SUB_INVALIDA ({pos_1based_sub}): {var_dict}")
+        hgvs_string_var_part = f"{pos_1based_sub}{ref_allele}>{alt_allele}"
+    elif var_type == 'deletion':
+        pos_1based_del_start = int(pos_input_cruda)
+        if pos_1based_del_start <= 0: return error(f"ERROR_POS_DEL_INVALIDA ({pos_1based_del_start}): {var_dict}")
+        len_del = len(ref_allele)
+        if len_del == 0: return error(f"ERROR_DEL_SIN_REF: {var_dict}")
+        if len_del > 1: end_pos_del = pos_1based_del_start + len_del - 1; hgvs_string_var_part = f"{pos_1based_del_start}_{end_pos_del}del"
+        else: hgvs_string_var_part = f"{pos_1based_del_start}del" 
+    elif var_type == 'insertion':
+        pos_0based_anterior_ins = int(pos_input_cruda) 
+        if pos_0based_anterior_ins < 0: hgvs_pos_anterior_1based = 0; hgvs_pos_siguiente_1based = 1
+        else: hgvs_pos_anterior_1based = pos_0based_anterior_ins + 1; hgvs_pos_siguiente_1based = hgvs_pos_anterior_1based + 1
+        hgvs_string_var_part = f"{hgvs_pos_anterior_1based}_{hgvs_pos_siguiente_1based}ins{alt_allele}"
+    if not hgvs_string_var_part: return error(f"UNPROCESSED_FORMAT_HGVS ({var_type}): {var_dict}")
+    hgvs_full_string_to_parse = hgvs_string_base + hgvs_string_var_part
+    try:
+        parsed_variant = hp.parse_hgvs_variant(hgvs_full_string_to_parse)
+        normalized_variant = hn.normalize(parsed_variant)
+        return ResultadoHGVS(var_dict, EstadoHGVS.NORMALIZADA, str(normalized_variant), EdicionHGVS.desde_variante_hgvs(normalized_variant))
+    except Exception as e_norm: 
+        if var_type == 'deletion' and len(ref_allele) == 1 and pos_1based_del_start > 0:
+            hgvs_string_var_part_alt_del = f"{pos_1based_del_start}del{ref_allele}" # Intenta formato m.XdelN
+            hgvs_full_string_alt_del = hgvs_string_base + hgvs_string_var_part_alt_del
+            try:
+                parsed_variant_alt = hp.parse_hgvs_variant(hgvs_full_string_alt_del)
+                normalized_variant_alt = hn.normalize(parsed_variant_alt)
+                return ResultadoHGVS(var_dict, EstadoHGVS.REINTENTO_DEL, str(normalized_variant_alt), EdicionHGVS.desde_variante_hgvs(normalized_variant_alt))
+            except Exception as e_retry: return error(f"{hgvs_full_string_to_parse} (Error HGVS: {type(e_norm).__name__}), ReintentoDel {hgvs_full_string_alt_del} (FALLIDO: {type(e_retry).__name__})")
+        else: return error(f"{hgvs_full_string_to_parse} (ERROR HGVS General: {type(e_norm).__name__} - {e_norm})")
+
+# --- Instancias de la librería hgvs compartidas por el proceso ---
+# Construir el Parser compila toda la gramática HGVS (cientos de ms): parser,
+# proveedor de secuencias y normalizador se crean en el primer uso y se
+# reutilizan para todas las muestras.
+
+@lru_cache(maxsize=None)
+def obtener_parser_hgvs() -> hgvs.parser.Parser:
+    return hgvs.parser.Parser()
+
+@lru_cache(maxsize=constants.HGVS_SHARED_REFERENCES_MAX)
+def obtener_proveedor_secuencias(ref_accession: str, ref_sequence_str: str) -> LocalSeqProvider:
+    return LocalSeqProvider({ref_accession: ref_sequence_str})
+
+@lru_cache(maxsize=constants.HGVS_SHARED_REFERENCES_MAX)
+def obtener_normalizador_hgvs(ref_accession: str, ref_sequence_str: str) -> hgvs.normalizer.Normalizer:
+    return hgvs.normalizer.Normalizer(obtener_proveedor_secuencias(ref_accession, ref_sequence_str), shuffle_direction=3, cross_boundaries=True)
+
+def precalentar_hgvs(ref_accession: str | None = None, ref_sequence_str: str | None = None, usar_cache: bool = constants.HGVS_CACHE_ENABLED) -> None:
+    """
+    Construye por adelantado el parser (y, con referencia, el normalizador) y abre la caché
+    de normalización; pensado para el arranque de un pool de workers o de un servidor.
+    """
+    obtener_parser_hgvs()
+    if ref_accession and ref_sequence_str:
+        obtener_normalizador_hgvs(ref_accession, ref_sequence_str)
+    if usar_cache:
+        obtener_cache_hgvs()
+
+def generar_hgvs_normalizado(
+    variantes_crudas,
+    ref_accession: str,
+    ref_sequence_str: str,
+    motor: str = constants.HGVS_NORMALIZER_BACKEND,
+    usar_cache: bool = constants.HGVS_CACHE_ENABLED
+):
+    """
+    Etapa en flujo: por cada variante cruda produce su ResultadoHGVS (enlazado a ella).
+    Los resultados se buscan primero en la caché entre muestras (`hgvs_cache`). Con el
+    motor "nativo" las variantes se normalizan sobre la rCRS con `hgvs_native` y solo las
+    que este no resuelve pasan por la librería hgvs; el parser y el normalizador de la
+    librería (compartidos por el proceso) se crean la primera vez que hacen falta.
+    """
+    secuencia_nativa = ref_sequence_str.upper() if motor == "nativo" else None
+    indice_nativo = obtener_indice_repeticiones(secuencia_nativa) if secuencia_nativa is not None else None
+    cache = obtener_cache_hgvs() if usar_cache else None
+    version_cache = calcular_version_normalizacion(ref_sequence_str, motor) if cache is not None else None
+    hn = None
+    try:
+        for var_dict in variantes_crudas:
+            clave = cache.clave(version_cache, ref_accession, var_dict) if cache is not None else None
+            resultado = cache.obtener(clave, var_dict) if clave is not None else None
+            if resultado is None:
+                edicion = normalizar_variante_nativa(var_dict, secuencia_nativa, indice_nativo) if secuencia_nativa is not None else None
+                if edicion is not None:
+                    resultado = ResultadoHGVS(var_dict, EstadoHGVS.NORMALIZADA, edicion.como_hgvs(ref_accession), edicion)
+                else:
+                    if hn is None:
+                        try:
+                            hp, hn = obtener_parser_hgvs(), obtener_normalizador_hgvs(ref_accession, ref_sequence_str)
+                        except Exception as e_setup:
+                            print(f"Error general en la configuración o proceso de normalización HGVS: {e_setup}"); traceback.print_exc()
+                            yield ResultadoHGVS(var_dict, EstadoHGVS.ERROR, f"ERROR_HGVS_SETUP ({type(e_setup).__name__}): {var_dict}")
+                            continue
+                    try:
+                        resultado = _normalizar_variante_hgvs(var_dict, ref_accession, hp, hn)
+                    except Exception as e_var:
+                        yield ResultadoHGVS(var_dict, EstadoHGVS.ERROR, f"ERROR_HGVS_SETUP ({type(e_var).__name__}): {var_dict}")
+                        continue
+                if clave is not None and not resultado.es_error: # Los mensajes de error incluyen la variante concreta
+                    cache.guardar(clave, resultado)
+            yield resultado
+    finally:
+        if cache is not None:
+            cache.volcar()
+
 def normalizar_y_nombrar_hgvs(variantes_crudas: list, ref_accession: str, ref_sequence_str: str) -> list:
     
     print("\n--- Iniciando Paso 5: Nomenclatura y Normalización HGVS ---")
     if not variantes_crudas: return []
+    print(f"Procesando {len(variantes_crudas)} variantes crudas con HGVS...")
+    normalized_hgvs_strings = [resultado.cadena for resultado in generar_hgvs_normalizado(variantes_crudas, ref_accession, ref_sequence_str)]
+    print(f"Procesamiento HGVS completado. {len(normalized_hgvs_strings)} variantes procesadas.")
+    return normalized_hgvs_strings
+
+def _formatear_variante_mitomaster(
+    resultado_hgvs: ResultadoHGVS,
+    ref_acc_id: str,
+    ref_sequence_str_original: str
+) -> str:
+    """
+    Formato Mitomaster de una variante a partir de su ResultadoHGVS (edición normalizada y
+    variante cruda original). Solo un resultado sin edición estructurada se vuelve a leer
+    con el parser de hgvs.
+    """
+    if resultado_hgvs.es_error:
+        return resultado_hgvs.cadena
+    var_cruda_actual = resultado_hgvs.variante
+    edicion_hgvs = resultado_hgvs.edicion
+    if edicion_hgvs is not None:
+        variant_part_hgvs = edicion_hgvs.descripcion()
+    else:
+        prefix_to_remove = ref_acc_id + ":m."
+        variant_part_hgvs = resultado_hgvs.texto[len(prefix_to_remove):] if resultado_hgvs.texto.startswith(prefix_to_remove) else resultado_hgvs.texto
+    formato_final_mitomaster = variant_part_hgvs 
+
+    original_variant_type_is_insertion = var_cruda_actual is not None and var_cruda_actual.get('type') == 'insertion'
+    reglas_mitomaster = obtener_reglas_mitomaster()
+
+    # --- CASOS ESPECIALES DE HOTSPOTS sobre la variante cruda (tabla constants.MITOMASTER_RULES) ---
+    # Tienen prioridad sobre el HGVS normalizado: C309CCC, C16193CC, CT309-, G316C,
+    # CCCCCTCTA8281- y los anclajes Mitomaster de inserciones (16193, 198, 290).
+    if var_cruda_actual is not None:
+        formato_regla = reglas_mitomaster.formato_variante_cruda(var_cruda_actual, ref_sequence_str_original)
+        if formato_regla is not None:
+            return formato_regla
+
+    # Si no fue un caso especial Mitomaster, intenta el procesamiento HGVS normalizado
     try:
-        seq_dict = {ref_accession: ref_sequence_str}
-        hdp_local = LocalSeqProvider(seq_dict)
-        hp = hgvs.parser.Parser()
-        hn = hgvs.normalizer.Normalizer(hdp_local, shuffle_direction=3, cross_boundaries=True)
-        normalized_hgvs_strings = []
-        print(f"Procesando {len(variantes_crudas)} variantes crudas con HGVS...")
-        for i, var_dict in enumerate(variantes_crudas):
-            hgvs_string_base = f"{ref_accession}:m."
-            hgvs_string_var_part = ""
-            try:
-                pos_input_cruda = var_dict['pos']; ref_allele = var_dict['ref'].upper()
-                alt_allele = var_dict['alt'].upper(); var_type = var_dict['type']
-            except KeyError as ke: normalized_hgvs_strings.append(f"ERROR_DATO_FALTANTE_EN_VAR_CRUDA ({ke}): {var_dict}"); continue
-            except Exception as e: normalized_hgvs_strings.append(f"ERROR_INESPERADO_EN_VAR_CRUDA ({type(e).__name__}): {var_dict}"); continue
-            if var_type in ["transition","transversion","substitution","substitution (con N)"]:
-                pos_1based_sub = int(pos_input_cruda)
-                if pos_1based_sub <= 0: normalized_hgvs_strings.append(f"ERROR_POS_SUB_INVALIDA ({pos_1based_sub}): {var_dict}"); continue
-                hgvs_string_var_part = f"{pos_1based_sub}{ref_allele}>{alt_allele}"
-            elif var_type == 'deletion':
-                pos_1based_del_start = int(pos_input_cruda)
-                if pos_1based_del_start <= 0: normalized_hgvs_strings.append(f"ERROR_POS_DEL_INVALIDA ({pos_1based_del_start}): {var_dict}"); continue
-                len_del = len(ref_allele)
-                if len_del == 0: normalized_hgvs_strings.append(f"ERROR_DEL_SIN_REF: {var_dict}"); continue
-                if len_del > 1: end_pos_del = pos_1based_del_start + len_del - 1; hgvs_string_var_part = f"{pos_1based_del_start}_{end_pos_del}del"
-                else: hgvs_string_var_part = f"{pos_1based_del_start}del" 
-            elif var_type == 'insertion':
-                pos_0based_anterior_ins = int(pos_input_cruda) 
-                if pos_0based_anterior_ins < 0: hgvs_pos_anterior_1based = 0; hgvs_pos_siguiente_1based = 1
-                else: hgvs_pos_anterior_1based = pos_0based_anterior_ins + 1; hgvs_pos_siguiente_1based = hgvs_pos_anterior_1based + 1
-                hgvs_string_var_part = f"{hgvs_pos_anterior_1based}_{hgvs_pos_siguiente_1based}ins{alt_allele}"
-            if not hgvs_string_var_part: normalized_hgvs_strings.append(f"UNPROCESSED_FORMAT_HGVS ({var_type}): {var_dict}"); continue
-            hgvs_full_string_to_parse = hgvs_string_base + hgvs_string_var_part
-            try:
-                parsed_variant = hp.parse_hgvs_variant(hgvs_full_string_to_parse)
-                normalized_variant = hn.normalize(parsed_variant)
-                normalized_hgvs_strings.append(str(normalized_variant))
-            except Exception as e_norm: 
-                if var_type == 'deletion' and 'pos_1based_del_start' in locals() and len(ref_allele) == 1 and pos_1based_del_start > 0:
-                    hgvs_string_var_part_alt_del = f"{pos_1based_del_start}del{ref_allele}" # Intenta formato m.XdelN
-                    hgvs_full_string_alt_del = hgvs_string_base + hgvs_string_var_part_alt_del
-                    try:
-                        parsed_variant_alt = hp.parse_hgvs_variant(hgvs_full_string_alt_del)
-                        normalized_variant_alt = hn.normalize(parsed_variant_alt)
-                        normalized_hgvs_strings.append(str(normalized_variant_alt) + " (ReintentoDel)")
-                    except Exception as e_retry: normalized_hgvs_strings.append(f"{hgvs_full_string_to_parse} (Error HGVS: {type(e_norm).__name__}), ReintentoDel {hgvs_full_string_alt_del} (FALLIDO: {type(e_retry).__name__})")
-                else: normalized_hgvs_strings.append(f"{hgvs_full_string_to_parse} (ERROR HGVS General: {type(e_norm).__name__} - {e_norm})")
-        print(f"Procesamiento HGVS completado. {len(normalized_hgvs_strings)} variantes procesadas.")
-        return normalized_hgvs_strings
-    except Exception as e_setup:
-        print(f"Error general en la configuración o proceso de normalización HGVS: {e_setup}"); import traceback; traceback.print_exc()
-        return [f"ERROR_HGVS_SETUP ({type(e_setup).__name__}): {v}" for v in variantes_crudas]
+        if edicion_hgvs is None:
+            edicion_hgvs = EdicionHGVS.desde_variante_hgvs(obtener_parser_hgvs().parse_hgvs_variant(resultado_hgvs.texto))
+        edit_type = edicion_hgvs.tipo
+        formato_regla = reglas_mitomaster.formato_edicion(edicion_hgvs, ref_sequence_str_original) # CA522d, poli-C 303-309...
+
+        if formato_regla is not None:
+            formato_final_mitomaster = formato_regla
+
+        elif edit_type == 'sub':
+            pos_1based = edicion_hgvs.inicio
+            ref_hgvs = edicion_hgvs.ref
+            alt_hgvs = edicion_hgvs.alt
+            formato_final_mitomaster = f"{ref_hgvs.upper()}{pos_1based}{alt_hgvs.upper()}"
+
+        elif edit_type == 'ins' or (edit_type == 'dup' and original_variant_type_is_insertion):
+            # Las inserciones con anclaje Mitomaster propio ya las resolvió la tabla de reglas
+            formato_final_mitomaster = variant_part_hgvs
+
+        elif edit_type == 'del':
+            start_pos_hgvs = edicion_hgvs.inicio
+            end_pos_hgvs = edicion_hgvs.fin
+            # Formato general de deleción en Mitomaster: SecuenciaDeletada[PosAncla]d
+            if 1 <= start_pos_hgvs -1 < end_pos_hgvs <= len(ref_sequence_str_original):
+                deleted_sequence = ref_sequence_str_original[start_pos_hgvs - 1 : end_pos_hgvs].upper()
+                position_for_mitomaster_format = start_pos_hgvs
+                if len(deleted_sequence) > 1: # Si es deleción de multiples bases, se ancla a la primera base del bloque
+                    position_for_mitomaster_format = start_pos_hgvs -1
+                    if position_for_mitomaster_format < 1: position_for_mitomaster_format = start_pos_hgvs # si es del inicio
+
+                formato_final_mitomaster = f"{deleted_sequence}{position_for_mitomaster_format}d"
+            else:
+                formato_final_mitomaster = f"{start_pos_hgvs}_{end_pos_hgvs}d (ErrPosDel)"
+
+        elif edit_type == 'dup': 
+            start_pos_1based = edicion_hgvs.inicio
+            end_pos_1based = edicion_hgvs.fin
+            if 0 < start_pos_1based <= len(ref_sequence_str_original) and \
+               0 < end_pos_1based <= len(ref_sequence_str_original) and \
+               start_pos_1based <= end_pos_1based :
+                original_segment_dup = ref_sequence_str_original[start_pos_1based - 1 : end_pos_1based].upper()
+                formato_final_mitomaster = f"{original_segment_dup}{start_pos_1based}{original_segment_dup}{original_segment_dup}"
+            else:
+                formato_final_mitomaster = variant_part_hgvs
+
+    except Exception as e_parse_hgvs:
+        formato_final_mitomaster = f"{variant_part_hgvs} (EXCEP: {e_parse_hgvs})"
+
+    return formato_final_mitomaster
+
+def generar_formato_mitomaster(resultados_hgvs, ref_acc_id: str, ref_sequence_str_original: str):
+    """Etapa en flujo: consume ResultadoHGVS y produce (resultado, formato_mitomaster)."""
+    for resultado_hgvs in resultados_hgvs:
+        yield resultado_hgvs, _formatear_variante_mitomaster(resultado_hgvs, ref_acc_id, ref_sequence_str_original)
 
 def formatear_estilo_mitomaster(
-    hgvs_norm_strings: list, 
+    resultados_hgvs: list, 
     ref_acc_id: str, 
     ref_sequence_str_original: str, 
-    variantes_crudas_originales: list 
+    variantes_crudas_originales: list | None = None
 ) -> list:
+    """
+    Formato Mitomaster de una lista de ResultadoHGVS. También acepta cadenas HGVS, que se
+    emparejan con la variante cruda del mismo índice (None si falta).
+    """
     print("\n--- Iniciando Paso 5b: Formateo estilo Mitomaster ---")
     mitomaster_formateadas = []
-    if not hgvs_norm_strings: return mitomaster_formateadas
-
-    hp_temp_parser = hgvs.parser.Parser()
-
-    for idx_hgvs, hgvs_norm_string in enumerate(hgvs_norm_strings):
-        prefix_to_remove = ref_acc_id + ":m."
-        variant_part_hgvs = hgvs_norm_string[len(prefix_to_remove):] if hgvs_norm_string.startswith(prefix_to_remove) else hgvs_norm_string
-        formato_final_mitomaster = variant_part_hgvs 
-
-        if any(err_tag in hgvs_norm_string for err_tag in ["ERROR", "UNPROCESSED", "FALLIDO", "FORMATO_"]):
-            mitomaster_formateadas.append(hgvs_norm_string)
-            continue
-        
-        var_cruda_actual = None
-        original_variant_type_is_insertion = False
-        original_inserted_sequence = ""
-        original_pos_cruda_0based_ins = -1
-        
-        # Obtener la variante cruda original asociada al HGVS normalizado
-        if idx_hgvs < len(variantes_crudas_originales):
-             var_cruda_actual = variantes_crudas_originales[idx_hgvs]
-             # Determinar el tipo de variante original (sustitución, deleción, inserción)
-             # y la secuencia insertada/deletada para los casos especiales.
-             original_variant_type = var_cruda_actual.get('type')
-             original_ref_seq_cruda = var_cruda_actual.get('ref', '').upper()
-             original_alt_seq_cruda = var_cruda_actual.get('alt', '').upper()
-             original_pos_cruda_1based = var_cruda_actual.get('pos') # Asumimos 1-based para Mitomaster
-
-             if original_variant_type == 'insertion':
-                 original_variant_type_is_insertion = True
-                 original_inserted_sequence = original_alt_seq_cruda
-                 original_pos_cruda_0based_ins = var_cruda_actual.get('pos', -1) # Esta es la pos 0-based ANTES de la inserción
-
-        # --- CASOS ESPECIALES DE HOTSPOTS (prioridad sobre HGVS normalizado si es necesario) ---
-        # Estos son los que ya tenías para Mitomaster. Se mantienen si son válidos.
-        if original_variant_type_is_insertion and var_cruda_actual:
-            # Caso 309CCC (C309CCC)
-            if original_pos_cruda_0based_ins == 301 and original_inserted_sequence == "CC":
-                if 0 <= 308 < len(ref_sequence_str_original) and ref_sequence_str_original[308] == 'C': # C en pos 309
-                    formato_final_mitomaster = "C309CCC" 
-                    mitomaster_formateadas.append(formato_final_mitomaster)
-                    continue 
-            # Caso 16193CC (C16193CC)
-            elif original_pos_cruda_0based_ins == 16182 and original_inserted_sequence == "C":
-                 if 0 <= 16192 < len(ref_sequence_str_original) and ref_sequence_str_original[16192] == 'C': # C en pos 16193
-                    formato_final_mitomaster = "C16193CC" 
-                    mitomaster_formateadas.append(formato_final_mitomaster)
-                    continue
-        
-        # --- NUEVOS CASOS ESPECIALES DE MITOMASTER (Basados en discrepancias) ---
-        # Prueba 1: Deleciones HVII (310d, 316d) -> CT309-, G316C
-        if original_variant_type == 'deletion':
-            # Si es deleción en 310 (rCRS T), y Mitomaster lo ve como CT309-
-            if original_pos_cruda_1based == 310 and original_ref_seq_cruda == 'T':
-                # Esto es una asunción, ya que el alineador de Mitomaster reinterpreta
-                # una deleción simple a una deleción de bloque CT.
-                formato_final_mitomaster = "CT309-"
-                mitomaster_formateadas.append(formato_final_mitomaster)
-                continue
-            # Si es deleción en 316 (rCRS G), y Mitomaster lo ve como G316C (¡sustitución!)
-            elif original_pos_cruda_1based == 316 and original_ref_seq_cruda == 'G':
-                # Esto es una reinterpretación de deleción a sustitución.
-                # Asegúrate de que tu `Prueba_1.fas` para este caso realmente tiene una deleción en 316.
-                formato_final_mitomaster = "G316C"
-                mitomaster_formateadas.append(formato_final_mitomaster)
-                continue
-            # Prueba 6: Deleción en 8270-8292: De TACCCCCT8278d, T8288d a T8279C, CCCCCTCTA8281-
-            # Esto es un problema de detección profunda del alineador. Mitomaster lo ve como una sustitución y una deleción de bloque.
-            # No podemos cambiar la detección de tu alineador, pero podemos forzar el formato si la variante detectada por tu alineador
-            # es una deleción de 8 bases en 8270.
-            elif original_pos_cruda_1based == 8270 and original_ref_seq_cruda == 'CACCCCCT' and original_variant_type == 'deletion':
-                # Esto es una simulación del output de Mitomaster para esta deleción compleja.
-                # Asumimos que si detectamos una deleción de 8 bases en 8270, Mitomaster la representa de esta forma.
-                # También, si la rCRS tiene C en 8279 y la query T, y esa es la primera variante.
-                # Si tu query tiene T en 8279 y rCRS C, y luego las deleciones en 8281-8289
-                # (lo que EMPOP/Mitomaster espera), tu alineador debería detectar 8279C y luego las deleciones.
-                # Si tu alineador detecta una deleción en 8270-8277, forzamos este formato.
-                # Esto es una aproximación, ya que la detección es el problema raíz.
-                formato_final_mitomaster = "CCCCCTCTA8281-" # Formato de Mitomaster para la deleción en bloque
-                mitomaster_formateadas.append(formato_final_mitomaster)
-                # Si también hay un 8279C (sustitución), lo añadiríamos aquí.
-                # Se necesita verificar la secuencia de Prueba_6.fas para el 8279C.
-                continue
-
-        # Si no fue un caso especial Mitomaster, intenta el procesamiento HGVS normalizado
-        try:
-            parsed_hgvs_variant = hp_temp_parser.parse_hgvs_variant(hgvs_norm_string)
-            edit_type = parsed_hgvs_variant.posedit.edit.type
-            
-            if edit_type == 'sub':
-                pos_1based = parsed_hgvs_variant.posedit.pos.start.base
-                ref_hgvs = parsed_hgvs_variant.posedit.edit.ref if parsed_hgvs_variant.posedit.edit.ref is not None else ""
-                alt_hgvs = parsed_hgvs_variant.posedit.edit.alt if parsed_hgvs_variant.posedit.edit.alt is not None else ""
-                formato_final_mitomaster = f"{ref_hgvs.upper()}{pos_1based}{alt_hgvs.upper()}"
-            
-            elif edit_type == 'ins' or (edit_type == 'dup' and original_variant_type_is_insertion):
-                anchor_pos_1based_fmt = -1
-                base_ref_at_anchor = ""
-                effective_inserted_sequence = ""
-
-                # Obtener la posición de anclaje y la secuencia insertada de la variante cruda original
-                # Es crucial para Mitomaster, ya que no siempre usa la normalización HGVS o EMPOP.
-                pos_cruda_0based = original_pos_cruda_0based_ins # Posición 0-based ANTES de la inserción
-                inserted_seq = original_inserted_sequence
-                
-                # --- Anclaje Mitomaster para inserciones HVI (1618x -> 16193) ---
-                if constants.HVI_C_STRETCH_START <= (pos_cruda_0based + 1) <= constants.HVI_C_STRETCH_END:
-                    formato_final_mitomaster = f"C{constants.MITOMASTER_HVI_INS_ANCHOR_16193}{'C' * len(inserted_seq)}"
-                    mitomaster_formateadas.append(formato_final_mitomaster)
-                    continue
-
-                # --- Anclaje Mitomaster para inserciones 198/199 (ancla a 198) ---
-                # Tu código detecta 198_199(ins), que es pos_cruda=198 (0-based)
-                if pos_cruda_0based + 1 == constants.MITOMASTER_INS_198_ANCHOR: # Si es la inserción en 198
-                    # Para Mitomaster, el formato es C198CTG (si C es la base de referencia en 198)
-                    ref_base_at_anchor = ref_sequence_str_original[constants.MITOMASTER_INS_198_ANCHOR - 1]
-                    formato_final_mitomaster = f"{ref_base_at_anchor.upper()}{constants.MITOMASTER_INS_198_ANCHOR}{inserted_seq.upper()}"
-                    mitomaster_formateadas.append(formato_final_mitomaster)
-                    continue
-                
-                # --- Anclaje Mitomaster para inserciones 291.x (ancla a 290) ---
-                # Tu código detecta 290_291(ins), que es pos_cruda=290 (0-based)
-                if pos_cruda_0based + 1 == constants.MITOMASTER_INS_291_ANCHOR: # Si es la inserción en 290
-                    ref_base_at_anchor = ref_sequence_str_original[constants.MITOMASTER_INS_291_ANCHOR - 1]
-                    formato_final_mitomaster = f"{ref_base_at_anchor.upper()}{constants.MITOMASTER_INS_291_ANCHOR}{inserted_seq.upper()}"
-                    mitomaster_formateadas.append(formato_final_mitomaster)
-                    continue
-
-
-                # Lógica general para inserciones (si no es un caso especial Mitomaster)
-                if 0 < anchor_pos_1based_fmt <= len(ref_sequence_str_original):
-                    base_ref_at_anchor = ref_sequence_str_original[anchor_pos_1based_fmt - 1]
-                    formato_final_mitomaster = f"{base_ref_at_anchor.upper()}{anchor_pos_1based_fmt}{base_ref_at_anchor.upper()}{effective_inserted_sequence.upper()}"
-                elif anchor_pos_1based_fmt == 0 and parsed_hgvs_variant.posedit.pos.end.base == 1:
-                     formato_final_mitomaster = f"0.1{effective_inserted_sequence.upper()}"
-                else: 
-                    formato_final_mitomaster = variant_part_hgvs
-            
-            elif edit_type == 'del':
-                start_pos_hgvs = parsed_hgvs_variant.posedit.pos.start.base
-                end_pos_hgvs = parsed_hgvs_variant.posedit.pos.end.base
-                
-                # Definiciones para casos especiales de deleción (Mitomaster)
-                MITO_CA522D_DEL_START_HGVS, MITO_CA522D_DEL_END_HGVS = 523, 524
-                HVII_POLY_C_DEL_START, HVII_POLY_C_DEL_END = 303, 309 # rCRS: CCCCCCC de 303 a 309
-
-                is_ca522d_target_deletion = (start_pos_hgvs == MITO_CA522D_DEL_START_HGVS and end_pos_hgvs == MITO_CA522D_DEL_END_HGVS)
-                is_hvii_poly_c_full_deletion = (start_pos_hgvs == HVII_POLY_C_DEL_START and end_pos_hgvs == HVII_POLY_C_DEL_END)
-
-                if is_ca522d_target_deletion:
-                    expected_deleted_sequence_rcrs = "CA" 
-                    actual_deleted_sequence_from_ref = ""
-                    if 1 <= start_pos_hgvs -1 < end_pos_hgvs <= len(ref_sequence_str_original) :
-                        actual_deleted_sequence_from_ref = ref_sequence_str_original[start_pos_hgvs - 1 : end_pos_hgvs].upper()
-                    
-                    anchor_pos_mitomaster_522d = start_pos_hgvs - 1 # 522
-                    if actual_deleted_sequence_from_ref == expected_deleted_sequence_rcrs and anchor_pos_mitomaster_522d == 522:
-                        formato_final_mitomaster = "CA522d"
-                    else: 
-                        if actual_deleted_sequence_from_ref:
-                             formato_final_mitomaster = f"{actual_deleted_sequence_from_ref}{anchor_pos_mitomaster_522d}d"
-                        else:
-                             formato_final_mitomaster = f"{start_pos_hgvs}_{end_pos_hgvs}del (ErrCA522d)"
-
-                elif is_hvii_poly_c_full_deletion:
-                    if 1 <= start_pos_hgvs -1 < end_pos_hgvs <= len(ref_sequence_str_original) :
-                        deleted_sequence = ref_sequence_str_original[start_pos_hgvs - 1 : end_pos_hgvs].upper()
-                        formato_final_mitomaster = f"{deleted_sequence}{start_pos_hgvs}-"
-                    else:
-                        formato_final_mitomaster = f"{start_pos_hgvs}_{end_pos_hgvs}del (ErrHVII)"
-                
-                else: # Caso general para otras deleciones (formato Mitomaster para una o multiples)
-                    if 1 <= start_pos_hgvs -1 < end_pos_hgvs <= len(ref_sequence_str_original):
-                        deleted_sequence = ref_sequence_str_original[start_pos_hgvs - 1 : end_pos_hgvs].upper()
-                        
-                        # Manejo especial para Mitomaster de G316d a G316C (si es una deleción de G en 316)
-                        if start_pos_hgvs == 316 and deleted_sequence == 'G':
-                            formato_final_mitomaster = "G316C" # Reinterpretación de deleción a sustitución
-                        # Manejo especial para Mitomaster de T310d a CT309- (si es una deleción de T en 310)
-                        elif start_pos_hgvs == 310 and deleted_sequence == 'T':
-                            formato_final_mitomaster = "CT309-" # Reinterpretación de deleción de T310 como deleción de bloque
-                        # Manejo especial para Mitomaster de deleción en 8270-8292
-                        elif start_pos_hgvs == 8270 and deleted_sequence == 'CACCCCCT': # Si es la deleción de 8 bases en 8270
-                            formato_final_mitomaster = "CCCCCTCTA8281-" # Formato de Mitomaster para la deleción en bloque
-                        else:
-                            # Formato general de deleción en Mitomaster: SecuenciaDeletada[PosAncla]d
-                            position_for_mitomaster_format = start_pos_hgvs
-                            if len(deleted_sequence) > 1: # Si es deleción de multiples bases, se ancla a la primera base del bloque
-                                position_for_mitomaster_format = start_pos_hgvs -1
-                                if position_for_mitomaster_format < 1: position_for_mitomaster_format = start_pos_hgvs # si es del inicio
-                                
-                            formato_final_mitomaster = f"{deleted_sequence}{position_for_mitomaster_format}d"
-                    else:
-                        formato_final_mitomaster = f"{start_pos_hgvs}_{end_pos_hgvs}d (ErrPosDel)"
-
-            elif parsed_hgvs_variant.posedit.edit.type == 'dup': 
-                start_pos_1based = parsed_hgvs_variant.posedit.pos.start.base
-                end_pos_1based = parsed_hgvs_variant.posedit.pos.end.base
-                if 0 < start_pos_1based <= len(ref_sequence_str_original) and \
-                   0 < end_pos_1based <= len(ref_sequence_str_original) and \
-                   start_pos_1based <= end_pos_1based :
-                    original_segment_dup = ref_sequence_str_original[start_pos_1based - 1 : end_pos_1based].upper()
-                    formato_final_mitomaster = f"{original_segment_dup}{start_pos_1based}{original_segment_dup}{original_segment_dup}"
-                else:
-                    formato_final_mitomaster = variant_part_hgvs
-            
-        except Exception as e_parse_hgvs:
-            formato_final_mitomaster = f"{variant_part_hgvs} (EXCEP: {e_parse_hgvs})"
+    if not resultados_hgvs: return mitomaster_formateadas
 
-        mitomaster_formateadas.append(formato_final_mitomaster)
+    variantes_crudas_originales = variantes_crudas_originales or []
+    resultados = [
+        r if isinstance(r, ResultadoHGVS) else
+        ResultadoHGVS.desde_cadena(variantes_crudas_originales[i] if i < len(variantes_crudas_originales) else None, r, ref_acc_id)
+        for i, r in enumerate(resultados_hgvs)
+    ]
+    mitomaster_formateadas = [mito for _, mito in generar_formato_mitomaster(resultados, ref_acc_id, ref_sequence_str_original)]
         
     print(f"\nFormateo Mitomaster completado. {len(mitomaster_formateadas)} variantes formateadas.")
     return mitomaster_formateadas
@@ -346,18 +336,17 @@ def _process_complex_insertion_291(var_cruda: dict) -> list:
     return formatted_parts
 
 def formatear_variantes_empop(variantes_crudas_con_locus: list, rcrs_seq_str: str) -> tuple[str, int, list]:
+    """Cadena EMPOP de las variantes; acepta variantes crudas o los ResultadoHGVS enlazados a ellas."""
+    variantes_crudas_con_locus = [v.variante if isinstance(v, ResultadoHGVS) else v for v in variantes_crudas_con_locus]
     print(f"\\n--- Iniciando Formateo EMPOP para {len(variantes_crudas_con_locus)} variantes ---")
     if not variantes_crudas_con_locus: return "", 0, [] # Asegurar que este return también tenga 3 valores
 
     empop_variantes_list = []
     
-    # 1. Filtrar variantes en la posición 3107 (blacklist)
-    filtered_raw_variants = [
-        v for v in variantes_crudas_con_locus
-        if v.get('pos') != constants.POS_3107_BLACKLISTED
-    ]
-    if len(filtered_raw_variants) < len(variantes_crudas_con_locus):
-        print(f"  Filtradas {len(variantes_crudas_con_locus) - len(filtered_raw_variants)} variantes en la posición {POS_3107_BLACKLISTED}.")
+    # 1. Filtrar artefactos y posiciones en blacklist (p. ej. 3107)
+    filtered_raw_variants, artefactos_empop = obtener_filtro_artefactos().filtrar(variantes_crudas_con_locus)
+    if artefactos_empop:
+        print(f"  Filtradas {len(artefactos_empop)} variantes por reglas de artefactos/blacklist (ej. posición {constants.POS_3107_BLACKLISTED}).")
     
     # Flag para controlar si ya se procesó el bloque 513-524 de deleciones
     # Esto evita duplicados si múltiples deleciones crudas caen en el rango AC Motif.
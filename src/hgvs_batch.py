@@ -0,0 +1,108 @@
+# ==============================================================================
+# BLOQUE 5c: NORMALIZACIÓN HGVS POR LOTES DE MUESTRAS EN UN POOL DE PROCESOS
+# ==============================================================================
+# Descripción: Normaliza de una vez las variantes de todas las muestras de un
+# lote. Las variantes se deduplican por (pos, ref, alt, tipo) entre muestras,
+# las ya presentes en la caché de normalización se resuelven en el proceso
+# principal y el resto del conjunto único se reparte en fragmentos entre un
+# pool de procesos; cada worker precalienta al arrancar su propio parser y
+# normalizador. Los resultados se reparten de vuelta a cada muestra en el
+# orden original de sus variantes (el que espera `formatear_estilo_mitomaster`).
+# ------------------------------------------------------------------------------
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from . import constants
+from .hgvs_native import EstadoHGVS, ResultadoHGVS
+from .hgvs_cache import clave_variante, obtener_cache_hgvs, calcular_version_normalizacion
+from .hgvs_and_nomenclature import generar_hgvs_normalizado, precalentar_hgvs
+
+_CONTEXTO_WORKER = {}
+
+
+def _inicializar_worker(ref_accession: str, ref_sequence_str: str, motor: str) -> None:
+    """Initializer del pool: referencia del worker y parser/normalizador construidos una vez."""
+    _CONTEXTO_WORKER.update(ref_accession=ref_accession, ref_sequence_str=ref_sequence_str, motor=motor)
+    precalentar_hgvs(ref_accession, ref_sequence_str, usar_cache=False)
+
+def _normalizar_fragmento(variantes: list) -> list:
+    """Tarea del worker: (estado, texto, edición) de cada variante del fragmento, en orden."""
+    return [
+        (resultado.estado, resultado.texto, resultado.edicion)
+        for resultado in generar_hgvs_normalizado(
+            variantes, _CONTEXTO_WORKER["ref_accession"], _CONTEXTO_WORKER["ref_sequence_str"],
+            motor=_CONTEXTO_WORKER["motor"], usar_cache=False
+        )
+    ]
+
+def normalizar_lote_hgvs(
+    muestras: list,
+    ref_accession: str,
+    ref_sequence_str: str,
+    n_procesos: int | None = constants.HGVS_POOL_PROCESSES,
+    motor: str = constants.HGVS_NORMALIZER_BACKEND,
+    usar_cache: bool = constants.HGVS_CACHE_ENABLED,
+    tamano_fragmento: int = constants.HGVS_POOL_SHARD_SIZE
+) -> list:
+    """
+    `muestras` es una lista de listas de variantes crudas (una por muestra). Devuelve, para
+    cada muestra, la lista de sus ResultadoHGVS en el mismo orden, enlazados a sus variantes.
+    Con pocas variantes únicas por resolver (o `n_procesos` <= 1) no se crea el pool.
+    """
+    # 1. Conjunto único del lote
+    unicas, indice_unica = [], {}
+    for variantes in muestras:
+        for var_dict in variantes:
+            clave = clave_variante(var_dict)
+            if clave is not None and clave not in indice_unica:
+                indice_unica[clave] = len(unicas)
+                unicas.append({"pos": clave[0], "ref": clave[1], "alt": clave[2], "type": clave[3]})
+
+    # 2. Caché de normalización en el proceso principal
+    plantillas = [None] * len(unicas)
+    cache = obtener_cache_hgvs() if usar_cache else None
+    version_cache = calcular_version_normalizacion(ref_sequence_str, motor) if cache is not None else None
+    if cache is not None:
+        for i, var_dict in enumerate(unicas):
+            resultado = cache.obtener(cache.clave(version_cache, ref_accession, var_dict), None)
+            if resultado is not None:
+                plantillas[i] = (resultado.estado, resultado.texto, resultado.edicion)
+    pendientes = [i for i, plantilla in enumerate(plantillas) if plantilla is None]
+
+    # 3. Variantes únicas sin resolver: en fragmentos por el pool, o en este proceso
+    n_procesos = n_procesos or os.cpu_count() or 1
+    variantes_pendientes = [unicas[i] for i in pendientes]
+    if n_procesos > 1 and len(variantes_pendientes) >= constants.HGVS_POOL_MIN_VARIANTS:
+        fragmentos = [variantes_pendientes[i:i + tamano_fragmento] for i in range(0, len(variantes_pendientes), tamano_fragmento)]
+        print(f"Normalizando {len(variantes_pendientes)} variantes únicas en {len(fragmentos)} fragmentos con {n_procesos} procesos...")
+        with ProcessPoolExecutor(
+            max_workers=min(n_procesos, len(fragmentos)),
+            initializer=_inicializar_worker, initargs=(ref_accession, ref_sequence_str, motor)
+        ) as pool:
+            resueltas = [plantilla for fragmento in pool.map(_normalizar_fragmento, fragmentos) for plantilla in fragmento]
+    else:
+        resueltas = [
+            (resultado.estado, resultado.texto, resultado.edicion)
+            for resultado in generar_hgvs_normalizado(variantes_pendientes, ref_accession, ref_sequence_str, motor=motor, usar_cache=False)
+        ]
+    for i, plantilla in zip(pendientes, resueltas):
+        plantillas[i] = plantilla
+        if cache is not None and plantilla[0] is not EstadoHGVS.ERROR:
+            cache.guardar(cache.clave(version_cache, ref_accession, unicas[i]), ResultadoHGVS(None, *plantilla))
+    if cache is not None:
+        cache.volcar()
+        print(f"Lote HGVS: {sum(len(v) for v in muestras)} variantes, {len(unicas)} únicas, {len(pendientes)} normalizadas (resto de la caché).")
+
+    # 4. Reparto a cada muestra en su orden original
+    resultados_por_muestra = []
+    for variantes in muestras:
+        resultados = []
+        for var_dict in variantes:
+            clave = clave_variante(var_dict)
+            plantilla = plantillas[indice_unica[clave]] if clave is not None else None
+            if plantilla is not None and plantilla[0] is not EstadoHGVS.ERROR:
+                resultados.append(ResultadoHGVS(var_dict, *plantilla))
+            else: # Sin clave o con error: se resuelve aquí para que el mensaje cite la variante de la muestra
+                resultados.extend(generar_hgvs_normalizado([var_dict], ref_accession, ref_sequence_str, motor=motor, usar_cache=False))
+        resultados_por_muestra.append(resultados)
+    return resultados_por_muestra
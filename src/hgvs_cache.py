@@ -0,0 +1,124 @@
+# ==============================================================================
+# BLOQUE 5b: CACHÉ DE NORMALIZACIÓN HGVS ENTRE MUESTRAS
+# ==============================================================================
+# Descripción: En una cohorte las mismas variantes (73G, 263G, 315.1C, 16519C...)
+# aparecen en casi todas las muestras. El resultado de normalizar cada
+# variante cruda (estado, cadena HGVS y edición estructurada) se memoiza con
+# clave (accesión, pos, ref, alt, tipo) en dos niveles: un LRU en memoria del proceso y, opcionalmente, una base SQLite en
+# disco compartida entre workers. La clave incluye una huella de versión
+# (versión de la caché, de la librería hgvs, motor de normalización y
+# SHA-256 de la secuencia de referencia): si cambia algo de ello, las
+# entradas antiguas simplemente dejan de coincidir.
+# ------------------------------------------------------------------------------
+
+import hashlib
+import os
+import sqlite3
+from collections import OrderedDict
+from functools import lru_cache
+import hgvs
+from . import constants
+from .hgvs_native import EstadoHGVS, ResultadoHGVS, interpretar_hgvs_mt
+
+
+def calcular_version_normalizacion(ref_sequence_str: str, motor: str) -> str:
+    """Huella de todo lo que determina el resultado de normalizar una variante cruda."""
+    h = hashlib.sha256()
+    h.update(f"{constants.HGVS_CACHE_VERSION}|{hgvs.__version__}|{motor}|".encode("utf-8"))
+    h.update(ref_sequence_str.upper().encode("ascii"))
+    return h.hexdigest()[:16]
+
+
+def clave_variante(var_dict) -> tuple | None:
+    """(pos, ref, alt, tipo) que determina la normalización de una variante cruda; None si le faltan campos."""
+    try:
+        return (int(var_dict['pos']), var_dict['ref'].upper(), var_dict['alt'].upper(), var_dict['type'])
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return None
+
+
+class CacheNormalizacionHGVS:
+    """LRU en memoria con un nivel persistente SQLite opcional (`ruta_persistente`)."""
+
+    def __init__(self, max_entradas: int = constants.HGVS_CACHE_MAX_ENTRIES, ruta_persistente: str | None = constants.HGVS_CACHE_DB_PATH):
+        self.max_entradas = max_entradas
+        self._memoria = OrderedDict()
+        self._pendientes = []
+        self.aciertos = 0
+        self.fallos = 0
+        self._conexion = None
+        if ruta_persistente:
+            try:
+                os.makedirs(os.path.dirname(ruta_persistente) or ".", exist_ok=True)
+                self._conexion = sqlite3.connect(ruta_persistente, timeout=30, check_same_thread=False)
+                self._conexion.execute("PRAGMA journal_mode=WAL") # Lectores y un escritor concurrentes entre workers
+                self._conexion.execute(
+                    "CREATE TABLE IF NOT EXISTS resultados_hgvs ("
+                    "version TEXT, accesion TEXT, pos INTEGER, ref TEXT, alt TEXT, tipo TEXT, estado TEXT, texto TEXT, "
+                    "PRIMARY KEY (version, accesion, pos, ref, alt, tipo))"
+                )
+                self._conexion.commit()
+            except sqlite3.Error as e:
+                print(f"Advertencia: Caché HGVS persistente no disponible ('{ruta_persistente}'): {e}")
+                self._conexion = None
+
+    @staticmethod
+    def clave(version: str, ref_accession: str, var_dict) -> tuple | None:
+        """(versión, accesión, pos, ref, alt, tipo) de una variante cruda; None si le faltan campos."""
+        clave = clave_variante(var_dict)
+        return (version, ref_accession) + clave if clave is not None else None
+
+    def obtener(self, clave: tuple, var_dict) -> ResultadoHGVS | None:
+        """Resultado memoizado, enlazado a `var_dict` (la variante cruda de esta muestra), o None."""
+        entrada = self._memoria.get(clave)
+        if entrada is None and self._conexion is not None:
+            try:
+                fila = self._conexion.execute(
+                    "SELECT estado, texto FROM resultados_hgvs WHERE version=? AND accesion=? AND pos=? AND ref=? AND alt=? AND tipo=?", clave
+                ).fetchone()
+            except sqlite3.Error:
+                fila = None
+            if fila is not None:
+                estado = EstadoHGVS(fila[0])
+                entrada = (estado, fila[1], None if estado is EstadoHGVS.ERROR else interpretar_hgvs_mt(fila[1], clave[1]))
+                self._guardar_en_memoria(clave, entrada)
+        if entrada is None:
+            self.fallos += 1
+            return None
+        self._memoria.move_to_end(clave)
+        self.aciertos += 1
+        return ResultadoHGVS(var_dict, *entrada)
+
+    def guardar(self, clave: tuple, resultado: ResultadoHGVS) -> None:
+        self._guardar_en_memoria(clave, (resultado.estado, resultado.texto, resultado.edicion))
+        if self._conexion is not None:
+            self._pendientes.append(clave + (resultado.estado.value, resultado.texto))
+            if len(self._pendientes) >= constants.HGVS_CACHE_WRITE_BATCH:
+                self.volcar()
+
+    def _guardar_en_memoria(self, clave: tuple, entrada: tuple) -> None:
+        self._memoria[clave] = entrada
+        self._memoria.move_to_end(clave)
+        while len(self._memoria) > self.max_entradas:
+            self._memoria.popitem(last=False)
+
+    def volcar(self) -> None:
+        """Escribe en SQLite, en una sola transacción, las entradas nuevas acumuladas."""
+        if self._conexion is None or not self._pendientes:
+            return
+        try:
+            with self._conexion:
+                self._conexion.executemany("INSERT OR IGNORE INTO resultados_hgvs VALUES (?, ?, ?, ?, ?, ?, ?, ?)", self._pendientes)
+        except sqlite3.Error as e:
+            print(f"Advertencia: No se pudo escribir en la caché HGVS persistente: {e}")
+        self._pendientes.clear()
+
+    def tasa_aciertos(self) -> float:
+        total = self.aciertos + self.fallos
+        return self.aciertos / total if total else 0.0
+
+
+@lru_cache(maxsize=None)
+def obtener_cache_hgvs() -> CacheNormalizacionHGVS:
+    """Caché compartida por todas las muestras analizadas en el proceso."""
+    return CacheNormalizacionHGVS()
@@ -0,0 +1,221 @@
+# ==============================================================================
+# BLOQUE 5a: NORMALIZADOR HGVS NATIVO PARA VARIANTES m. DE rCRS
+# ==============================================================================
+# Descripción: Normaliza sustituciones, deleciones e inserciones directamente
+# sobre la secuencia de referencia, sin pasar por el parser de gramática ni
+# por `hgvs.normalizer`: recorte de prefijo/sufijo común, desplazamiento 3'
+# (las inserciones y deleciones en homopolímeros y repeticiones se llevan a la
+# posición más 3'), detección de duplicaciones y fusión en delins cuando ambos
+# alelos quedan no vacíos. El desplazamiento 3' se lee del índice de
+# repeticiones de la referencia (`repeat_index`), sin recorrer la secuencia.
+# Reproduce exactamente el resultado de `Normalizer(shuffle_direction=3,
+# cross_boundaries=True)` de la librería hgvs con `LocalSeqProvider`: como en
+# ella, la referencia se trata como lineal (el desplazamiento se detiene en la
+# posición 16569). Los casos que la librería rechaza (coordenadas fuera de
+# rango, alelos con símbolos no admitidos) no se resuelven aquí y se delegan
+# en ella, de modo que los mensajes de error son los de siempre. Produce una `EdicionHGVS` (resultado estructurado) y su
+# cadena HGVS; `interpretar_hgvs_mt` lee de vuelta las cadenas que genera.
+# `ResultadoHGVS` es lo que circula entre la normalización y los formateadores
+# Mitomaster/EMPOP: estado, edición, cadena y la variante cruda de origen.
+# ------------------------------------------------------------------------------
+
+import re
+from enum import Enum
+from .repeat_index import IndiceRepeticiones, obtener_indice_repeticiones
+
+_ALFABETO_NATIVO = frozenset("ACGTN")
+_COMPLEMENTO = str.maketrans("ACGTN", "TGCAN")
+_TIPOS_SUSTITUCION = ("transition", "transversion", "substitution", "substitution (con N)")
+
+
+class EdicionHGVS:
+    """
+    Variante m. normalizada. `inicio`/`fin` son posiciones 1-based como en HGVS (en una
+    inserción, las dos bases que la flanquean). `tipo` es el de `posedit.edit.type` de la
+    librería hgvs: 'sub', 'del', 'ins', 'dup', 'delins', 'inv' o 'identity'.
+    """
+    __slots__ = ("tipo", "inicio", "fin", "ref", "alt")
+
+    def __init__(self, tipo: str, inicio: int, fin: int, ref: str = "", alt: str = ""):
+        self.tipo = tipo
+        self.inicio = inicio
+        self.fin = fin
+        self.ref = ref
+        self.alt = alt
+
+    @classmethod
+    def desde_variante_hgvs(cls, variante_hgvs) -> "EdicionHGVS":
+        """Convierte una SequenceVariant de la librería hgvs (p. ej. de un parse de respaldo)."""
+        posedit = variante_hgvs.posedit
+        edicion = posedit.edit
+        return cls(edicion.type, posedit.pos.start.base, posedit.pos.end.base,
+                   getattr(edicion, "ref", None) or "", getattr(edicion, "alt", None) or "")
+
+    def como_hgvs(self, ref_accession: str) -> str:
+        """Cadena HGVS con el mismo formato que `str()` de la librería hgvs."""
+        return f"{ref_accession}:m.{self.descripcion()}"
+
+    def descripcion(self) -> str:
+        """Parte posición + edición de la cadena HGVS (p. ej. '309dup')."""
+        posicion = f"{self.inicio}" if self.inicio == self.fin else f"{self.inicio}_{self.fin}"
+        if self.tipo == "sub":
+            edicion = f"{self.ref}>{self.alt}"
+        elif self.tipo in ("ins", "delins"):
+            edicion = f"{self.tipo}{self.alt}"
+        elif self.tipo == "identity":
+            edicion = "="
+        else:
+            edicion = self.tipo
+        return f"{posicion}{edicion}"
+
+    def __eq__(self, otra) -> bool:
+        return isinstance(otra, EdicionHGVS) and all(getattr(self, c) == getattr(otra, c) for c in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f"EdicionHGVS({self.tipo!r}, {self.inicio}, {self.fin}, ref={self.ref!r}, alt={self.alt!r})"
+
+
+class EstadoHGVS(Enum):
+    NORMALIZADA = "normalizada"
+    REINTENTO_DEL = "reintento_del" # Deleción de 1 base normalizada con el formato alternativo m.XdelN
+    ERROR = "error"
+
+
+class ResultadoHGVS:
+    """
+    Resultado de normalizar una variante cruda. `texto` es la cadena HGVS normalizada
+    (o el mensaje de error si `estado` es ERROR); `edicion` es su forma estructurada
+    (None en los errores). `str()` da la cadena que muestran el informe y el Track Viewer.
+    """
+    __slots__ = ("variante", "estado", "texto", "edicion")
+
+    def __init__(self, variante, estado: EstadoHGVS, texto: str, edicion: EdicionHGVS | None = None):
+        self.variante = variante
+        self.estado = estado
+        self.texto = texto
+        self.edicion = edicion
+
+    @classmethod
+    def desde_cadena(cls, variante, cadena: str, ref_accession: str) -> "ResultadoHGVS":
+        """Reconstruye el resultado a partir de una cadena ya formateada (entradas de la API de listas)."""
+        edicion = interpretar_hgvs_mt(cadena, ref_accession)
+        if edicion is not None:
+            return cls(variante, EstadoHGVS.NORMALIZADA, cadena, edicion)
+        if any(etiqueta in cadena for etiqueta in ("ERROR", "UNPROCESSED", "FALLIDO", "FORMATO_")):
+            return cls(variante, EstadoHGVS.ERROR, cadena)
+        if cadena.endswith(" (ReintentoDel)"):
+            return cls(variante, EstadoHGVS.REINTENTO_DEL, cadena[:-len(" (ReintentoDel)")])
+        return cls(variante, EstadoHGVS.NORMALIZADA, cadena)
+
+    @property
+    def es_error(self) -> bool:
+        return self.estado is EstadoHGVS.ERROR
+
+    @property
+    def cadena(self) -> str:
+        return self.texto + " (ReintentoDel)" if self.estado is EstadoHGVS.REINTENTO_DEL else self.texto
+
+    def __str__(self) -> str:
+        return self.cadena
+
+    def __repr__(self) -> str:
+        return f"ResultadoHGVS({self.estado.name}, {self.cadena!r})"
+
+
+def normalizar_alelos_3prima(
+    secuencia: str, inicio_0b: int, fin_0b: int, ref: str, alt: str, indice: IndiceRepeticiones | None = None
+) -> EdicionHGVS | None:
+    """
+    Normaliza el cambio `ref` -> `alt` del intervalo 0-based semiabierto [inicio_0b, fin_0b)
+    de `secuencia` (en mayúsculas; en una inserción el intervalo es vacío y `inicio_0b` es el
+    punto de inserción). Devuelve None si la variante no tiene representación (identidad o
+    inserción que queda antes de la posición 1). El desplazamiento 3' se lee del índice de
+    repeticiones de `secuencia` (`indice`, o el compartido del proceso).
+    """
+    # Recorte del prefijo y del sufijo comunes
+    n = 0
+    while n < len(ref) and n < len(alt) and ref[n] == alt[n]:
+        n += 1
+    ref, alt, inicio_0b = ref[n:], alt[n:], inicio_0b + n
+    n = 0
+    while n < len(ref) and n < len(alt) and ref[-1 - n] == alt[-1 - n]:
+        n += 1
+    if n:
+        ref, alt, fin_0b = ref[:-n], alt[:-n], fin_0b - n
+
+    # Desplazamiento 3': mientras un alelo es vacío, el otro rota sobre la referencia
+    if not ref and not alt:
+        return None
+    if not ref or not alt:
+        indice = indice or obtener_indice_repeticiones(secuencia)
+        inicio_0b, fin_0b, alelo = indice.alinear_3prima(inicio_0b, fin_0b, ref or alt)
+        ref, alt = (alelo, "") if ref else ("", alelo)
+
+    if len(ref) == len(alt):
+        if len(ref) > 1 and ref == alt[::-1].translate(_COMPLEMENTO):
+            return EdicionHGVS("inv", inicio_0b + 1, fin_0b, ref, "")
+        return EdicionHGVS("sub" if len(ref) == 1 else "delins", inicio_0b + 1, fin_0b, ref, alt)
+    if len(alt) < len(ref):
+        return EdicionHGVS("delins" if alt else "del", inicio_0b + 1, fin_0b, ref, alt)
+    if ref:
+        return EdicionHGVS("delins", inicio_0b + 1, fin_0b, ref, alt)
+    # Inserción: duplicación si repite las bases inmediatamente anteriores
+    if inicio_0b >= len(alt) and secuencia[inicio_0b - len(alt):inicio_0b] == alt:
+        return EdicionHGVS("dup", inicio_0b - len(alt) + 1, inicio_0b, alt, "")
+    if inicio_0b < 1:
+        return None
+    return EdicionHGVS("ins", inicio_0b, inicio_0b + 1, "", alt)
+
+def normalizar_variante_nativa(var_dict, secuencia: str, indice: IndiceRepeticiones | None = None) -> EdicionHGVS | None:
+    """
+    `EdicionHGVS` de una variante cruda (misma convención de posiciones que
+    `_normalizar_variante_hgvs`), o None si debe resolverla la librería hgvs.
+    `secuencia` es la referencia en mayúsculas.
+    """
+    try:
+        pos = int(var_dict['pos'])
+        ref = var_dict['ref'].upper()
+        alt = var_dict['alt'].upper()
+        tipo = var_dict['type']
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return None
+    longitud_ref = len(secuencia)
+
+    if tipo in _TIPOS_SUSTITUCION:
+        if len(ref) != 1 or len(alt) != 1 or not _ALFABETO_NATIVO.issuperset(ref + alt) or ref == alt or not 0 < pos <= longitud_ref:
+            return None
+        return EdicionHGVS("sub", pos, pos, ref, alt)
+    if tipo == 'deletion':
+        fin = pos + len(ref) - 1
+        if not ref or not 0 < pos <= fin <= longitud_ref:
+            return None
+        return normalizar_alelos_3prima(secuencia, pos - 1, fin, secuencia[pos - 1:fin], "", indice)
+    if tipo == 'insertion':
+        # `pos` es la posición 0-based anterior a la inserción: m.{pos+1}_{pos+2}ins
+        if not alt or not _ALFABETO_NATIVO.issuperset(alt) or not 0 <= pos < longitud_ref - 1:
+            return None
+        return normalizar_alelos_3prima(secuencia, pos + 1, pos + 1, "", alt, indice)
+    return None
+
+
+_PATRON_HGVS_MT = re.compile(
+    r"(?P<ac>[^:\s]+):m\.(?P<inicio>\d+)(?:_(?P<fin>\d+))?"
+    r"(?:(?P<ref>[ACGTN])>(?P<alt>[ACGTN])|(?P<tipo>delins|del|dup|ins|inv|=)(?P<seq>[ACGTN]*))"
+)
+
+def interpretar_hgvs_mt(hgvs_str: str, ref_accession: str) -> EdicionHGVS | None:
+    """
+    Lee una cadena m. con la forma canónica que emite `EdicionHGVS.como_hgvs`. Devuelve
+    None para cualquier otra (la interpreta entonces el parser de la librería hgvs).
+    """
+    m = _PATRON_HGVS_MT.fullmatch(hgvs_str)
+    if m is None or m["ac"] != ref_accession:
+        return None
+    inicio = int(m["inicio"])
+    fin = int(m["fin"]) if m["fin"] else inicio
+    if m["ref"]:
+        return EdicionHGVS("sub", inicio, fin, m["ref"], m["alt"]) if fin == inicio else None
+    tipo, seq = ("identity" if m["tipo"] == "=" else m["tipo"]), m["seq"]
+    if (tipo in ("ins", "delins")) != bool(seq) or (tipo == "ins" and fin != inicio + 1) or fin < inicio:
+        return None
+    return EdicionHGVS(tipo, inicio, fin, "", seq)
@@ -0,0 +1,123 @@
+# ==============================================================================
+# BLOQUE 5f: VALIDACIÓN DEL NORMALIZADOR NATIVO FRENTE A LA LIBRERÍA hgvs
+# ==============================================================================
+# Descripción: Ejecuta los dos motores de `generar_hgvs_normalizado` ("nativo"
+# y "hgvs") sobre un corpus de variantes de rCRS y compara las cadenas HGVS
+# y las ediciones resultantes. El corpus cubre SNV repartidas por la molécula,
+# indels en los homopolímeros y repeticiones de los hotspots (C-stretches
+# 303-315 y 16184-16193, AC 513-524, 8281-8289), duplicaciones, delins (sobre
+# `normalizar_alelos_3prima`) y variantes en el origen 16569/1; opcionalmente,
+# las variantes crudas de FASTAs de muestra. Es la comprobación que respalda
+# `HGVS_NORMALIZER_BACKEND = "nativo"`: se ejecuta con
+#   python -m src.hgvs_native_validation [query1.fasta query2.fasta ...]
+# y termina con código 1 si algún resultado difiere.
+# ------------------------------------------------------------------------------
+
+import sys
+from . import constants
+from .feature_extraction import cargar_secuencia_fasta
+from .hgvs_native import EdicionHGVS, normalizar_alelos_3prima
+from .hgvs_and_nomenclature import generar_hgvs_normalizado, obtener_parser_hgvs, obtener_normalizador_hgvs
+
+# Intervalos 1-based (inicio, fin) de los hotspots de homopolímeros y repeticiones
+INTERVALOS_REPETICION_VALIDACION = [(303, 315), (16184, 16193), (513, 524), (8281, 8289)]
+PASO_SNV_VALIDACION = 97 # Una SNV cada tantas posiciones (más todas las de los hotspots y del origen)
+MAX_LONGITUD_INDEL_VALIDACION = 4
+BASES = "ACGT"
+
+
+def _variante(pos: int, ref: str, alt: str, tipo: str) -> dict:
+    return {'pos': pos, 'ref': ref, 'alt': alt, 'type': tipo}
+
+def construir_corpus_validacion(secuencia: str) -> list:
+    """Variantes crudas (misma convención que `extraer_variantes_crudas`) del corpus de validación."""
+    longitud = len(secuencia)
+    posiciones_hotspot = sorted({p for inicio, fin in INTERVALOS_REPETICION_VALIDACION for p in range(inicio - 2, fin + 3)})
+    posiciones_origen = [1, 2, 3, longitud - 2, longitud - 1, longitud]
+    corpus = []
+
+    # SNV: las tres alternativas en hotspots y origen; una por posición en el resto
+    for pos in sorted(set(posiciones_hotspot + posiciones_origen)):
+        ref = secuencia[pos - 1]
+        corpus.extend(_variante(pos, ref, alt, "transversion") for alt in BASES if alt != ref)
+    for pos in range(1, longitud + 1, PASO_SNV_VALIDACION):
+        ref = secuencia[pos - 1]
+        corpus.append(_variante(pos, ref, BASES[(BASES.index(ref) + 1) % 4] if ref in BASES else "A", "transversion"))
+
+    # Deleciones e inserciones en hotspots y origen: la unidad repetida (dup), otras bases (ins)
+    for pos in posiciones_hotspot + posiciones_origen:
+        for k in range(1, MAX_LONGITUD_INDEL_VALIDACION + 1):
+            if pos + k - 1 <= longitud:
+                corpus.append(_variante(pos, secuencia[pos - 1:pos - 1 + k], "-", "deletion"))
+            pos_0b = pos - 1 # Inserción tras la base `pos` (pos 0-based anterior a la inserción)
+            if pos_0b + 1 >= k:
+                corpus.append(_variante(pos_0b, "-", secuencia[pos_0b + 1 - k:pos_0b + 1], "insertion"))
+            corpus.append(_variante(pos_0b, "-", "C" * k, "insertion"))
+            corpus.append(_variante(pos_0b, "-", "AC" * k, "insertion"))
+        corpus.append(_variante(pos - 1, "-", "T", "insertion"))
+    corpus.append(_variante(-1, "-", "C", "insertion")) # Antes de la posición 1: se delega en la librería
+    return corpus
+
+def _corpus_delins(secuencia: str) -> list:
+    """
+    (inicio_1b, fin_1b, alt) de delins sobre los hotspots y el origen. Las variantes crudas
+    nunca son delins; esta parte valida directamente `normalizar_alelos_3prima`.
+    """
+    longitud = len(secuencia)
+    casos = []
+    for inicio, fin in INTERVALOS_REPETICION_VALIDACION + [(1, 4), (longitud - 3, longitud)]:
+        for pos in range(inicio, fin + 1):
+            for k in (1, 2, 3):
+                if pos + k - 1 > longitud:
+                    continue
+                ref = secuencia[pos - 1:pos - 1 + k]
+                for alt in ("T", "GA", ref + "C", "C" + ref, ref[:-1] + "CC", "AC" + ref[1:]):
+                    casos.append((pos, pos + k - 1, alt))
+    return casos
+
+def comparar_motores_hgvs(ref_accession: str, ref_sequence_str: str, variantes_adicionales=None) -> tuple[int, list]:
+    """
+    (nº de comparaciones, discrepancias). Cada discrepancia es (variante o delins,
+    resultado de la librería hgvs, resultado nativo).
+    """
+    secuencia = ref_sequence_str.upper()
+    corpus = construir_corpus_validacion(secuencia) + list(variantes_adicionales or [])
+    discrepancias = []
+
+    resultados_libreria = generar_hgvs_normalizado(corpus, ref_accession, ref_sequence_str, motor="hgvs", usar_cache=False)
+    resultados_nativos = generar_hgvs_normalizado(corpus, ref_accession, ref_sequence_str, motor="nativo", usar_cache=False)
+    for var, libreria, nativo in zip(corpus, resultados_libreria, resultados_nativos):
+        if libreria.cadena != nativo.cadena or libreria.edicion != nativo.edicion:
+            discrepancias.append((var, repr(libreria), repr(nativo)))
+
+    hp, hn = obtener_parser_hgvs(), obtener_normalizador_hgvs(ref_accession, ref_sequence_str)
+    casos_delins = _corpus_delins(secuencia)
+    for inicio, fin, alt in casos_delins:
+        try:
+            libreria = EdicionHGVS.desde_variante_hgvs(hn.normalize(hp.parse_hgvs_variant(f"{ref_accession}:m.{inicio}_{fin}delins{alt}")))
+        except Exception as e:
+            libreria = f"ERROR ({type(e).__name__})"
+        nativo = normalizar_alelos_3prima(secuencia, inicio - 1, fin, secuencia[inicio - 1:fin], alt)
+        if nativo is not None and libreria != nativo: # None: identidad o anterior a la posición 1, se delega en la librería
+            discrepancias.append(((inicio, fin, alt), repr(libreria), repr(nativo)))
+    return len(corpus) + len(casos_delins), discrepancias
+
+
+if __name__ == "__main__":
+    from Bio.Seq import Seq
+    from .alignment_and_variant_calling import realizar_alineamiento, extraer_variantes_crudas
+    registro_rcrs = cargar_secuencia_fasta(constants.RCRS_FASTA_PATH)
+    if not registro_rcrs:
+        sys.exit(2)
+    rcrs = str(registro_rcrs.seq).upper()
+    variantes_muestras = []
+    for ruta_query in sys.argv[1:]:
+        registro_query = cargar_secuencia_fasta(ruta_query)
+        alineamiento = realizar_alineamiento(Seq(rcrs), registro_query.seq.upper(), "global") if registro_query else None
+        if alineamiento:
+            variantes_muestras.extend(extraer_variantes_crudas(alineamiento, registro_rcrs.id, registro_query.id, len(rcrs))[0])
+    num_comparaciones, discrepancias = comparar_motores_hgvs(registro_rcrs.id, rcrs, variantes_muestras)
+    for entrada, libreria, nativo in discrepancias:
+        print(f"DIFERENCIA {entrada}: hgvs={libreria} nativo={nativo}")
+    print(f"Validación del normalizador nativo: {num_comparaciones} variantes, {len(discrepancias)} diferencias.")
+    sys.exit(1 if discrepancias else 0)
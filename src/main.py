@@ -11,10 +11,14 @@ from Bio.Seq import Seq # Necesario para Seq()
 
 # Importaciones de tus módulos personalizados
 from . import constants
-from .feature_extraction import cargar_secuencia_fasta, cargar_y_extraer_features_rcrs
-from .alignment_and_variant_calling import realizar_alineamiento, extraer_variantes_crudas
-from .annotation_and_hotspots import anotar_locus_variante, obtener_hvs_region
-from .hgvs_and_nomenclature import normalizar_y_nombrar_hgvs, formatear_estilo_mitomaster, formatear_variantes_empop
+from .feature_extraction import cargar_secuencia_fasta
+from .reference_bundle import cargar_referencia_rcrs
+from .alignment_and_variant_calling import IndiceAlineamiento
+from .alignment_cache import alinear_y_extraer_variantes
+from .sequence_prescreen import prefiltrar_query
+from .annotation_and_hotspots import generar_variantes_anotadas
+from .hgvs_cache import obtener_cache_hgvs
+from .hgvs_and_nomenclature import generar_hgvs_normalizado, generar_formato_mitomaster, formatear_variantes_empop, registrar_secuencia_referencia
 from .report_data_preparation import generar_datos_para_informe_y_consola
 from .report_generation import generar_informe_html, convertir_html_a_pdf
 from .track_viewer import crear_track_viewer_interactivo 
@@ -26,13 +30,17 @@ def main(query_fasta_file_path: str):
     
     
     # --- 2. Carga de Secuencias y Features de Referencia ---
-    rcrs_fasta_record = cargar_secuencia_fasta(constants.RCRS_FASTA_PATH, id_esperado="NC_012920.1")
+    referencia_rcrs = cargar_referencia_rcrs() # Paquete precompilado (memory-mapping) o análisis de FASTA/GenBank
+    rcrs_fasta_record = referencia_rcrs.registro
     query_record = cargar_secuencia_fasta(query_fasta_file_path)
-    features_rcrs_gb = cargar_y_extraer_features_rcrs(constants.RCRS_GENBANK_PATH)
+    features_rcrs_gb = referencia_rcrs.features
+    indice_locus = referencia_rcrs.indice_locus # Tabla de locus por base, una vez
 
     if not rcrs_fasta_record or not query_record:
         print("Error crítico: No se pudieron cargar las secuencias FASTA. Abortando.")
         return
+    if referencia_rcrs.secuencia_bytes is not None:
+        registrar_secuencia_referencia(rcrs_fasta_record.id, referencia_rcrs.secuencia_bytes) # El proveedor HGVS lee del búfer mapeado
     
     query_id_original = query_record.id
     query_id_sanitized = "".join(c if c.isalnum() or c in ('_','-','.') else '_' for c in query_id_original)
@@ -49,6 +57,22 @@ def main(query_fasta_file_path: str):
     # --- 4. Preparación y Alineamiento de Secuencias ---
     rcrs_sequence_str = str(rcrs_fasta_record.seq).upper()
     query_sequence_str = str(query_record.seq).upper()
+
+    # --- 4.1. Pre-filtro de k-mers: orientación de hebra e identidad mínima con rCRS ---
+    if constants.PRESCREEN_ENABLED:
+        prefiltro = prefiltrar_query(rcrs_sequence_str, query_sequence_str)
+        identidad_str = f"{prefiltro['identidad']:.3f}" if prefiltro['identidad'] is not None else "N/A"
+        print(f"Pre-filtro de k-mers: identidad estimada {identidad_str} (hebra {prefiltro['hebra']}, {prefiltro['num_kmers']} k-mers).")
+        if prefiltro['hebra'] == '-':
+            print("La query está en reverso-complementario respecto a rCRS; se usará su reverso-complementaria.")
+            query_sequence_str = prefiltro['secuencia']
+        if not prefiltro['aceptada']:
+            if constants.PRESCREEN_ACTION == "rechazar":
+                print(f"Error: Identidad estimada con rCRS ({identidad_str}) por debajo de {constants.PRESCREEN_MIN_IDENTITY}. "
+                      "La entrada no parece ADNmt humano (contaminación, secuencia nuclear u otra especie). Abortando.")
+                return
+            print(f"ADVERTENCIA: Identidad estimada con rCRS ({identidad_str}) por debajo de {constants.PRESCREEN_MIN_IDENTITY}. "
+                  "Las variantes reportadas pueden no ser fiables.")
     
     modo_de_alineamiento = 'global' if len(query_sequence_str) >= len(rcrs_sequence_str) * 0.8 else 'local'
     print(f"Usando modo de alineamiento: {modo_de_alineamiento}")
@@ -61,6 +85,7 @@ def main(query_fasta_file_path: str):
     als_query_str = ""
     offset_ref_0b = 0
     offset_query_0b = 0
+    indice_alineamiento = None
     
 # --- 5. Inicialización de TODAS las variables de resultado de variantes y formateo ---
     variantes_crudas_con_locus_lista = []
@@ -70,12 +95,26 @@ def main(query_fasta_file_path: str):
     num_empop_variantes_final = 0
     empop_variantes_list_for_tv = [] # Lista separada de strings EMPOP para el Track Viewer
 
-    mejor_alineamiento = realizar_alineamiento(Seq(rcrs_sequence_str), Seq(query_sequence_str), modo_alineamiento=modo_de_alineamiento)
+    opciones_alineamiento = dict(
+        anclado=constants.ANCHORED_ALIGNMENT_ENABLED,
+        prepaso_puntuacion=constants.ALIGNMENT_SCORE_PREPASS,
+        memoria_lineal=constants.LINEAR_MEMORY_GLOBAL_ALIGNMENT
+    )
+    # Alineamiento + extracción de variantes crudas (con caché persistente por contenido)
+    (mejor_alineamiento, variantes_crudas_lista, als_ref_str, als_query_str, offset_ref_0b, offset_query_0b,
+     desplazamiento_ref_circular, desplazamiento_query_circular) = alinear_y_extraer_variantes(
+        rcrs_sequence_str, query_sequence_str, rcrs_fasta_record.id, query_id_original, modo_de_alineamiento,
+        circular=constants.CIRCULAR_ALIGNMENT_ENABLED, usar_cache=constants.ALIGNMENT_CACHE_ENABLED, **opciones_alineamiento
+    )
     
-    if mejor_alineamiento: # Si el alineamiento fue exitoso, intentar extraer variantes
-        variantes_crudas_lista, als_ref_str, als_query_str, offset_ref_0b, offset_query_0b = extraer_variantes_crudas(
-            mejor_alineamiento, rcrs_fasta_record.id, query_id_original, len(rcrs_sequence_str)
-        )
+    if mejor_alineamiento: # Si el alineamiento fue exitoso, preparar el índice del alineamiento
+        if als_ref_str and als_query_str:
+            # Índice de prefijos del alineamiento, compartido por el informe y el Track Viewer
+            longitud_circular = len(rcrs_sequence_str) if (desplazamiento_ref_circular or desplazamiento_query_circular) else None
+            indice_alineamiento = IndiceAlineamiento(
+                als_ref_str, als_query_str, offset_ref_0b, offset_query_0b,
+                longitud_ref=longitud_circular, longitud_query=len(query_sequence_str) if longitud_circular else None
+            )
     else: # Si el alineamiento falló, se emite un aviso y se procede con listas vacías.
         print("El alineamiento falló o no se encontraron alineamientos. Las listas de variantes estarán vacías.")
         # Las variables ya están inicializadas a vacío/cero arriba, así que no se necesita re-inicializar aquí.
@@ -91,42 +130,32 @@ def main(query_fasta_file_path: str):
     empop_variantes_list_for_tv = [] # Lista separada de strings EMPOP para el Track Viewer
     
     if variantes_crudas_lista: # Solo procesar variantes si la lista de variantes crudas NO está vacía
-        # --- 5.1. Anotación de Locus y HVS para Variantes Crudas ---
-        for var_cruda_dict in variantes_crudas_lista:
-            pos_var_cruda = var_cruda_dict.get('pos')
-            tipo_var_cruda = var_cruda_dict.get('type', '')
-            longitud_evento = 0
-            pos_1based_para_locus = -1
-
-            if tipo_var_cruda == 'insertion':
-                if isinstance(pos_var_cruda, int): pos_1based_para_locus = pos_var_cruda + 1
-                longitud_evento = len(var_cruda_dict.get('alt', ''))
-            elif tipo_var_cruda == 'deletion':
-                if isinstance(pos_var_cruda, int): pos_1based_para_locus = pos_var_cruda
-                longitud_evento = len(var_cruda_dict.get('ref', ''))
-            else: # Sustitución
-                if isinstance(pos_var_cruda, int): pos_1based_para_locus = pos_var_cruda
-                longitud_evento = 1
-
-            locus_anotado = "N/A"
-            hvs_region_anotada = None
-            # Asegúrate de que features_rcrs_gb no esté vacío antes de intentar anotar
-            if features_rcrs_gb and pos_1based_para_locus > 0:
-                locus_anotado = anotar_locus_variante(pos_1based_para_locus, tipo_var_cruda, longitud_evento, features_rcrs_gb)
-                hvs_region_anotada = obtener_hvs_region(pos_1based_para_locus)
-
-            var_cruda_copia = var_cruda_dict.copy()
-            var_cruda_copia['locus'] = locus_anotado
-            var_cruda_copia['hvs_region'] = hvs_region_anotada
-            variantes_crudas_con_locus_lista.append(var_cruda_copia)
-            
-        # --- 5.2. Normalización y Formateo de Variantes (HGVS, Mitomaster, EMPOP) ---
+        # --- 5.1. Flujo: anotación de Locus/HVS -> normalización HGVS -> formato Mitomaster ---
+        # Cada variante atraviesa las etapas sin listas intermedias; EMPOP (motivos AC y
+        # orden global), el informe y el Track Viewer necesitan el conjunto completo y
+        # actúan como barreras sobre las listas materializadas aquí.
         ref_acc_hgvs = rcrs_fasta_record.id
-        variantes_hgvs_norm_lista = normalizar_y_nombrar_hgvs(variantes_crudas_con_locus_lista, ref_acc_hgvs, rcrs_sequence_str)
-        variantes_mitomaster_formato_lista = formatear_estilo_mitomaster(variantes_hgvs_norm_lista, ref_acc_hgvs, rcrs_sequence_str, variantes_crudas_lista)
+        print("\n--- Iniciando Paso 5: Anotación, Normalización HGVS y Formato Mitomaster (en flujo) ---")
+        flujo_variantes = generar_formato_mitomaster(
+            generar_hgvs_normalizado(
+                generar_variantes_anotadas(variantes_crudas_lista, features_rcrs_gb, indice_locus),
+                ref_acc_hgvs, rcrs_sequence_str
+            ),
+            ref_acc_hgvs, rcrs_sequence_str
+        )
+        resultados_hgvs = []
+        for resultado_hgvs, mito_fmt_str in flujo_variantes:
+            resultados_hgvs.append(resultado_hgvs)
+            variantes_crudas_con_locus_lista.append(resultado_hgvs.variante)
+            variantes_hgvs_norm_lista.append(resultado_hgvs.cadena)
+            variantes_mitomaster_formato_lista.append(mito_fmt_str)
+        print(f"Procesamiento HGVS y Mitomaster completado. {len(variantes_hgvs_norm_lista)} variantes procesadas.")
+        if constants.HGVS_CACHE_ENABLED:
+            cache_hgvs = obtener_cache_hgvs()
+            print(f"Caché HGVS (acumulado del proceso): {cache_hgvs.aciertos} aciertos, {cache_hgvs.fallos} fallos ({cache_hgvs.tasa_aciertos():.1%}).")
         
         # formatear_variantes_empop devuelve 3 valores (cadena, número, lista de strings)
-        empop_query_final_str, num_empop_variantes_final, empop_variantes_list_for_tv = formatear_variantes_empop(variantes_crudas_con_locus_lista, rcrs_sequence_str)
+        empop_query_final_str, num_empop_variantes_final, empop_variantes_list_for_tv = formatear_variantes_empop(resultados_hgvs, rcrs_sequence_str)
     
     # --- 6. Resumen de Variantes para Consola (Mitomaster y EMPOP) ---
     # Estas listas ya han sido inicializadas y rellenadas (o quedaron vacías) en el paso 5.
@@ -151,7 +180,9 @@ def main(query_fasta_file_path: str):
         als_ref_str,
         als_query_str,
         offset_ref_0b,
-        offset_query_0b
+        offset_query_0b,
+        indice_alineamiento=indice_alineamiento,
+        tabla_consecuencias=referencia_rcrs.tabla_consecuencias
     )
     
     if df_detallado_final is not None:
@@ -188,7 +219,8 @@ def main(query_fasta_file_path: str):
         aligned_query_full=als_query_str,
         alignment_offset_ref_0based=offset_ref_0b,
         alignment_offset_query_0based=offset_query_0b,
-        output_html_path_tv=output_html_track_viewer_path
+        output_html_path_tv=output_html_track_viewer_path,
+        indice_alineamiento=indice_alineamiento
     )
 
     print("\nAnálisis completado.\n")
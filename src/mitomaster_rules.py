@@ -0,0 +1,100 @@
+# ==============================================================================
+# BLOQUE 5d: REGLAS DE FORMATO MITOMASTER INDEXADAS POR POSICIÓN DE ANCLAJE
+# ==============================================================================
+# Descripción: Las convenciones de Mitomaster para los hotspots (C309CCC,
+# C16193CC, CT309-, G316C, CA522d, anclajes 198/290/16193...) se declaran como
+# tabla en `constants.MITOMASTER_RULES` y, opcionalmente, en un JSON de
+# configuración. Cada regla es un predicado sobre posición, tipo y alelos más
+# una plantilla de salida. Se compilan a un diccionario posición -> reglas por
+# etapa ("cruda": variante cruda; "hgvs": edición normalizada), de modo que cada
+# variante solo se compara con las reglas de sus propias coordenadas. Las
+# reglas con "informe" definen además cómo muestra el informe su cadena.
+# ------------------------------------------------------------------------------
+
+import json
+from functools import lru_cache
+from . import constants
+
+ETAPAS_MITOMASTER = ("cruda", "hgvs")
+
+
+class ReglasMitomaster:
+    """Reglas de formato Mitomaster compiladas e indexadas por etapa y posición."""
+
+    def __init__(self, reglas: list):
+        self.reglas_por_posicion = {etapa: {} for etapa in ETAPAS_MITOMASTER}
+        self.informe_por_formato = {}
+        for regla in reglas:
+            compilada = (
+                frozenset(regla["tipos"]) if regla.get("tipos") else None,
+                frozenset(a.upper() for a in regla["ref"]) if regla.get("ref") else None,
+                frozenset(a.upper() for a in regla["alt"]) if regla.get("alt") else None,
+                regla.get("fin_edicion"),
+                tuple(regla["base_referencia"]) if regla.get("base_referencia") else None,
+                regla.get("ancla"),
+                regla["formato"],
+            )
+            inicio = regla.get("inicio", regla.get("pos"))
+            fin = regla.get("fin", inicio)
+            reglas_etapa = self.reglas_por_posicion[regla.get("etapa", "cruda")]
+            for pos in range(int(inicio), int(fin) + 1):
+                reglas_etapa.setdefault(pos, []).append(compilada)
+            if regla.get("informe"):
+                self.informe_por_formato.setdefault(regla["formato"], regla["informe"])
+
+    def formato(self, etapa: str, pos: int, tipo: str, ref: str, alt: str, ref_sequence_str: str, fin: int | None = None) -> str | None:
+        """Cadena Mitomaster de la primera regla de `etapa` que se cumple en `pos`, o None."""
+        reglas = self.reglas_por_posicion[etapa].get(pos)
+        if not reglas:
+            return None
+        for tipos, refs, alts, fin_edicion, base_referencia, ancla, plantilla in reglas:
+            if tipos is not None and tipo not in tipos: continue
+            if refs is not None and ref not in refs: continue
+            if alts is not None and alt not in alts: continue
+            if fin_edicion is not None and fin != fin_edicion: continue
+            if base_referencia is not None:
+                pos_base, base = base_referencia
+                if not (0 <= pos_base - 1 < len(ref_sequence_str) and ref_sequence_str[pos_base - 1] == base): continue
+            base_ancla = ref_sequence_str[ancla - 1].upper() if ancla is not None and 0 < ancla <= len(ref_sequence_str) else ""
+            return plantilla.format(pos=pos, ref=ref, alt=alt, ancla=ancla, base_ancla=base_ancla, c_insertadas="C" * len(alt))
+        return None
+
+    def formato_variante_cruda(self, variante, ref_sequence_str: str) -> str | None:
+        """Reglas de la etapa "cruda": posición, tipo y alelos tal como los dio el alineador."""
+        return self.formato("cruda", variante.get('pos'), variante.get('type'), variante.get('ref', '').upper(), variante.get('alt', '').upper(), ref_sequence_str)
+
+    def formato_edicion(self, edicion_hgvs, ref_sequence_str: str) -> str | None:
+        """
+        Reglas de la etapa "hgvs" sobre la edición normalizada; `ref` son las bases de rCRS
+        del intervalo editado (sin reglas si el intervalo cae fuera de la referencia).
+        """
+        inicio, fin = edicion_hgvs.inicio, edicion_hgvs.fin
+        if inicio not in self.reglas_por_posicion["hgvs"] or not 1 <= inicio - 1 < fin <= len(ref_sequence_str):
+            return None
+        return self.formato("hgvs", inicio, edicion_hgvs.tipo, ref_sequence_str[inicio - 1:fin].upper(), edicion_hgvs.alt.upper(), ref_sequence_str, fin)
+
+    def visualizacion_informe(self, formato_mitomaster: str, rcrs_seq_str: str) -> tuple[str, str, str] | None:
+        """(pos, ref, alt) con que el informe muestra una cadena Mitomaster con regla de informe, o None."""
+        informe = self.informe_por_formato.get(formato_mitomaster)
+        if informe is None:
+            return None
+        pos = int(informe["pos"])
+        ref_display = rcrs_seq_str[pos - 1] if 0 <= pos - 1 < len(rcrs_seq_str) else "?"
+        return str(pos), ref_display, informe["alt"]
+
+
+def cargar_reglas_mitomaster(ruta_config: str | None = constants.MITOMASTER_RULES_CONFIG_PATH) -> list:
+    """Reglas de `constants.MITOMASTER_RULES` más las del JSON de configuración, si se indica."""
+    reglas = list(constants.MITOMASTER_RULES)
+    if ruta_config:
+        try:
+            with open(ruta_config, encoding="utf-8") as f:
+                reglas.extend(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Advertencia: No se pudieron cargar las reglas Mitomaster de '{ruta_config}': {e}")
+    return reglas
+
+@lru_cache(maxsize=None)
+def obtener_reglas_mitomaster(ruta_config: str | None = constants.MITOMASTER_RULES_CONFIG_PATH) -> ReglasMitomaster:
+    """Reglas compiladas una vez por proceso (y por archivo de configuración)."""
+    return ReglasMitomaster(cargar_reglas_mitomaster(ruta_config))
@@ -0,0 +1,208 @@
+# ==============================================================================
+# BLOQUE 2b: PAQUETE DE REFERENCIA PRECOMPILADO (rCRS)
+# ==============================================================================
+# Descripción: Compila en un único archivo binario versionado la secuencia
+# rCRS, la lista final de features (GenBank + definición maestra, ya ordenada
+# por pista), los arrays del índice de locus por base y la tabla de
+# consecuencias de todas las SNV en genes proteicos. Cada ejecución lo
+# carga por memory-mapping en milisegundos en lugar de analizar el GenBank y
+# el FASTA. La cabecera guarda el SHA-256 de los archivos fuente y de las
+# definiciones de `constants` que afectan a las features: si algo cambia, el
+# paquete se descarta y se vuelve a generar a partir de las fuentes.
+#
+# Formato: MAGIA (8 bytes) | versión (uint32) | longitud de la cabecera (uint64)
+#          | cabecera JSON | arrays alineados a 64 bytes (offsets en la cabecera)
+# ------------------------------------------------------------------------------
+
+import hashlib
+import json
+import os
+import struct
+import sys
+import tempfile
+import numpy as np
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+from . import constants
+from .feature_extraction import cargar_secuencia_fasta, cargar_y_extraer_features_rcrs
+from .annotation_and_hotspots import IndiceAnotacionLocus
+from .coding_consequences import TablaConsecuencias
+
+MAGIA_PAQUETE = b"MITOREF\x00"
+_PREFIJO = struct.Struct("<8sIQ")
+_ALINEACION = 64
+
+
+class ReferenciaRCRS:
+    """Referencia lista para el análisis: registro FASTA, features, índice de locus y tabla de consecuencias."""
+
+    def __init__(self, registro: SeqRecord | None, features: list, indice_locus: IndiceAnotacionLocus | None,
+                 tabla_consecuencias: TablaConsecuencias | None = None, secuencia_bytes: np.ndarray | None = None):
+        self.registro = registro
+        self.features = features
+        self.indice_locus = indice_locus
+        self.tabla_consecuencias = tabla_consecuencias
+        self.secuencia_bytes = secuencia_bytes # Secuencia ASCII mapeada del paquete (None si se analizaron las fuentes)
+
+
+def _sha256_archivo(ruta: str) -> str | None:
+    try:
+        with open(ruta, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+def _huella_definiciones() -> str:
+    """SHA-256 de las definiciones de `constants` que determinan las features, los nombres de locus y las consecuencias."""
+    definiciones = [constants.MASTER_RCRS_FEATURES_DEFINITION, constants.final_track_types_order, constants.PRIORITY_FEATURE_TYPES,
+                    constants.MITO_CODON_TABLE_ID]
+    return hashlib.sha256(json.dumps(definiciones, sort_keys=True).encode("utf-8")).hexdigest()
+
+def _huellas_fuentes(ruta_fasta: str, ruta_genbank: str) -> dict:
+    return {"fasta": _sha256_archivo(ruta_fasta), "genbank": _sha256_archivo(ruta_genbank), "definiciones": _huella_definiciones()}
+
+def guardar_paquete_referencia(referencia: ReferenciaRCRS, huellas: dict, ruta_paquete: str = constants.REFERENCE_BUNDLE_PATH) -> None:
+    """Escribe el paquete de forma atómica (archivo temporal + rename)."""
+    registro = referencia.registro
+    arrays = {"secuencia": np.frombuffer(str(registro.seq).encode("ascii"), dtype=np.uint8)}
+    arrays.update({f"locus_{nombre}": np.ascontiguousarray(array) for nombre, array in referencia.indice_locus.como_arrays().items()})
+    arrays.update({f"consecuencias_{nombre}": np.ascontiguousarray(array) for nombre, array in referencia.tabla_consecuencias.como_arrays().items()})
+
+    descriptores, offset = {}, 0
+    for nombre, array in arrays.items():
+        descriptores[nombre] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += -(-array.nbytes // _ALINEACION) * _ALINEACION
+    cabecera = {
+        "fuentes": huellas,
+        "registro": {"id": registro.id, "name": registro.name, "description": registro.description},
+        "features": referencia.features,
+        "conjuntos_locus": [list(c) for c in referencia.indice_locus.conjuntos],
+        "genes_consecuencias": referencia.tabla_consecuencias.genes,
+        "arrays": descriptores,
+    }
+    cabecera_bytes = json.dumps(cabecera, ensure_ascii=False).encode("utf-8")
+    inicio_datos = -(-(_PREFIJO.size + len(cabecera_bytes)) // _ALINEACION) * _ALINEACION
+    cabecera_bytes = cabecera_bytes.ljust(inicio_datos - _PREFIJO.size, b" ")
+
+    directorio = os.path.dirname(ruta_paquete) or "."
+    os.makedirs(directorio, exist_ok=True)
+    fd, ruta_tmp = tempfile.mkstemp(dir=directorio, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_PREFIJO.pack(MAGIA_PAQUETE, constants.REFERENCE_BUNDLE_VERSION, len(cabecera_bytes)))
+            f.write(cabecera_bytes)
+            for nombre, array in arrays.items():
+                f.seek(inicio_datos + descriptores[nombre]["offset"])
+                f.write(array.tobytes())
+            f.truncate(inicio_datos + offset)
+        os.chmod(ruta_tmp, 0o644) # Legible por todos los procesos del flujo de trabajo
+        os.replace(ruta_tmp, ruta_paquete)
+    except BaseException:
+        try: os.remove(ruta_tmp)
+        except OSError: pass
+        raise
+
+def cargar_paquete_referencia(
+    ruta_paquete: str = constants.REFERENCE_BUNDLE_PATH,
+    ruta_fasta: str = constants.RCRS_FASTA_PATH,
+    ruta_genbank: str = constants.RCRS_GENBANK_PATH
+) -> ReferenciaRCRS | None:
+    """
+    Carga el paquete por memory-mapping; None si no existe, es de otra versión o sus
+    huellas no coinciden con los archivos fuente y las definiciones actuales. Si un
+    archivo fuente no está disponible, el paquete se acepta con un aviso.
+    """
+    try:
+        with open(ruta_paquete, "rb") as f:
+            magia, version, longitud_cabecera = _PREFIJO.unpack(f.read(_PREFIJO.size))
+            if magia != MAGIA_PAQUETE or version != constants.REFERENCE_BUNDLE_VERSION:
+                return None
+            cabecera = json.loads(f.read(longitud_cabecera).decode("utf-8"))
+    except (OSError, ValueError, struct.error):
+        return None
+
+    huellas_actuales = _huellas_fuentes(ruta_fasta, ruta_genbank)
+    for fuente, huella in huellas_actuales.items():
+        if huella is None:
+            print(f"Advertencia: No se puede verificar el paquete de referencia contra '{fuente}' (archivo no disponible).")
+        elif huella != cabecera["fuentes"].get(fuente):
+            return None
+
+    try:
+        datos = np.memmap(ruta_paquete, dtype=np.uint8, mode="r")
+        inicio_datos = _PREFIJO.size + longitud_cabecera
+        arrays = {}
+        for nombre, desc in cabecera["arrays"].items():
+            dtype = np.dtype(desc["dtype"])
+            inicio = inicio_datos + desc["offset"]
+            n_bytes = int(np.prod(desc["shape"], dtype=np.int64)) * dtype.itemsize
+            arrays[nombre] = datos[inicio:inicio + n_bytes].view(dtype).reshape(desc["shape"])
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Advertencia: Paquete de referencia ilegible ('{ruta_paquete}'): {e}")
+        return None
+
+    info = cabecera["registro"]
+    registro = SeqRecord(Seq(arrays["secuencia"].tobytes().decode("ascii")), id=info["id"], name=info["name"], description=info["description"])
+    features = cabecera["features"]
+    indice_locus = IndiceAnotacionLocus.desde_arrays(
+        features, cabecera["conjuntos_locus"],
+        {nombre[len("locus_"):]: array for nombre, array in arrays.items() if nombre.startswith("locus_")}
+    )
+    tabla_consecuencias = TablaConsecuencias.desde_arrays(
+        cabecera["genes_consecuencias"],
+        {nombre[len("consecuencias_"):]: array for nombre, array in arrays.items() if nombre.startswith("consecuencias_")}
+    )
+    return ReferenciaRCRS(registro, features, indice_locus, tabla_consecuencias, arrays["secuencia"])
+
+def construir_paquete_referencia(
+    ruta_fasta: str = constants.RCRS_FASTA_PATH,
+    ruta_genbank: str = constants.RCRS_GENBANK_PATH,
+    ruta_paquete: str = constants.REFERENCE_BUNDLE_PATH
+) -> ReferenciaRCRS | None:
+    """Analiza FASTA y GenBank, construye los índices derivados y escribe el paquete (paso build-reference)."""
+    registro = cargar_secuencia_fasta(ruta_fasta, id_esperado="NC_012920.1")
+    features = cargar_y_extraer_features_rcrs(ruta_genbank)
+    if not registro or not features:
+        print("Error: No se pudo construir el paquete de referencia (FASTA o GenBank de rCRS no disponibles).")
+        return None
+    referencia = ReferenciaRCRS(registro, features, IndiceAnotacionLocus(features), TablaConsecuencias.construir(str(registro.seq)))
+    guardar_paquete_referencia(referencia, _huellas_fuentes(ruta_fasta, ruta_genbank), ruta_paquete)
+    print(f"Paquete de referencia guardado en '{ruta_paquete}'.")
+    return referencia
+
+def cargar_referencia_rcrs(usar_paquete: bool = constants.REFERENCE_BUNDLE_ENABLED) -> ReferenciaRCRS:
+    """
+    Referencia rCRS para `main()`: del paquete precompilado si es válido; si no, se
+    analizan las fuentes y (si el paquete está habilitado) se regenera para las
+    siguientes ejecuciones. Sin FASTA, `registro` es None; sin GenBank, `features` está vacía.
+    """
+    if usar_paquete:
+        referencia = cargar_paquete_referencia()
+        if referencia is not None:
+            print(f"Referencia '{referencia.registro.id}' cargada del paquete precompilado ({len(referencia.registro.seq)} pb, {len(referencia.features)} features).")
+            return referencia
+        print("Paquete de referencia no disponible o desactualizado. Se analizan FASTA y GenBank de rCRS...")
+
+    registro = cargar_secuencia_fasta(constants.RCRS_FASTA_PATH, id_esperado="NC_012920.1")
+    features = cargar_y_extraer_features_rcrs(constants.RCRS_GENBANK_PATH)
+    referencia = ReferenciaRCRS(
+        registro, features,
+        IndiceAnotacionLocus(features) if features else None,
+        TablaConsecuencias.construir(str(registro.seq)) if registro else None
+    )
+    if usar_paquete and registro and features:
+        try:
+            guardar_paquete_referencia(referencia, _huellas_fuentes(constants.RCRS_FASTA_PATH, constants.RCRS_GENBANK_PATH))
+        except OSError as e:
+            print(f"Advertencia: No se pudo guardar el paquete de referencia: {e}")
+    return referencia
+
+
+if __name__ == "__main__":
+    # Paso build-reference: python -m src.reference_bundle [ruta_fasta ruta_genbank [ruta_paquete]]
+    argumentos = sys.argv[1:]
+    if len(argumentos) not in (0, 2, 3):
+        print("Uso: python -m src.reference_bundle [ruta_fasta ruta_genbank [ruta_paquete]]")
+        sys.exit(2)
+    if not construir_paquete_referencia(*argumentos):
+        sys.exit(1)
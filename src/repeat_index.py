@@ -0,0 +1,137 @@
+# ==============================================================================
+# BLOQUE 5e: ÍNDICE DE REPETICIONES Y HOMOPOLÍMEROS DE rCRS
+# ==============================================================================
+# Descripción: Precalcula, para cada periodo p = 1..REPEAT_INDEX_MAX_PERIOD, la
+# longitud de las rachas de bases que repiten la base situada p posiciones
+# antes (hacia 3') o después (hacia 5'). Con estos arrays, el desplazamiento
+# máximo de un indel dentro de su homopolímero o repetición en tándem, en
+# cualquier punto de la molécula, es una lectura de array en lugar de un
+# recorrido de la secuencia: alinear a 3' (HGVS) o a 5' y
+# obtener la unidad, la extensión y los límites 5'/3' de la repetición que
+# contiene una posición. Los indels de más de REPEAT_INDEX_MAX_PERIOD bases se
+# desplazan recorriendo la secuencia, como antes.
+# ------------------------------------------------------------------------------
+
+import numpy as np
+from functools import lru_cache
+from . import constants
+
+
+def _rachas_hacia_3prima(mascara: np.ndarray) -> np.ndarray:
+    """r[i] = número de True consecutivos de `mascara` a partir de i (incluido)."""
+    n = len(mascara)
+    indices = np.arange(n)
+    siguiente_falso = np.minimum.accumulate(np.where(mascara, n, indices)[::-1])[::-1]
+    return siguiente_falso - indices
+
+def _rachas_hacia_5prima(mascara: np.ndarray) -> np.ndarray:
+    """r[i] = número de True consecutivos de `mascara` hasta i (incluido), hacia atrás."""
+    indices = np.arange(len(mascara))
+    anterior_falso = np.maximum.accumulate(np.where(mascara, -1, indices))
+    return indices - anterior_falso
+
+
+class IndiceRepeticiones:
+    """
+    Arrays (p, i) con p = 1..periodo_max e i 0-based (más un centinela en i = L):
+      hacia_3prima  int32  nº de j >= i consecutivos con secuencia[j] == secuencia[j - p]
+      hacia_5prima  int32  nº de j <= i consecutivos con secuencia[j] == secuencia[j + p]
+    y, por posición i 0-based, la repetición de menor periodo que la contiene:
+      periodo_repeticion  int8   periodo (0 si ninguna)
+      inicio_repeticion   int32  límite 5' (0-based, incluido)
+      fin_repeticion      int32  límite 3' (0-based, exclusivo)
+    """
+
+    def __init__(self, secuencia: str, periodo_max: int = constants.REPEAT_INDEX_MAX_PERIOD):
+        self.secuencia = secuencia.upper()
+        self.periodo_max = periodo_max
+        longitud = len(self.secuencia)
+        bases = np.frombuffer(self.secuencia.encode("ascii"), dtype=np.uint8)
+        self.hacia_3prima = np.zeros((periodo_max + 1, longitud + 1), dtype=np.int32)
+        self.hacia_5prima = np.zeros((periodo_max + 1, longitud + 1), dtype=np.int32)
+        for p in range(1, min(periodo_max, longitud - 1) + 1):
+            iguales = bases[p:] == bases[:-p] # iguales[j]: secuencia[j + p] == secuencia[j]
+            self.hacia_3prima[p, p:longitud] = _rachas_hacia_3prima(iguales)
+            self.hacia_5prima[p, :longitud - p] = _rachas_hacia_5prima(iguales)
+
+        # Tabla por posición de la repetición de menor periodo (al menos dos copias) que la contiene:
+        # periodo (0 si ninguna) e intervalo 0-based semiabierto [inicio, fin) de su extensión
+        self.periodo_repeticion = np.zeros(longitud, dtype=np.int8)
+        self.inicio_repeticion = np.full(longitud, -1, dtype=np.int32)
+        self.fin_repeticion = np.full(longitud, -1, dtype=np.int32)
+        for p in range(1, min(periodo_max, longitud - 1) + 1):
+            # Una racha de `iguales` de p o más posiciones desde j es una repetición [j, j + racha + p)
+            rachas = self.hacia_5prima[p, :longitud - p]
+            finales = np.flatnonzero((rachas >= p) & (np.append(rachas[1:], 0) == 0))
+            periodo_p = np.zeros(longitud, dtype=np.int8)
+            inicio_p = np.full(longitud, -1, dtype=np.int32)
+            fin_p = np.full(longitud, -1, dtype=np.int32)
+            for final in finales[::-1]: # De 3' a 5': en los solapamientos queda la repetición más 5'
+                inicio, fin = final - rachas[final] + 1, final + p + 1
+                periodo_p[inicio:fin], inicio_p[inicio:fin], fin_p[inicio:fin] = p, inicio, fin
+            libres = (self.periodo_repeticion == 0) & (periodo_p > 0)
+            self.periodo_repeticion[libres] = p
+            self.inicio_repeticion[libres] = inicio_p[libres]
+            self.fin_repeticion[libres] = fin_p[libres]
+
+    def desplazamiento_3prima(self, fin_0b: int, alelo: str) -> int:
+        """
+        Cuántas posiciones puede desplazarse hacia 3' un indel de `alelo` (bases insertadas o
+        eliminadas) cuyo extremo 3' (0-based, exclusivo) es `fin_0b`: nº de d consecutivos con
+        secuencia[fin_0b + d] == alelo[d % len(alelo)].
+        """
+        k, secuencia = len(alelo), self.secuencia
+        d = 0
+        while d < k and fin_0b + d < len(secuencia) and secuencia[fin_0b + d] == alelo[d]:
+            d += 1
+        if d < k:
+            return d
+        if k <= self.periodo_max:
+            return k + int(self.hacia_3prima[k, fin_0b + k])
+        while fin_0b + d < len(secuencia) and secuencia[fin_0b + d] == alelo[d % k]:
+            d += 1
+        return d
+
+    def desplazamiento_5prima(self, inicio_0b: int, alelo: str) -> int:
+        """Simétrico de `desplazamiento_3prima` hacia 5' desde el extremo 5' (0-based) `inicio_0b`."""
+        k, secuencia = len(alelo), self.secuencia
+        d = 0
+        while d < k and inicio_0b - 1 - d >= 0 and secuencia[inicio_0b - 1 - d] == alelo[-1 - d]:
+            d += 1
+        if d < k:
+            return d
+        if k <= self.periodo_max:
+            return k + (int(self.hacia_5prima[k, inicio_0b - 1 - k]) if inicio_0b - 1 - k >= 0 else 0)
+        while inicio_0b - 1 - d >= 0 and secuencia[inicio_0b - 1 - d] == alelo[-1 - d % k]:
+            d += 1
+        return d
+
+    def alinear_3prima(self, inicio_0b: int, fin_0b: int, alelo: str) -> tuple[int, int, str]:
+        """(inicio, fin, alelo rotado) del indel desplazado a la posición más 3'."""
+        d = self.desplazamiento_3prima(fin_0b, alelo)
+        rotacion = d % len(alelo)
+        return inicio_0b + d, fin_0b + d, alelo[rotacion:] + alelo[:rotacion]
+
+    def alinear_5prima(self, inicio_0b: int, fin_0b: int, alelo: str) -> tuple[int, int, str]:
+        """(inicio, fin, alelo rotado) del indel desplazado a la posición más 5'."""
+        d = self.desplazamiento_5prima(inicio_0b, alelo)
+        rotacion = d % len(alelo)
+        return inicio_0b - d, fin_0b - d, alelo[len(alelo) - rotacion:] + alelo[:len(alelo) - rotacion]
+
+    def repeticion(self, pos_1based: int) -> tuple[str, int, int] | None:
+        """
+        (unidad, inicio, fin) 1-based de la repetición de menor periodo (al menos dos copias)
+        que contiene la posición; None si la posición no está en ningún homopolímero ni
+        repetición en tándem de periodo <= periodo_max.
+        """
+        i = pos_1based - 1
+        if not 0 <= i < len(self.secuencia) or not self.periodo_repeticion[i]:
+            return None
+        inicio = int(self.inicio_repeticion[i])
+        return self.secuencia[inicio:inicio + int(self.periodo_repeticion[i])], inicio + 1, int(self.fin_repeticion[i])
+
+
+@lru_cache(maxsize=constants.HGVS_SHARED_REFERENCES_MAX)
+def obtener_indice_repeticiones(secuencia: str) -> IndiceRepeticiones:
+    """Índice construido una vez por proceso y por secuencia de referencia."""
+    return IndiceRepeticiones(secuencia)
@@ -131,10 +131,10 @@ def generar_informe_html(
 
             /* --- NUEVA REGLA CSS PARA OCULTAR COLUMNA EN PDF/IMPRESIÓN --- */
             @media print {{
-                /* "HGVS Normalizado" es la 6ª columna (índice 5 en la lista de columnas) */
+                /* "HGVS Normalizado" es la 7ª columna (índice 6 en la lista de columnas) */
                 /* Asegúrate de que las clases .table-striped y .table-bordered se apliquen a tu tabla detallada */
-                .table.table-striped.table-bordered th:nth-child(6),
-                .table.table-striped.table-bordered td:nth-child(6) {{
+                .table.table-striped.table-bordered th:nth-child(7),
+                .table.table-striped.table-bordered td:nth-child(7) {{
                     display: none;
                 }}
             }}
@@ -0,0 +1,177 @@
+# ==============================================================================
+# BLOQUE 3c: ÍNDICE DE SEMILLAS (K-MERS) DE rCRS
+# ==============================================================================
+# Descripción: Índice k-mer -> posición de rCRS construido una sola vez a partir
+# de `constants.RCRS_FASTA_PATH` y guardado como arrays NumPy compactos (hashes
+# 2-bit ordenados + posiciones). Se carga con memory-mapping, de modo que los
+# procesos de trabajo comparten las mismas páginas en solo lectura. Ofrece
+# búsqueda por lotes de los k-mers de una query (np.searchsorted), usada por el
+# alineamiento anclado, la detección de rotación circular y el pre-filtro.
+# ------------------------------------------------------------------------------
+
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+from functools import lru_cache
+from . import constants
+
+# Código 2-bit por base; cualquier otro carácter (N, IUPAC, gaps) invalida el k-mer
+_CODIGO_BASE = np.full(256, 4, dtype=np.uint8)
+for _codigo, _base in enumerate("ACGT"):
+    _CODIGO_BASE[ord(_base)] = _codigo
+    _CODIGO_BASE[ord(_base.lower())] = _codigo
+
+
+def codificar_kmers(secuencia: str, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Hashes 2-bit (uint64, k <= 32) de todos los k-mers de `secuencia`, en orden de
+    posición, y máscara de k-mers válidos (sin bases fuera de ACGT).
+    """
+    n_kmers = len(secuencia) - k + 1
+    if n_kmers <= 0:
+        return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=bool)
+    codigos = _CODIGO_BASE[np.frombuffer(secuencia.encode('ascii'), dtype=np.uint8)]
+    invalidos = np.zeros(len(codigos) + 1, dtype=np.int32)
+    np.cumsum(codigos == 4, out=invalidos[1:])
+    validos = (invalidos[k:] - invalidos[:n_kmers]) == 0
+    bits = (codigos & 3).astype(np.uint64)
+    hashes = np.zeros(n_kmers, dtype=np.uint64)
+    for j in range(k):
+        hashes = (hashes << np.uint64(2)) | bits[j:j + n_kmers]
+    return hashes, validos
+
+
+class IndiceSemillas:
+    """
+    k-mers de rCRS (incluidos los que cruzan el origen circular 16569/1) como
+    hashes ordenados con su posición 0-based y una máscara de unicidad.
+    Los arrays pueden ser memory-maps de solo lectura compartidos entre procesos.
+    """
+
+    def __init__(self, k: int, longitud_ref: int, hashes: np.ndarray, posiciones: np.ndarray, unicos: np.ndarray):
+        self.k = k
+        self.longitud_ref = longitud_ref
+        self.hashes = hashes          # uint64, ordenados
+        self.posiciones = posiciones  # int32, posición 0-based en rCRS de cada hash
+        self.unicos = unicos          # bool, el k-mer aparece una sola vez en rCRS
+
+    @classmethod
+    def construir(cls, rcrs_str: str, k: int) -> "IndiceSemillas":
+        rcrs_str = rcrs_str.upper()
+        hashes, validos = codificar_kmers(rcrs_str + rcrs_str[:k - 1], k)
+        posiciones = np.flatnonzero(validos).astype(np.int32)
+        hashes = hashes[validos]
+        orden = np.argsort(hashes, kind='stable')
+        hashes, posiciones = hashes[orden], posiciones[orden]
+        distinto_anterior = np.ones(len(hashes), dtype=bool)
+        distinto_anterior[1:] = hashes[1:] != hashes[:-1]
+        distinto_siguiente = np.ones(len(hashes), dtype=bool)
+        distinto_siguiente[:-1] = distinto_anterior[1:]
+        return cls(k, len(rcrs_str), hashes, posiciones, distinto_anterior & distinto_siguiente)
+
+    def buscar(self, hashes_query: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Búsqueda por lotes: rango [inicio, fin) de cada hash de la query en el índice."""
+        return np.searchsorted(self.hashes, hashes_query, side='left'), np.searchsorted(self.hashes, hashes_query, side='right')
+
+    def buscar_unicos(self, query_str: str, lineal: bool = False) -> tuple[np.ndarray, np.ndarray]:
+        """
+        (posiciones_query, posiciones_ref) de los k-mers de la query que coinciden con un
+        k-mer único de rCRS, ordenados por posición en la query. Con `lineal=True` se
+        descartan los k-mers de rCRS que cruzan el origen (para alinear sin rotar).
+        """
+        hashes_query, validos = codificar_kmers(query_str, self.k)
+        pos_query = np.flatnonzero(validos)
+        if not len(pos_query) or not len(self.hashes):
+            return pos_query, pos_query.copy()
+        inicio, fin = self.buscar(hashes_query[pos_query])
+        encontrado = (fin - inicio) == 1
+        inicio = np.minimum(inicio, len(self.hashes) - 1)
+        encontrado &= self.unicos[inicio]
+        pos_query, pos_ref = pos_query[encontrado], self.posiciones[inicio[encontrado]].astype(np.int64)
+        if lineal:
+            dentro = pos_ref + self.k <= self.longitud_ref
+            pos_query, pos_ref = pos_query[dentro], pos_ref[dentro]
+        return pos_query, pos_ref
+
+    def contencion(self, query_str: str) -> tuple[float, int]:
+        """Fracción de k-mers válidos de la query presentes en rCRS y número de k-mers válidos."""
+        hashes_query, validos = codificar_kmers(query_str, self.k)
+        hashes_query = hashes_query[validos]
+        if not len(hashes_query) or not len(self.hashes):
+            return 0.0, int(len(hashes_query))
+        inicio, fin = self.buscar(hashes_query)
+        return float(np.count_nonzero(fin > inicio)) / len(hashes_query), int(len(hashes_query))
+
+
+def _rutas_indice(directorio: str, k: int) -> dict:
+    return {nombre: os.path.join(directorio, f"k{k}_{nombre}.npy") for nombre in ("hashes", "posiciones", "unicos")} | \
+           {"meta": os.path.join(directorio, f"k{k}_meta.json")}
+
+def _huella_referencia(rcrs_str: str) -> str:
+    return hashlib.sha256(rcrs_str.upper().encode('ascii')).hexdigest()
+
+def _escribir_atomico(ruta: str, escribir) -> None:
+    """Escribe con `escribir(f)` en un temporal propio del proceso y lo renombra sobre `ruta`."""
+    fd, ruta_tmp = tempfile.mkstemp(dir=os.path.dirname(ruta) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            escribir(f)
+        os.chmod(ruta_tmp, 0o644) # Legible por todos los procesos del flujo de trabajo
+        os.replace(ruta_tmp, ruta)
+    except BaseException:
+        try: os.remove(ruta_tmp)
+        except OSError: pass
+        raise
+
+def guardar_indice_semillas(indice: IndiceSemillas, rcrs_str: str, directorio: str = constants.SEED_INDEX_DIR) -> None:
+    """
+    Escribe los arrays .npy y, al final, un meta.json con la huella SHA-256 de la referencia.
+    Cada archivo se escribe de forma atómica (temporal por escritor + rename), de modo que
+    varios workers con la caché fría pueden guardarlo a la vez y un lector nunca ve un
+    archivo a medio escribir.
+    """
+    rutas = _rutas_indice(directorio, indice.k)
+    os.makedirs(directorio, exist_ok=True)
+    for nombre in ("hashes", "posiciones", "unicos"):
+        _escribir_atomico(rutas[nombre], lambda f: np.save(f, getattr(indice, nombre)))
+    meta = {"k": indice.k, "longitud_ref": indice.longitud_ref, "sha256_ref": _huella_referencia(rcrs_str)}
+    _escribir_atomico(rutas["meta"], lambda f: f.write(json.dumps(meta).encode("utf-8")))
+
+def cargar_indice_semillas(rcrs_str: str, k: int, directorio: str = constants.SEED_INDEX_DIR) -> IndiceSemillas | None:
+    """Carga el índice por memory-mapping (solo lectura); None si falta o no corresponde a `rcrs_str`."""
+    rutas = _rutas_indice(directorio, k)
+    try:
+        with open(rutas["meta"], encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("k") != k or meta.get("sha256_ref") != _huella_referencia(rcrs_str):
+            return None
+        arrays = {nombre: np.load(rutas[nombre], mmap_mode='r') for nombre in ("hashes", "posiciones", "unicos")}
+        return IndiceSemillas(k, int(meta["longitud_ref"]), **arrays)
+    except (OSError, ValueError, KeyError):
+        return None
+
+@lru_cache(maxsize=4)
+def obtener_indice_semillas(rcrs_str: str, k: int = constants.SEED_KMER_SIZE) -> IndiceSemillas:
+    """
+    Índice de semillas de `rcrs_str`, una vez por proceso: se carga del disco si existe
+    y coincide con la referencia; si no, se construye y se guarda para los siguientes.
+    """
+    indice = cargar_indice_semillas(rcrs_str, k)
+    if indice is None:
+        indice = IndiceSemillas.construir(rcrs_str, k)
+        try:
+            guardar_indice_semillas(indice, rcrs_str)
+        except OSError as e:
+            print(f"Advertencia: No se pudo guardar el índice de semillas de rCRS: {e}")
+    return indice
+
+
+if __name__ == "__main__":
+    from .feature_extraction import cargar_secuencia_fasta
+    registro_rcrs = cargar_secuencia_fasta(constants.RCRS_FASTA_PATH)
+    if registro_rcrs:
+        rcrs = str(registro_rcrs.seq).upper()
+        guardar_indice_semillas(IndiceSemillas.construir(rcrs, constants.SEED_KMER_SIZE), rcrs)
+        print(f"Índice de semillas (k={constants.SEED_KMER_SIZE}) guardado en '{constants.SEED_INDEX_DIR}'.")
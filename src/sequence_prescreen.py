@@ -0,0 +1,53 @@
+# ==============================================================================
+# BLOQUE 3a: PRE-FILTRO DE K-MERS (IDENTIDAD CON rCRS Y HEBRA)
+# ==============================================================================
+# Descripción: Antes de alinear, estima en milisegundos la identidad de la
+# query con rCRS en ambas hebras a partir de la contención de k-mers
+# (fracción de k-mers de la query presentes en el índice de semillas de
+# rCRS). Permite orientar automáticamente queries en reverso-complementario y
+# rechazar o marcar entradas contaminadas, nucleares o de otra especie antes
+# de la DP, HGVS e informes.
+# ------------------------------------------------------------------------------
+
+from Bio.Seq import Seq
+from . import constants
+from .seed_index import obtener_indice_semillas
+
+
+def prefiltrar_query(
+    rcrs_str: str,
+    query_str: str,
+    k: int = constants.SEED_KMER_SIZE,
+    identidad_minima: float = constants.PRESCREEN_MIN_IDENTITY
+) -> dict:
+    """
+    Evalúa la query contra rCRS en ambas hebras. La identidad se estima como
+    contención ** (1/k): con una divergencia d por base, cada k-mer sobrevive con
+    probabilidad (1-d)^k. Devuelve un dict con:
+      'secuencia'   : query orientada en la hebra de rCRS (reverso-complementada si procede)
+      'hebra'       : '+' o '-'
+      'identidad'   : identidad estimada en la mejor hebra (None si no hay k-mers válidos)
+      'identidad_directa', 'identidad_inversa', 'num_kmers'
+      'aceptada'    : identidad >= identidad_minima (True si no es evaluable)
+    """
+    rcrs_str = rcrs_str.upper()
+    query_str = query_str.upper()
+    indice = obtener_indice_semillas(rcrs_str, k)
+    query_rc = str(Seq(query_str).reverse_complement())
+
+    contencion_directa, num_kmers = indice.contencion(query_str)
+    contencion_inversa, _ = indice.contencion(query_rc)
+    identidad_directa = contencion_directa ** (1.0 / k)
+    identidad_inversa = contencion_inversa ** (1.0 / k)
+
+    inversa = contencion_inversa > contencion_directa
+    identidad = (identidad_inversa if inversa else identidad_directa) if num_kmers else None
+    return {
+        'secuencia': query_rc if inversa else query_str,
+        'hebra': '-' if inversa else '+',
+        'identidad': identidad,
+        'identidad_directa': identidad_directa,
+        'identidad_inversa': identidad_inversa,
+        'num_kmers': num_kmers,
+        'aceptada': identidad is None or identidad >= identidad_minima,
+    }
@@ -24,7 +24,8 @@ def crear_track_viewer_interactivo(
     aligned_query_full: str,
     alignment_offset_ref_0based: int,
     alignment_offset_query_0based: int,
-    output_html_path_tv: str = None
+    output_html_path_tv: str = None,
+    indice_alineamiento=None
 ):
     print("\n--- Iniciando Generación de Track Viewer Interactivo ---")
 
@@ -178,7 +179,7 @@ def crear_track_viewer_interactivo(
     query_track_config = pistas_config_tv.get("Query")
     if query_track_config and query_id != 'N/A' and aligned_ref_full:
         query_start_on_ref = alignment_offset_ref_0based
-        query_width_on_ref_alignment = len(aligned_ref_full.replace('-', ''))
+        query_width_on_ref_alignment = indice_alineamiento.total_bases_ref if indice_alineamiento is not None else len(aligned_ref_full.replace('-', ''))
         
         if query_width_on_ref_alignment > 0:
             fig.add_trace(go.Bar(
@@ -281,7 +282,7 @@ def crear_track_viewer_interactivo(
                 font=dict(color="black", size=11),
                 namelength=0 # Ocultar el nombre de la traza en el tooltip
             ),
-            customdata=[var_cruda]
+            customdata=[dict(var_cruda.items())]
         ))
         
         # Añadir etiqueta de posición directamente sobre el marcador
@@ -0,0 +1,160 @@
+# ==============================================================================
+# BLOQUE 3d: REGISTROS COMPACTOS DE VARIANTES
+# ==============================================================================
+# Descripción: Representación de variantes compartida por todos los módulos.
+# - `Variante`: registro con __slots__ para una variante (pos, ref, alt, type,
+#   align_idx y las anotaciones locus / hvs_region). Es compatible con el
+#   acceso de diccionario que usa el resto del código (var['pos'],
+#   var.get('locus', 'N/A'), 'locus' in var), de modo que las etapas no
+#   necesitan copiar cada variante para anotarla.
+# - `LoteVariantes`: contenedor columnar para muchas variantes (arrays NumPy de
+#   posiciones, códigos de tipo y align_idx, y offsets sobre un único buffer de
+#   alelos). Los cortes por rango devuelven vistas sin copia entre etapas.
+# ------------------------------------------------------------------------------
+
+import numpy as np
+
+# Tipos de variante usados en todo el pipeline; el código es el índice en esta tupla
+TIPOS_VARIANTE = (
+    "transition", "transversion", "substitution", "substitution (con N)",
+    "insertion", "deletion", "identico", "desconocido"
+)
+CODIGO_TIPO_VARIANTE = {tipo: codigo for codigo, tipo in enumerate(TIPOS_VARIANTE)}
+
+
+class Variante:
+    """
+    Variante cruda (posiciones con la convención de `extraer_variantes_crudas`:
+    1-based para sustituciones y deleciones, 0-based de la base previa para inserciones).
+    Un campo de anotación no asignado se comporta como una clave ausente de dict.
+    """
+    __slots__ = ("pos", "ref", "alt", "type", "align_idx", "locus", "hvs_region")
+
+    def __init__(self, pos: int, ref: str, alt: str, type: str, align_idx: int | None = None):
+        self.pos = pos
+        self.ref = ref
+        self.alt = alt
+        self.type = type
+        self.align_idx = align_idx
+
+    # --- Acceso compatible con dict ---
+    def __getitem__(self, clave: str):
+        try:
+            return getattr(self, clave)
+        except AttributeError:
+            raise KeyError(clave) from None
+
+    def __setitem__(self, clave: str, valor) -> None:
+        if clave not in self.__slots__:
+            raise KeyError(clave)
+        setattr(self, clave, valor)
+
+    def __contains__(self, clave: str) -> bool:
+        return clave in self.__slots__ and hasattr(self, clave)
+
+    def get(self, clave: str, defecto=None):
+        return getattr(self, clave, defecto) if clave in self.__slots__ else defecto
+
+    def keys(self) -> list:
+        return [campo for campo in self.__slots__ if hasattr(self, campo)]
+
+    def items(self) -> list:
+        return [(campo, getattr(self, campo)) for campo in self.keys()]
+
+    def como_dict(self) -> dict:
+        return dict(self.items())
+
+    def __eq__(self, otra) -> bool:
+        if isinstance(otra, (Variante, dict)):
+            return self.como_dict() == dict(otra.items())
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        # Solo los campos que definen la variante (un subconjunto de los que compara
+        # __eq__, así que dos variantes iguales tienen el mismo hash): las anotaciones
+        # se asignan in situ y el hash no cambia al anotar una variante ya guardada en
+        # un set o como clave de dict.
+        return hash((self.pos, self.ref, self.alt, self.type))
+
+    def __repr__(self) -> str:
+        return repr(self.como_dict())
+
+
+class LoteVariantes:
+    """
+    Lote columnar de variantes: `posiciones` (int64), `codigos_tipo` (uint8, índice en
+    TIPOS_VARIANTE), `align_idx` (int64, -1 si no aplica) y `offsets` (int64, 2n+1) sobre
+    `alelos` (bytes ASCII compartidos): ref_i = alelos[offsets[2i]:offsets[2i+1]],
+    alt_i = alelos[offsets[2i+1]:offsets[2i+2]]. Las anotaciones opcionales (`loci`,
+    `regiones_hvs`) son listas paralelas.
+    """
+
+    def __init__(self, posiciones: np.ndarray, codigos_tipo: np.ndarray, align_idx: np.ndarray,
+                 offsets: np.ndarray, alelos: bytes | memoryview, loci: list | None = None, regiones_hvs: list | None = None):
+        self.posiciones = posiciones
+        self.codigos_tipo = codigos_tipo
+        self.align_idx = align_idx
+        self.offsets = offsets
+        self.alelos = memoryview(alelos)
+        self.loci = loci
+        self.regiones_hvs = regiones_hvs
+
+    @classmethod
+    def desde_variantes(cls, variantes: list) -> "LoteVariantes":
+        """Empaqueta una lista de `Variante` (o dicts con las mismas claves)."""
+        n = len(variantes)
+        posiciones = np.fromiter((v['pos'] for v in variantes), dtype=np.int64, count=n)
+        codigos_tipo = np.fromiter((CODIGO_TIPO_VARIANTE[v['type']] for v in variantes), dtype=np.uint8, count=n)
+        align_idx = np.fromiter((-1 if v.get('align_idx') is None else v['align_idx'] for v in variantes), dtype=np.int64, count=n)
+        fragmentos = [alelo.encode('ascii') for v in variantes for alelo in (v['ref'], v['alt'])]
+        offsets = np.zeros(2 * n + 1, dtype=np.int64)
+        np.cumsum([len(f) for f in fragmentos], out=offsets[1:])
+        anotado = n > 0 and all('locus' in v for v in variantes)
+        return cls(posiciones, codigos_tipo, align_idx, offsets, b"".join(fragmentos),
+                   [v['locus'] for v in variantes] if anotado else None,
+                   [v.get('hvs_region') for v in variantes] if anotado else None)
+
+    @classmethod
+    def desde_arrays(cls, arrays: dict) -> "LoteVariantes":
+        """Inverso de `como_arrays` (p. ej. arrays leídos de un .npz)."""
+        return cls(arrays["posiciones"], arrays["codigos_tipo"], arrays["align_idx"], arrays["offsets"], arrays["alelos"].tobytes())
+
+    def como_arrays(self) -> dict:
+        """Arrays planos del lote (sin anotaciones), aptos para np.savez."""
+        return {
+            "posiciones": self.posiciones, "codigos_tipo": self.codigos_tipo, "align_idx": self.align_idx,
+            "offsets": self.offsets, "alelos": np.frombuffer(self.alelos, dtype=np.uint8),
+        }
+
+    def __len__(self) -> int:
+        return len(self.posiciones)
+
+    def _alelo(self, i_offset: int) -> str:
+        return bytes(self.alelos[self.offsets[i_offset]:self.offsets[i_offset + 1]]).decode('ascii')
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            # Vista sin copia: los arrays se cortan por rango y el buffer de alelos se comparte
+            inicio, fin, paso = indice.indices(len(self))
+            if paso != 1:
+                raise ValueError("LoteVariantes solo admite cortes contiguos")
+            return LoteVariantes(
+                self.posiciones[inicio:fin], self.codigos_tipo[inicio:fin], self.align_idx[inicio:fin],
+                self.offsets[2 * inicio:2 * max(fin, inicio) + 1], self.alelos,
+                self.loci[inicio:fin] if self.loci is not None else None,
+                self.regiones_hvs[inicio:fin] if self.regiones_hvs is not None else None
+            )
+        i = range(len(self))[indice]
+        variante = Variante(int(self.posiciones[i]), self._alelo(2 * i), self._alelo(2 * i + 1),
+                            TIPOS_VARIANTE[self.codigos_tipo[i]], None if self.align_idx[i] < 0 else int(self.align_idx[i]))
+        if self.loci is not None:
+            variante.locus = self.loci[i]
+            variante.hvs_region = self.regiones_hvs[i]
+        return variante
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def como_variantes(self) -> list:
+        return list(self)